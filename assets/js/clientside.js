@@ -0,0 +1,18 @@
+/** 
+ * Dash clientside callbacks for TopicScan, which switch between charts for 
+ * different topics in the browser, based on figures precomputed by the server.
+ */
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+	topicscan: {
+		select_topic_figure: function(topic_index, figures) {
+			if (!figures || !topic_index) {
+				return window.dash_clientside.no_update;
+			}
+			var figure = figures[parseInt(topic_index) - 1];
+			if (!figure) {
+				return window.dash_clientside.no_update;
+			}
+			return figure;
+		}
+	}
+});
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""
+Tool to benchmark the throughput of the text preprocessing functions on a corpus of documents,
+such as the bundled BBC corpus after extracting it from data/corpora/bbc.zip. Both reading and
+normalizing the text files, and tokenizing the documents, are benchmarked.
+
+Sample usage:
+``` python topicscan/bench_text.py -s topicscan/text/stopwords/english.txt ./topicscan/data/bbc/* ```
+"""
+import os, os.path, sys, time, re
+import logging as log
+from optparse import OptionParser
+import text.util
+
+# --------------------------------------------------------------
+
+def benchmark_tokenizer( name, tokenize, docs, repeats ):
+	""" Apply a tokenizer function to all documents, and report the best throughput in tokens per second. """
+	best_time, num_tokens = None, 0
+	for r in range(repeats):
+		start = time.time()
+		num_tokens = 0
+		for doc in docs:
+			num_tokens += len(tokenize(doc))
+		elapsed = time.time() - start
+		if best_time is None or elapsed < best_time:
+			best_time = elapsed
+	log.info("%-10s %10d tokens %8.3f secs %12.0f tokens/sec" % (name, num_tokens, best_time, num_tokens / max(best_time, 1e-9)))
+	return num_tokens
+
+def baseline_read_text( in_path ):
+	""" Original line-by-line implementation of text.util.read_text, for comparison. """
+	body = ""
+	with open(in_path, 'r', encoding="utf8", errors='ignore') as fin:
+		while True:
+			line = fin.readline()
+			if not line:
+				break
+			normalized_line = re.sub(text.util.url_pattern, '', line.strip())
+			if len(normalized_line) > 1:
+				body += normalized_line
+				body += "\n"
+	return body
+
+def benchmark_reader( name, read, file_paths, repeats, unit = "chars" ):
+	""" Apply a function to read all files, and report the best throughput in MB per second. """
+	best_time, num_items = None, 0
+	for r in range(repeats):
+		start = time.time()
+		num_items = 0
+		for in_path in file_paths:
+			num_items += len(read(in_path))
+		elapsed = time.time() - start
+		if best_time is None or elapsed < best_time:
+			best_time = elapsed
+	num_bytes = sum(os.path.getsize(in_path) for in_path in file_paths)
+	log.info("%-10s %10d %s %8.3f secs %12.1f MB/sec" % (name, num_items, unit, best_time, num_bytes / (1024 * 1024 * max(best_time, 1e-9))))
+	return num_items
+
+def main():
+	parser = OptionParser(usage="usage: %prog [options] dir1 dir2 ...")
+	parser.add_option("-l","--lines", action="store_true", dest="is_lines", help="each line in a file represents a separate document")
+	parser.add_option("-r","--repeats", action="store", type="int", dest="repeats", help="number of times to repeat each benchmark", default=3)
+	parser.add_option("-s", action="store", type="string", dest="stoplist_file", help="custom stopword file path", default=None)
+	# parse command line arguments
+	(options, args) = parser.parse_args()
+	if len(args) < 1:
+		parser.error("Must specify at least one directory of file path")
+	log.basicConfig(level=log.INFO, format='%(message)s')
+
+	# Find all relevant files in the directories specified by user
+	file_paths = []
+	for in_path in sorted(args):
+		if not os.path.exists(in_path):
+			log.error("Error: No such input path %s" % in_path)
+			sys.exit(1)
+		if os.path.isdir(in_path):
+			file_paths += text.util.find_text_files(in_path)
+		else:
+			file_paths.append(in_path)
+	stopwords = set()
+	if not options.stoplist_file is None:
+		stopwords = text.util.load_word_set(options.stoplist_file)
+
+	# Benchmark reading and normalizing the files
+	log.info("Benchmarking reading for %d files ..." % len(file_paths))
+	if options.is_lines:
+		benchmark_reader("baseline", lambda in_path : baseline_read_text(in_path).split("\n"), file_paths, options.repeats, "docs")
+		benchmark_reader("current", text.util.read_text_lines, file_paths, options.repeats, "docs")
+	else:
+		benchmark_reader("baseline", baseline_read_text, file_paths, options.repeats)
+		benchmark_reader("current", text.util.read_text, file_paths, options.repeats)
+	if any(baseline_read_text(in_path) != text.util.read_text(in_path) for in_path in file_paths):
+		log.warning("Warning: Readers produced different output")
+
+	# Read the documents into memory, so that only tokenization is timed
+	docs = []
+	for in_path in file_paths:
+		if options.is_lines:
+			docs += text.util.read_text_lines(in_path)
+		else:
+			docs.append(text.util.read_text(in_path))
+	log.info("Benchmarking tokenization for %d documents from %d files (%d stopwords) ..." % (len(docs), len(file_paths), len(stopwords)))
+
+	# original tokenizer, with a separate per-token lowercase and stopword lookup
+	def baseline_tokenize( s ):
+		return [x.lower() for x in text.util.token_pattern.findall(s)
+			if (len(x) >= text.util.min_term_length and x[0].isalpha() and not x.lower() in stopwords)]
+	def custom_tokenize( s ):
+		return [tok for tok in text.util.custom_tokenizer(s) if not tok in stopwords]
+	count_baseline = benchmark_tokenizer("baseline", baseline_tokenize, docs, options.repeats)
+	count_custom = benchmark_tokenizer("custom", custom_tokenize, docs, options.repeats)
+	count_cached = benchmark_tokenizer("cached", text.util.CachedTokenizer(stopwords), docs, options.repeats)
+	if not count_baseline == count_custom == count_cached:
+		log.warning("Warning: Tokenizers produced different numbers of tokens")
+
+# --------------------------------------------------------------
+
+if __name__ == "__main__":
+	main()
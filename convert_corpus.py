@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+"""
+Tool to convert one or more pre-processed corpora created by prep_text.py from the pickle format to the 
+directory format, where the document-term matrix is stored as memory-mappable NumPy files.
+
+Sample usage:
+``` python topicscan/convert_corpus.py bbc.pkl bbcsport.pkl ```
+"""
+import os, os.path, sys
+import logging as log
+from optparse import OptionParser
+import text.util
+
+# --------------------------------------------------------------
+
+def main():
+	parser = OptionParser(usage="usage: %prog [options] corpus_file1 corpus_file2 ...")
+	parser.add_option("-o", action="store", type="string", dest="dir_out", help="output directory for converted corpora (default is the same directory as each input)", default=None)
+	parser.add_option("--debug", action="store_true", dest="debug", help="enable debugging information", default=False)
+	# parse command line arguments
+	(options, args) = parser.parse_args()
+	if len(args) < 1:
+		parser.error("Must specify at least one corpus file")	
+	# control level of log output
+	log_level = log.DEBUG if options.debug else log.INFO
+	log.basicConfig(level=log_level, format='%(message)s')
+
+	for in_path in args:
+		if not os.path.isfile(in_path):
+			log.error("Error: No such corpus file %s" % in_path)
+			sys.exit(1)
+		# the output directory has the same name as the corpus file, without the extension
+		dir_out, fname = os.path.split(os.path.splitext(in_path)[0])
+		if not options.dir_out is None:
+			dir_out = options.dir_out
+		corpus_dir = os.path.join(dir_out, fname)
+		if os.path.exists(corpus_dir):
+			log.error("Error: Output path %s already exists" % corpus_dir)
+			sys.exit(1)
+		log.info("Converting corpus %s to %s ..." % (in_path, corpus_dir))
+		text.util.convert_corpus(in_path, corpus_dir)
+
+# --------------------------------------------------------------
+
+if __name__ == "__main__":
+	main()
@@ -1,4 +1,5 @@
 import logging as log
+import threading
 import pandas as pd
 import dash, dash_table
 import dash_bootstrap_components as dbc
@@ -9,7 +10,7 @@ from model.validation import TopicMatcher
 from webconfig import config
 from webvalidation import ModelValidator, measure_names, measure_short_names
 from layouts.general import GeneralLayout
-from layouts.dftable import DataFrameTable
+from layouts.dftable import DataFrameDataTable
 # --------------------------------------------------------------
 
 class ComparisonLayout(GeneralLayout):
@@ -28,6 +29,10 @@ class ComparisonLayout(GeneralLayout):
 		self.current_metadata_indices = [0, 1]
 		# cache of validation results
 		self.validation_cache = {}
+		# partial validation results, for evaluations still running in the background
+		self.validation_progress = {}
+		# error messages and partial results, for evaluations which failed
+		self.validation_errors = {}
 
 	def get_header_subtext( self ):
 		""" Return the string which is displayed in the header, beside the logo. """
@@ -93,6 +98,8 @@ class ComparisonLayout(GeneralLayout):
 							]
 						),
 						html.Div( self.generate_vtable(), id='content_compare_vtable'),
+						# used to refresh the table while the validation scores are being computed
+						dcc.Interval( id='compare-vtable-interval', interval=1000, disabled=True ),
 					]
 				),
 			], id="content_vtable_card")
@@ -161,10 +168,10 @@ class ComparisonLayout(GeneralLayout):
 		return dcc.Markdown(text)
 
 	def generate_model_table( self ):
-		""" Generate a Bootstrap table containing list of current topic model metadata. """
+		""" Generate a table containing list of current topic model metadata. """
 		df = self.__create_model_df().sort_values( by=["Corpus","Name"] )
 		alignments = { "Topics" : "right", "Documents" : "right", "Terms" : "right" }
-		return DataFrameTable( df, id="model-table", alignments=alignments, striped=False, hover=False ).generate_layout()
+		return DataFrameDataTable( df, id="compare-model-table", alignments=alignments ).generate_layout()
 
 	def __create_model_df( self ):
 		""" Create a Pandas Data Frame summarizing details for all models currently being compared. """
@@ -184,25 +191,23 @@ class ComparisonLayout(GeneralLayout):
 		""" Generates a Dash table containing topic-level validation scores. """
 		if self.current_embed_id is None:
 			return ""
-		# already cached these results?
-		if self.current_embed_id in self.validation_cache:
-			df = self.validation_cache[self.current_embed_id]
-			log.info("Using cached comparison validation scores for embedding %s" % self.current_embed_id )
-		else:
-			# get the word embedding
-			embed = self.webcore.get_embedding(self.current_embed_id)
-			if embed is None:
-				return ""
-			# perform the evaluation
-			log.info("Performing comparison on %d topic models using %s ..." % (len(self.all_metadata), self.current_embed_id) )
-			df = self.validator.get_validation_df( self.all_metadata, embed )
-			if df is None:
-				return ""
-			# round it
-			df = df.round( config.get("precision", 3) )
-			self.validation_cache[self.current_embed_id] = df
+		df = self.get_validation_df()
 		if df is None:
 			return ""
+		# still computing the validation scores?
+		if self.current_embed_id in self.validation_errors:
+			message = self.validation_errors[self.current_embed_id][0]
+			if len(df) == 0:
+				progress = html.P( "Failed to evaluate the topic models: %s" % message, className="card-text" )
+			else:
+				progress = html.P( "Evaluated %d of %d topic models before an error occurred: %s" % ( len(df), len(self.all_metadata), 
+					message ), className="card-text" )
+		elif self.is_validation_complete():
+			progress = ""
+		else:
+			progress = html.P( "Evaluated %d of %d topic models ..." % ( len(df), len(self.all_metadata) ), className="card-text" )
+		if len(df) == 0:
+			return progress
 		data = df.to_dict('records')
 		columns = []
 		for i in df.columns:
@@ -210,7 +215,7 @@ class ComparisonLayout(GeneralLayout):
 				columns.append( {"name": measure_short_names[i], "id": i, "deletable": False, "selectable": False} )
 			else:
 				columns.append( {"name": i, "id": i, "deletable": False, "selectable": False} )
-		return dash_table.DataTable(
+		return html.Div( [ progress, dash_table.DataTable(
 		    id='validation_model',
 		    columns=columns,
 		    data=data,
@@ -235,25 +240,82 @@ class ComparisonLayout(GeneralLayout):
 				} for c in ['Name', 'Corpus']
 			],
 		    style_as_list_view=True
-		)
+		) ] )
 
-	def generate_vchart( self ):
-		if self.current_embed_id is None:
-			return ""
+	def get_validation_df( self ):
+		""" Return a Data Frame containing the validation scores for all topic models, based on the 
+		current embedding. The first call for an embedding starts the evaluation in the background, 
+		and until this completes only the scores for the models evaluated so far are returned. """
+		embed_id = self.current_embed_id
 		# already cached these results?
-		if self.current_embed_id in self.validation_cache:
-			df = self.validation_cache[self.current_embed_id]
-			log.info("Using cached validation scores for embedding %s" % self.current_embed_id )
-		else:
+		df = self.__get_finished_validation_df( embed_id )
+		if df is not None:
+			log.info("Using cached comparison validation scores for embedding %s" % embed_id )
+			return df
+		# note: the background evaluation may finish at any point, so the progress is only read once
+		rows = self.validation_progress.get( embed_id )
+		if rows is None:
+			df = self.__get_finished_validation_df( embed_id )
+			if df is not None:
+				return df
 			# get the word embedding
-			embed = self.webcore.get_embedding(self.current_embed_id)
+			embed = self.webcore.get_embedding(embed_id)
 			if embed is None:
-				return ""
-			# perform the evaluation
-			log.info("Evaluating topic model using %s ..." % self.current_embed_id )
-			df = self.validator.get_validation_df( self.all_metadata, embed )
-			self.validation_cache[self.current_embed_id] = df
-		if df is None:
+				self.validation_errors[embed_id] = ( "Unable to load word embedding %s" % embed_id, self.__build_validation_df( [] ) )
+				return self.validation_errors[embed_id][1]
+			log.info("Performing comparison on %d topic models using %s ..." % (len(self.all_metadata), embed_id) )
+			rows = []
+			self.validation_progress[embed_id] = rows
+			thread = threading.Thread( target=self.__run_validation, args=(embed_id, embed, rows), daemon=True )
+			thread.start()
+			# give quick evaluations a chance to finish, so that the table is complete when first displayed
+			thread.join( 1.0 )
+			df = self.__get_finished_validation_df( embed_id )
+			if df is not None:
+				return df
+		return self.__build_validation_df( list(rows) )
+
+	def __get_finished_validation_df( self, embed_id ):
+		""" Return the validation scores for an embedding whose evaluation has finished, which are 
+		partial if the evaluation failed, or None if the evaluation has not finished. """
+		if embed_id in self.validation_cache:
+			return self.validation_cache[embed_id]
+		if embed_id in self.validation_errors:
+			return self.validation_errors[embed_id][1]
+		return None
+
+	def is_validation_complete( self ):
+		""" Return True if the validation scores for the current embedding have been computed, or 
+		if their evaluation has failed. """
+		embed_id = self.current_embed_id
+		return embed_id is None or embed_id in self.validation_cache or embed_id in self.validation_errors
+
+	def __run_validation( self, embed_id, embed, rows ):
+		""" Evaluate all topic models using the specified embedding, adding the scores for each 
+		model to the list of rows as they become available. If the evaluation fails, the error and 
+		the partial results are recorded instead, so that they are not mistaken for complete results. """
+		try:
+			for index, row in self.validator.iter_validation_rows( self.all_metadata, embed ):
+				rows.append( ( index, row ) )
+		except Exception as e:
+			log.error("Failed to evaluate topic models using %s" % embed_id)
+			log.error(e)
+			self.validation_errors[embed_id] = ( str(e), self.__build_validation_df( list(rows) ) )
+		else:
+			self.validation_cache[embed_id] = self.__build_validation_df( list(rows) )
+		del self.validation_progress[embed_id]
+
+	def __build_validation_df( self, rows ):
+		""" Create a Data Frame from the validation score rows, in the original order of the models. """
+		rows.sort( key=lambda x : x[0] )
+		return pd.DataFrame( [ row for _, row in rows ] )
+
+	def generate_vchart( self ):
+		if self.current_embed_id is None:
+			return ""
+		# note: this may only contain the models evaluated so far
+		df = self.get_validation_df()
+		if df is None or len(df) == 0:
 			return ""
 		# get the appropriate values
 		measure_name = measure_names[self.current_measure_id]
@@ -338,7 +400,7 @@ class ComparisonLayout(GeneralLayout):
 			rows.append( row )
 		df = pd.DataFrame(rows)
 		alignments = { "Topic 1":"center", "Topic 2":"center", "Similarity":"center" }
-		return DataFrameTable( df, id="matching-table", alignments=alignments, striped=False, hover=False ).generate_layout()
+		return DataFrameDataTable( df, id="matching-table", alignments=alignments ).generate_layout()
 
 	def generate_model_dropdown( self, dropdown_number ):
 		""" Utility function to generate a dropdown component which allows the user
@@ -1,15 +1,17 @@
-import dash_core_components as dcc
-import dash_html_components as html
-import dash_bootstrap_components as dbc
+import re
+import dash_table
 
 # --------------------------------------------------------------
 
-class DataFrameTable:
-	""" Layout component which populates a standard Bootstrap Table from 
-	a Pandas Data Frame. """
+class DataFrameDataTable:
+	""" Layout component which populates a Dash DataTable from a Pandas Data Frame. The
+	table data is sent to the browser once as a list of records and rendered client-side,
+	with pagination for larger tables, rather than as a tree of per-cell components. 
+	Rows can optionally be selected using checkboxes, where the selection is available
+	via the 'selected_row_ids' property of the table. """
 
 	def __init__( self, df, id = "dftable", alignments = {}, links = {}, show_index = False, 
-			bordered = False, striped = False, hover = False, summary_row = False ):
+			summary_row = False, row_ids = None, row_selectable = False, page_size = 100 ):
 		self.id = id
 		self.df = df
 		self.alignments = alignments
@@ -19,142 +21,79 @@ class DataFrameTable:
 		self.index_name = "Index"
 		# highlight the final row?
 		self.summary_row = summary_row
-		# appearance settings
-		self.bordered = bordered
-		self.striped = striped
-		self.hover = hover
+		# identifiers for each row, used for selection
+		self.row_ids = row_ids
+		self.row_selectable = row_selectable
+		# number of rows per page, for larger tables
+		self.page_size = page_size
 
 	def generate_layout( self ):
 		""" Generate the full layout for the current table """
 		if self.df is None:
 			return ""
-		# create the header
-		columns = list( self.df.columns )
-		table_header = self.generate_header( columns )
-		# create the content
-		table_rows = []
-		for index, row in self.df.iterrows():
-			is_summary = self.summary_row and ( len(table_rows) == len(self.df) - 1 )
-			table_rows.append( self.generate_row( index, row, columns, is_summary ) )
-		table_body = [html.Tbody( table_rows )]
-		# create the full table as a Bootstrap Table
-		return dbc.Table(table_header + table_body, 
-			bordered=self.bordered, striped=self.striped, hover=self.hover,
-			id = self.id, className="dftable")
-
-	def generate_header( self, columns ):
-		""" Generate the header row layout for the table """
-		th_list = self.generate_th_list( columns )
-		# display the index as a column?
-		if self.show_index:
-			style = {}
-			if "index" in self.alignments:
-				 style["text-align"] = self.alignments["index"]
-			th_list.insert( 0, html.Th(self.index_name, style=style, className="dftable-header-name") )
-		table_header = [
-	    	html.Thead( html.Tr(th_list), className="dftable-header")
-		]
-		return table_header
-
-	def generate_th_list( self, columns ):
-		th_list = []
-		for col in columns:
-			style = {}
-			if col in self.alignments:
-				 style["text-align"] = self.alignments[col]
-			th_list.append( html.Th(col, style=style, className="dftable-header-name") )
-		return th_list		
-
-	def generate_row( self, index, row, columns, is_summary = False ):
-		""" Generate the content for an individual table row """
-		row_cells = self.generate_row_cells( index, row, columns ) 
-		# add index cell?
+		# build the column arrays
+		column_names, column_values = [], []
 		if self.show_index:
-			row_cells.insert( 0, html.Td( index ) )
-		if is_summary:
-			return html.Tr( row_cells, className="dftable-summaryrow" )
-		return html.Tr( row_cells, className="dftable-row" )
-
-	def generate_row_cells( self, index, row, columns ):
-		row_cells = []
-		url = None if not index in self.links else self.links[index]
-		for col in columns:
-			style = {}
-			if col in self.alignments:
-				 style["text-align"] = self.alignments[col]
-			value = row[col]
-			# if type(value) == int:
-			# 	value = '{:,}'.format(value)
-			if url is None:
-				row_cells.append( html.Td( value, style=style, className="dftable-cell" ) ) 
-			else:
-				row_cells.append( html.Td( html.A(value, href=url, target="_blank"), 
-					style=style, className="dftable-cell" ) ) 
-		return row_cells
-
-# --------------------------------------------------------------
+			column_names.append( self.index_name )
+			column_values.append( self.df.index.tolist() )
+		for col in self.df.columns:
+			column_names.append( str(col) )
+			column_values.append( self.df[col].tolist() )
+		# add links to all cells in the relevant rows, in Markdown format
+		has_links = len(self.links) > 0
+		if has_links:
+			urls = [ self.links.get( index, None ) for index in self.df.index ]
+			column_values = [ [ self.__format_link( value, url ) for value, url in zip(values, urls) ] for values in column_values ]
+		columns = []
+		for name in column_names:
+			column = { "name" : name, "id" : name }
+			if has_links:
+				column["presentation"] = "markdown"
+			columns.append( column )
+		data = [ dict( zip( column_names, values ) ) for values in zip( *column_values ) ]
+		if not self.row_ids is None:
+			for record, row_id in zip( data, self.row_ids ):
+				record["id"] = row_id
+		# cell styles
+		style_cell_conditional = []
+		for name in column_names:
+			key = "index" if ( self.show_index and name == self.index_name ) else name
+			if key in self.alignments:
+				style_cell_conditional.append( { 'if': {'column_id': name}, 'textAlign': self.alignments[key] } )
+		style_data_conditional = []
+		if self.summary_row and len(data) > 0:
+			style_data_conditional.append( { 'if': {'row_index': len(data) - 1}, 'backgroundColor': '#e9ecef' } )
+		# only paginate larger tables
+		paginate = len(data) > self.page_size
+		return dash_table.DataTable(
+			id=self.id,
+			columns=columns,
+			data=data,
+			row_selectable="multi" if self.row_selectable else False,
+			selected_rows=[],
+			page_action="native" if paginate else "none",
+			page_size=self.page_size,
+			markdown_options={ "link_target" : "_blank" },
+			css=[ { "selector" : "p", "rule" : "margin: 0" } ],
+			style_cell={
+				'textAlign': 'left',
+				'fontFamily': '"Open Sans", "Helvetica Neue", sans-serif',
+				'padding': '6px'
+			},
+			style_header={
+				'backgroundColor': 'white',
+				'fontWeight': 'bold',
+				'border-bottom': '2px solid #808080'
+			},
+			style_cell_conditional=style_cell_conditional,
+			style_data_conditional=style_data_conditional,
+			style_as_list_view=True
+		)
 
-class CheckboxTable(DataFrameTable):
-
-	def __init__( self, df, id = "dfcheckboxtable", alignments = {}, links = {}, show_index = False, 
-			bordered = False, striped = False, hover = False, summary_row = False, select_label = "" ):
-		super(CheckboxTable, self).__init__( df, id, alignments, links, show_index, bordered, striped, hover, summary_row )
-		self.select_label = select_label
-		self.checkbox_ids = []
-
-	# def generate_layout( self ):
-	# 	""" Generate the full layout for the current table """
-	# 	if self.df is None:
-	# 		return ""
-	# 	# create the header
-	# 	columns = list( self.df.columns )
-	# 	table_header = self.generate_header( columns )
-	# 	# create the content
-	# 	table_rows = []
-	# 	for index, row in self.df.iterrows():
-	# 		is_summary = self.summary_row and ( len(table_rows) == len(self.df) - 1 )
-	# 		table_rows.append( self.generate_row( index, row, columns, is_summary ) )
-	# 	table_body = [html.Tbody( table_rows )]
-	# 	# create the full table as a Bootstrap Table
-	# 	tab = dbc.Table(table_header + table_body, 
-	# 		bordered=self.bordered, striped=self.striped, hover=self.hover,
-	# 		id = self.id, className="dftable")
-	# 	return dbc.FormGroup( tab )
-
-	def generate_header( self, columns ):
-		""" Generate the header row layout for the table """
-		th_list = self.generate_th_list( columns )
-		# display the index as a column?
-		if self.show_index:
-			style = {}
-			if "index" in self.alignments:
-				 style["text-align"] = self.alignments["index"]
-			th_list.insert( 0, html.Th(self.index_name, style=style, className="dftable-header-name") )
-		# add selection
-		style = { "text-align":"center" }
-		th_list.insert( 0, html.Th(self.select_label, style=style, className="dftable-header-name") )
-		# return the header row
-		table_header = [
-	    	html.Thead( html.Tr(th_list), className="dftable-header")
-		]
-		return table_header
-
-	def generate_row( self, index, row, columns, is_summary = False ):
-		""" Generate the content for an individual table row """
-		row_cells = self.generate_row_cells( index, row, columns ) 
-		# add index cell?
-		if self.show_index:
-			row_cells.insert( 0, html.Td( index ) )
-		if is_summary:
-			return html.Tr( row_cells, className="dftable-summaryrow" )
-		# add check box cell
-		checkbox_id = "check_%s" % len(self.checkbox_ids)
-		self.checkbox_ids.append( checkbox_id )
-		style = { "text-align":"center" }
-		row_cells.insert( 0, html.Td( 
-			html.Div( 
-					dbc.Checkbox( className="form-check-input", id=checkbox_id, checked=False ),
-				className="custom-control custom-checkbox", style=style)
-			 ) )
-		# return the table row
-		return html.Tr( row_cells, className="dftable-row" )		
+	def __format_link( self, value, url ):
+		""" Format a cell value as a Markdown link to the specified URL. """
+		# escape any characters with special meaning in Markdown
+		s = re.sub( r"([\\`*_\[\]])", r"\\\1", str(value) )
+		if url is None:
+			return s
+		return "[%s](%s)" % ( s, url )
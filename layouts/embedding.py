@@ -7,7 +7,7 @@ import dash_bootstrap_components as dbc
 # TopicScan imports
 from webconfig import config
 from layouts.general import GeneralLayout
-from layouts.dftable import DataFrameTable
+from layouts.dftable import DataFrameDataTable
 
 # --------------------------------------------------------------
 
@@ -130,7 +130,7 @@ class EmbeddingLayout( GeneralLayout ):
 			if self.embed is None:
 				return ""
 		df = self.__create_neighbor_df( query )
-		return DataFrameTable( df, id="neighbor-table", summary_row=True, striped=False, hover=False ).generate_layout()
+		return DataFrameDataTable( df, id="neighbor-table", summary_row=True ).generate_layout()
 
 	def __calculate_similarity_df( self, terms ):
 		""" Calculate similarity matrix between specified terms. Note that this 
@@ -76,6 +76,15 @@ class GeneralLayout:
 			return 750
 		return 850
 
+	def generate_topic_figure_chart( self, graph_id, store_id, figures, topic_index ):
+		""" Generate a chart showing the figure for the currently selected topic, along with a
+		store containing the figures for all topics, so that switching between topics can be 
+		handled by a clientside callback. """
+		return html.Div( [
+			dcc.Graph( id=graph_id, figure=figures[topic_index-1] ),
+			dcc.Store( id=store_id, data=figures )
+		] )
+
 	def generate_embedding_dropdown( self ):
 		""" Utility function to generate a dropdown component which allows the user
 		to choose between different word embedding models. """
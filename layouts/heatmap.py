@@ -1,5 +1,6 @@
 import logging as log
 import warnings
+import numpy as np
 import dash, dash_table
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
@@ -129,7 +130,7 @@ class HeatmapLayout( GeneralLayout ):
 			return ""
 		# already cached these results?
 		if self.current_embed_id in self.topiclevel_cache:
-			df = self.topiclevel_cache[self.current_embed_id]
+			S = self.topiclevel_cache[self.current_embed_id]
 			log.info("Using cached similarites for embedding %s" % self.current_embed_id )
 		else:
 			# get the word embedding
@@ -137,29 +138,29 @@ class HeatmapLayout( GeneralLayout ):
 			if embed is None:
 				return ""
 			log.info("Computing similarities for topic model using %s ..." % self.current_embed_id )
-			df = self.validator.get_topic_pair_similarity_df( self.metadata, embed )
-			if df is None:
+			S = self.validator.get_topic_similarity_matrix( self.metadata, embed )
+			if S is None:
 				return ""
 			# round it
-			df = df.round( config.get("precision",3) )
-			self.topiclevel_cache[self.current_embed_id] = df
-		# generate the chart
+			S = S.round( config.get("precision",3) )
+			self.topiclevel_cache[self.current_embed_id] = S
+		# generate the chart, where rows of the matrix correspond to the y-axis
+		k = len(descriptors)
+		num_fmt = "Topic %02d" if k < 100 else "Topic %03d"
+		labels = [ num_fmt % (i+1) for i in range(k) ]
+		descriptor_strings = [ ", ".join( descriptor ) for descriptor in descriptors ]
 		hovertext = []
-		for i, row in df.iterrows():
-			topic_num1 = int(row["topic1"].replace("Topic ","")) - 1
-			topic_num2= int(row["topic2"].replace("Topic ","")) - 1
-			s = "<b>%s</b>: %s<br><b>%s</b>: %s" % ( 
-				row["topic1"], ", ".join( descriptors[topic_num1] ), 
-				row["topic2"], ", ".join( descriptors[topic_num2] ) )
-			hovertext.append( s )
+		for i in range(k):
+			hovertext.append( [ "<b>%s</b>: %s<br><b>%s</b>: %s" % ( labels[j], descriptor_strings[j], labels[i], descriptor_strings[i] ) 
+				for j in range(k) ] )
 		return dcc.Graph(
 			id='chart_topicheatmap',
 			figure={
 				'data': [
 					{
-						'x': df["topic1"], 
-						'y': df["topic2"],
-						'z': df["sim"],
+						'x': labels, 
+						'y': labels,
+						'z': S.tolist(),
 						'hovertext' : hovertext,
 						'type': 'heatmap',		    		
 						'hoverlabel' : { 'bgcolor' : 'rgb(250, 246, 208)' },
@@ -184,7 +185,7 @@ class HeatmapLayout( GeneralLayout ):
 			return ""
 		# already cached these results?
 		if self.current_embed_id in self.termlevel_cache:
-			df = self.termlevel_cache[self.current_embed_id]
+			S, term_index = self.termlevel_cache[self.current_embed_id]
 			log.info("Using cached term similarites for embedding %s" % self.current_embed_id )
 		else:
 			# get the word embedding
@@ -192,48 +193,49 @@ class HeatmapLayout( GeneralLayout ):
 			if embed is None:
 				return ""
 			log.info("Computing term similarities for topic model using %s ..." % self.current_embed_id )
-			df = self.validator.get_term_pair_similarity_df( self.metadata, embed )
-			if df is None:
+			S, term_index = self.validator.get_term_similarity_matrix( self.metadata, embed )
+			if S is None:
 				return ""
 			# round it
-			df = df.round( config.get("precision",3) )
-			self.termlevel_cache[self.current_embed_id] = df
-		# now get the relevant terms for this topic and filter the Data Frame
-		current_descriptor = descriptors[self.current_topic_index-1]
-		current_descriptor_set = set(current_descriptor)
-		xvalues, yvalues, zvalues, hovertext = [], [], [], []
-		# TODO: make this more effecient
-		for i, row in df.iterrows():
-			if row["term1"] in current_descriptor_set and row["term2"] in current_descriptor_set:
-				xvalues.append( row["term1"] )
-				yvalues.append( row["term2"] )
-				zvalues.append( row["sim"] )		
-				hovertext.append( "<b>(%s, %s)</b>" % ( row["term1"], row["term2"] ) )
+			S = S.round( config.get("precision",3) )
+			self.termlevel_cache[self.current_embed_id] = ( S, term_index )
+		# generate the heatmaps for all topics, to allow switching between topics on the client
+		figures = [ self.generate_termlevel_figure( S, term_index, topic_index ) for topic_index in range( 1, self.metadata["k"] + 1 ) ]
+		return self.generate_topic_figure_chart( 'chart_termheatmap', 'store_termheatmap', figures, self.current_topic_index )
+
+	def generate_termlevel_figure( self, S, term_index, topic_index ):
+		""" Generate the figure for the term-level heatmap for the specified topic, based on a block
+		of the full term similarity matrix. """
+		descriptors = self.metadata.get_descriptors()
+		# get the relevant terms for this topic which appear in the embedding, and slice the matrix
+		current_descriptor = descriptors[topic_index-1]
+		terms = [ term for term in current_descriptor if term in term_index ]
+		indices = [ term_index[term] for term in terms ]
+		Z = S[np.ix_(indices, indices)]
+		hovertext = [ [ "<b>(%s, %s)</b>" % ( term1, term2 ) for term1 in terms ] for term2 in terms ]
 		# generate the chart
-		title = "Topic %02d: %s" % ( self.current_topic_index, ", ".join( current_descriptor ) )
-		return dcc.Graph(
-			id='chart_topicheatmap',
-			figure={
-				'data': [
-					{
-						'x': xvalues, 
-						'y': yvalues,
-						'z': zvalues,
-						'hovertext' : hovertext,
-						'type': 'heatmap',		    		
-						'hoverlabel' : { 'bgcolor' : 'rgb(250, 246, 208)' },
-						'hovertemplate': '%{hovertext}<br>Similarity: %{z}<extra></extra>',
-					},
-				],
-				'layout': 
-				{ 
-					'title' : { 'text': title, 'font' : { "size" : 15 } },
-					'margin': { "t" : 40, "l" : 200, "r" : 200 },
-					'height': 600,
-					'xaxis' : { 'tickfont' : { "size" : 14 } },
-					"yaxis" : { "autorange" : 'reversed', 'tickfont' : { "size" : 14 } },
-				}
-			})	
+		title = "Topic %02d: %s" % ( topic_index, ", ".join( current_descriptor ) )
+		return {
+			'data': [
+				{
+					'x': terms, 
+					'y': terms,
+					'z': Z.tolist(),
+					'hovertext' : hovertext,
+					'type': 'heatmap',		    		
+					'hoverlabel' : { 'bgcolor' : 'rgb(250, 246, 208)' },
+					'hovertemplate': '%{hovertext}<br>Similarity: %{z}<extra></extra>',
+				},
+			],
+			'layout': 
+			{ 
+				'title' : { 'text': title, 'font' : { "size" : 15 } },
+				'margin': { "t" : 40, "l" : 200, "r" : 200 },
+				'height': 600,
+				'xaxis' : { 'tickfont' : { "size" : 14 } },
+				"yaxis" : { "autorange" : 'reversed', 'tickfont' : { "size" : 14 } },
+			}
+		}
 
 	def generate_heatmap_topic_dropdown( self ):
 		""" Generate a Dash dropdown component to select a topic from the model. """
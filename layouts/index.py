@@ -5,7 +5,7 @@ import dash_core_components as dcc
 import dash_html_components as html
 from webconfig import config
 from layouts.general import GeneralLayout
-from layouts.dftable import DataFrameTable, CheckboxTable
+from layouts.dftable import DataFrameDataTable
 
 # --------------------------------------------------------------
 
@@ -17,9 +17,8 @@ class IndexLayout( GeneralLayout ):
 		self.show_navbar = show_navbar
 		# page details
 		self.page_suffix = "-main"
-		# state relatex to the topic model checkbox selection
-		self.model_checkboxes = []
-		self.checkbox_state = []
+		# identifiers of the topic models currently selected in the table
+		self.selected_model_ids = []
 
 	def get_header_subtext( self ):
 		""" Return the string which is displayed in the header, beside the logo. """
@@ -77,19 +76,22 @@ class IndexLayout( GeneralLayout ):
 		)
 
 	def generate_model_button( self ):
-		""" Build a button to launch the Comparison page, with an appropriate URL
+		""" Build buttons to launch the Comparison and Model Selection pages, with appropriate URLs
 		based on the selected checkboxes for topic models. """
 		# build the appropriate URL
 		query = {}
-		for i in range(len(self.checkbox_state)):
-			if self.checkbox_state[i]:
-				query["id%d" % (len(query)+1) ] = self.model_checkboxes[i]
-		# nothing ticked? then disable the button
+		for model_id in self.selected_model_ids:
+			query["id%d" % (len(query)+1) ] = model_id
+		# nothing ticked? then disable the buttons
 		if len(query) == 0:
-			return dbc.Button("Compare Models", className="custom-btn", disabled=True)
-		url = self.generate_link("compare", query)
-		return dbc.Button("Compare Models", className="custom-btn",  
-			href=url, target="_blank", external_link=True)
+			return [ dbc.Button("Compare Models", className="custom-btn", disabled=True), " ",
+				dbc.Button("Select Topics", className="custom-btn", disabled=True) ]
+		compare_url = self.generate_link("compare", dict(query))
+		selection_url = self.generate_link("selection", dict(query))
+		return [ dbc.Button("Compare Models", className="custom-btn",  
+			href=compare_url, target="_blank", external_link=True), " ",
+			dbc.Button("Select Topics", className="custom-btn",  
+			href=selection_url, target="_blank", external_link=True) ]
 
 	def generate_embedding_card( self ):
 		return dbc.Card(
@@ -112,6 +114,7 @@ class IndexLayout( GeneralLayout ):
 			text = "Found %d topic models in the directory *%s*." % ( count, self.webcore.dir_core )
 		text += " To explore a model in detail, click on a row below."
 		text += " To compare two or more models, select them and click *Compare Models*."
+		text += " To choose the number of topics for a parameter sweep, select its models and click *Select Topics*."
 		return dcc.Markdown( text )
 
 	def generate_embedding_card_text( self ):
@@ -124,7 +127,7 @@ class IndexLayout( GeneralLayout ):
 		return dcc.Markdown( text )
 
 	def generate_model_table( self ):
-		""" Generate a Bootstrap table containing list of current topic model metadata. """
+		""" Generate a table containing list of current topic model metadata. """
 		df = self.webcore.df_models
 		# watch out for empty tables
 		if len(df) == 0:
@@ -136,17 +139,13 @@ class IndexLayout( GeneralLayout ):
 		for index, row in df.iterrows():
 			model_id = row["Name"]
 			links[index] = self.generate_link( "topics", {"id":model_id} )
-		# generate the table with checkboxes, and keep a record of the boxes
-		model_table = CheckboxTable( df, id="model-table", links=links, alignments=alignments, 
-			striped=False, hover=True, select_label="Select" )
-		table = model_table.generate_layout()
-		self.model_checkboxes = [] 
-		for i in range(len(model_table.checkbox_ids)):
-			self.model_checkboxes.append( df.iloc[i]["Name"] )
-		return table
+		# generate the table with checkboxes, where the selected rows are identified by model name
+		self.selected_model_ids = []
+		return DataFrameDataTable( df, id="model-table", links=links, alignments=alignments, 
+			row_ids=list(df["Name"]), row_selectable=True ).generate_layout()
 
 	def generate_embedding_table( self ):
-		""" Generate a Bootstrap table containing list of current word embedding metadata. """
+		""" Generate a table containing list of current word embedding metadata. """
 		df = self.webcore.df_embeddings
 		# watch out for empty tables
 		if len(df) == 0:
@@ -158,4 +157,4 @@ class IndexLayout( GeneralLayout ):
 		for index, row in df.iterrows():
 			model_id = row["Name"]
 			links[index] = self.generate_link( "embedding", { "id":model_id } )
-		return DataFrameTable( df, id="embedding-table", links=links, alignments=alignments, striped=False, hover=True ).generate_layout()
+		return DataFrameDataTable( df, id="embedding-table", links=links, alignments=alignments ).generate_layout()
@@ -1,12 +1,11 @@
 import logging as log
-import warnings
 import dash, dash_table
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
-from sklearn import manifold
 # TopicScan imports
 from webconfig import config
+from model.projection import MDSProjection
 from webvalidation import TopicValidator
 from layouts.general import GeneralLayout
 
@@ -123,7 +122,7 @@ class ScatterLayout( GeneralLayout ):
 			return ""
 		# already cached these results?
 		if self.current_embed_id in self.topiclevel_cache:
-			coords = self.topiclevel_cache[self.current_embed_id]
+			coords, stats = self.topiclevel_cache[self.current_embed_id]
 			log.info("Using cached MDS coordinates for embedding %s" % self.current_embed_id )
 		else:
 			# get the word embedding
@@ -136,8 +135,8 @@ class ScatterLayout( GeneralLayout ):
 			if D is None:
 				return ""
 			# apply MDS
-			coords = self.__apply_mds( D )
-			self.topiclevel_cache[self.current_embed_id] = coords		
+			coords, stats = self.__apply_mds( D )
+			self.topiclevel_cache[self.current_embed_id] = ( coords, stats )
 		# generate the chart
 		num_fmt = "%02d" if self.metadata["k"] < 100 else "%03d"
 		labels, hovertext = [], []
@@ -154,7 +153,7 @@ class ScatterLayout( GeneralLayout ):
 			point_size = 35
 		colors = self.get_colors( self.metadata["k"] )
 		s_colors = [ self.format_color_string(color) for color in colors ]
-		return dcc.Graph(
+		chart = dcc.Graph(
 			id='chart_topicscatter',
 			figure={
 				'data': [
@@ -184,13 +183,14 @@ class ScatterLayout( GeneralLayout ):
 					'xaxis' : { 'tickfont' : { "size" : 14 }, 'zeroline' : False, 'hoverformat' : ".2f" },
 				}
 			})	
+		return html.Div( [ chart, self.__generate_mds_caption( len(coords), stats ) ] )
 
 	def generate_termlevel_plot( self ):
 		if self.current_embed_id is None:
 			return ""
 		# already cached these results?
 		if self.current_embed_id in self.termlevel_cache:
-			( terms, coords ) = self.termlevel_cache[self.current_embed_id]
+			( terms, coords, stats ) = self.termlevel_cache[self.current_embed_id]
 			log.info("Using cached MDS term coordinates for embedding %s" % self.current_embed_id )
 		else:
 			# get the word embedding
@@ -204,8 +204,8 @@ class ScatterLayout( GeneralLayout ):
 				return ""
 			terms = list( df.index )
 			# apply MDS
-			coords = self.__apply_mds( df )
-			self.termlevel_cache[self.current_embed_id] = ( list(df.index), coords )
+			coords, stats = self.__apply_mds( df.values )
+			self.termlevel_cache[self.current_embed_id] = ( terms, coords, stats )
 		# generate the chart
 		if len(terms) <= 30:
 			point_size = 30
@@ -225,7 +225,7 @@ class ScatterLayout( GeneralLayout ):
 				s_colors.append( s_multi )
 				s_indexes = [ str(i+1) for i in term_map[term] ]
 				hovertext.append( "Topics %s" % ", ".join(s_indexes) )
-		return dcc.Graph(
+		chart = dcc.Graph(
 			id='chart_termscatter',
 			figure={
 				'data': [
@@ -256,13 +256,20 @@ class ScatterLayout( GeneralLayout ):
 					'xaxis' : { 'tickfont' : { "size" : 14 }, 'zeroline' : False, 'hoverformat' : ".2f" },
 				}
 			})	
+		return html.Div( [ chart, self.__generate_mds_caption( len(coords), stats ) ] )
 
 	def __apply_mds( self, D ):
-		""" Applies Multidimensional scaling (MDS) to the specified distance matrix
-		and returns the resulting coordinates """
-		with warnings.catch_warnings():
-			warnings.simplefilter("ignore")		
-			mds = manifold.MDS(n_components=2, random_state=config.get("random_seed", 100), dissimilarity="euclidean")
-			results = mds.fit(D)
-		# we just need the coordinates
-		return results.embedding_		
+		""" Applies Multidimensional scaling (MDS) to the specified precomputed distance matrix
+		and returns the resulting coordinates, along with the run statistics """
+		mds = MDSProjection( method=config.get("mds_method", "auto"), num_landmarks=config.get("mds_landmarks", 500), 
+			random_state=config.get("random_seed", 100) )
+		coords = mds.apply( D )
+		stats = mds.get_stats()
+		log.info("Applied %s MDS to %d points in %.3f secs" % ( stats["method"], len(coords), stats["time"] ) )
+		return coords, stats
+
+	def __generate_mds_caption( self, num_points, stats ):
+		""" Generate a caption describing how the MDS coordinates were computed. """
+		method_names = { "classical" : "Classical MDS", "landmark" : "Landmark MDS", "smacof" : "SMACOF MDS" }
+		text = "%s applied to %d points in %.2f seconds." % ( method_names.get(stats["method"], stats["method"]), num_points, stats["time"] )
+		return html.Small( text, className="text-muted" )
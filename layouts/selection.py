@@ -0,0 +1,299 @@
+import logging as log
+import threading
+import pandas as pd
+import dash_bootstrap_components as dbc
+import dash_core_components as dcc
+import dash_html_components as html
+# TopicScan imports
+from webconfig import config
+from webselection import KSelector, get_sweep_id
+from webvalidation import measure_names, measure_short_names
+from layouts.general import GeneralLayout
+from layouts.dftable import DataFrameDataTable
+# --------------------------------------------------------------
+
+class SelectionLayout(GeneralLayout):
+
+	def __init__( self, webcore, all_model_metadata ):
+		super(SelectionLayout, self).__init__( webcore )
+		# model selection
+		self.selector = KSelector()
+		# page details
+		self.page_title = "%s - Model Selection" % self.page_title
+		self.page_suffix = "-selection"
+		# current state
+		self.all_metadata = all_model_metadata
+		self.sweep_ids = sorted( set( get_sweep_id(meta) for meta in all_model_metadata ) )
+		self.current_sweep_id = self.sweep_ids[0] if len(self.sweep_ids) > 0 else None
+		self.current_embed_id = None
+		self.current_measure_id = config.get( "default_measure", "coherence" )
+		# cache of selection reports
+		self.report_cache = {}
+		# embeddings for which the selection report is still being computed in the background
+		self.report_progress = set()
+		# error messages, for reports which failed
+		self.report_errors = {}
+
+	def get_header_subtext( self ):
+		""" Return the string which is displayed in the header, beside the logo. """
+		return ""
+
+	def generate_main_panel( self ):
+		""" Generate the main panel for this page. """
+		return html.Div([
+			dbc.Row(
+				html.Div([
+					dbc.Col( self.generate_overview_card() ) ],
+					className='col-lg-12'
+				) ),
+			dbc.Row( [
+					html.Div([
+						dcc.Link(id="aselection", href=""),
+						dbc.Col( self.generate_selection_card() ) ],
+						className='col-lg-12'
+					),
+				] ),
+			dbc.Row( [
+					html.Div([
+						dcc.Link(id="aschart", href=""),
+						dbc.Col( self.generate_schart_card() ) ],
+						className='col-lg-12'
+					),
+				] ),
+			], className='content'
+		)
+
+	def generate_overview_card( self ):
+		return dbc.Card(
+			[
+				dbc.CardHeader("Overview: Model Summary", className="card-header"),
+				dbc.CardBody(
+					[
+						html.Div( self.generate_overview_card_text(), className="card-text"),
+						html.Div( self.generate_model_table(), className="comparison-table" ),
+					]
+				),
+			],
+		)
+
+	def generate_selection_card( self ):
+		""" Generate Dash layout for the recommended number of topics and the per-k statistics. """
+		return dbc.Card(
+			[
+				dbc.CardHeader("Number of Topics", className="card-header"),
+				dbc.CardBody(
+					[
+						html.Div( self.generate_selection_card_text(), className="card-text"),
+						dbc.Row( [
+							dbc.InputGroup(
+								[
+									dbc.InputGroupAddon("Select Sweep", addon_type="prepend"),
+									self.generate_sweep_dropdown()
+								], className="col-sm"
+							),
+							dbc.InputGroup(
+								[
+									dbc.InputGroupAddon("Select Embedding", addon_type="prepend"),
+									self.generate_embedding_dropdown()
+								], className="col-sm"
+							),
+						] ),
+						html.Div( self.generate_summary(), id='content_selection_summary'),
+						html.Div( self.generate_stable(), id='content_selection_table'),
+						# used to refresh the page while the selection report is being computed
+						dcc.Interval( id='selection-interval', interval=1000, disabled=True ),
+					]
+				),
+			])
+
+	def generate_schart_card( self ):
+		return dbc.Card(
+			[
+				dbc.CardHeader("Validation Charts", className="card-header"),
+				dbc.CardBody(
+					[
+						html.Div( self.generate_schart_card_text(), className="card-text"),
+						dbc.InputGroup(
+							[
+								dbc.InputGroupAddon("Select Measure", addon_type="prepend"),
+								self.generate_measure_dropdown()
+							]
+						),
+						html.Div( self.generate_schart(), id='content_selection_chart'),
+					]
+				),
+			])
+
+	def generate_overview_card_text( self ):
+		text = "The number of topics can be selected for %d parameter sweep(s), based on the %d topic models listed below." % (
+			len(self.sweep_ids), len(self.all_metadata) )
+		return dcc.Markdown( text )
+
+	def generate_selection_card_text( self ):
+		text = "For each number of topics *k*, the model-level validation scores are averaged across all runs,"
+		text += " where similarities are calculated using the word embedding selected below. Stability is the agreement"
+		text += " between the topic descriptors of different runs. The recommended value of *k* has the best average rank across all measures."
+		return dcc.Markdown( text )
+
+	def generate_schart_card_text( self ):
+		text = "Select a topic validation measure below to view its mean and standard deviation for each number of topics,"
+		text += " along with the stability of the topics, based on the word embedding selected above."
+		return dcc.Markdown( text )
+
+	def generate_model_table( self ):
+		""" Generate a table containing list of current topic model metadata. """
+		rows = []
+		for meta in self.all_metadata:
+			rows.append( { "Name" : meta["id"], "Corpus" : meta["corpus"], "Algorithm" : meta["algorithm"]["id"],
+				"Topics" : meta["k"], "Documents" : meta["documents"], "Terms" : meta["terms"] } )
+		df = pd.DataFrame( rows ).sort_values( by=["Corpus","Topics","Name"] )
+		alignments = { "Topics" : "right", "Documents" : "right", "Terms" : "right" }
+		return DataFrameDataTable( df, id="selection-model-table", alignments=alignments ).generate_layout()
+
+	def generate_sweep_dropdown( self ):
+		""" Utility function to generate a dropdown component which allows the user
+		to choose between different parameter sweeps. """
+		sweep_options = [ { "label":sweep_id, "value":sweep_id } for sweep_id in self.sweep_ids ]
+		return dbc.Select( id="selection-sweep-dropdown", options=sweep_options, value=self.current_sweep_id )
+
+	def get_sweep_report( self ):
+		""" Return the part of the selection report for the current sweep and embedding. The first call 
+		for an embedding starts computing the report in the background, and until this completes None 
+		is returned. """
+		embed_id = self.current_embed_id
+		if embed_id is None or self.current_sweep_id is None:
+			return None
+		# note: the report is cached before its progress is cleared, so the progress is checked first
+		if embed_id in self.report_progress or embed_id in self.report_errors:
+			return None
+		# already cached this report?
+		if not embed_id in self.report_cache:
+			embed = self.webcore.get_embedding(embed_id)
+			if embed is None:
+				self.report_errors[embed_id] = "Unable to load word embedding %s" % embed_id
+				return None
+			log.info("Selecting number of topics for %d topic models using %s ..." % (len(self.all_metadata), embed_id) )
+			self.report_progress.add( embed_id )
+			thread = threading.Thread( target=self.__run_report, args=(embed_id, embed), daemon=True )
+			thread.start()
+			# give quick evaluations a chance to finish, so that the report is shown straight away
+			thread.join( 1.0 )
+			if embed_id in self.report_progress or not embed_id in self.report_cache:
+				return None
+		for sweep in self.report_cache[embed_id]["sweeps"]:
+			if sweep["id"] == self.current_sweep_id:
+				return sweep
+		return None
+
+	def is_report_complete( self ):
+		""" Return True if the selection report for the current embedding has been computed, or if 
+		computing it has failed. """
+		embed_id = self.current_embed_id
+		if embed_id is None:
+			return True
+		return not embed_id in self.report_progress and (embed_id in self.report_cache or embed_id in self.report_errors)
+
+	def __run_report( self, embed_id, embed ):
+		""" Compute the selection report for all topic models using the specified embedding. """
+		try:
+			self.report_cache[embed_id] = self.selector.get_report( self.all_metadata, { embed_id : embed } )
+		except Exception as e:
+			log.error("Failed to select number of topics using %s" % embed_id)
+			log.error(e)
+			self.report_errors[embed_id] = str(e)
+		self.report_progress.discard( embed_id )
+
+	def generate_summary( self ):
+		""" Generate a summary of the recommended number of topics for the current sweep. """
+		sweep = self.get_sweep_report()
+		if sweep is None:
+			# still computing the report?
+			if self.current_embed_id in self.report_errors:
+				text = "Failed to select the number of topics: %s" % self.report_errors[self.current_embed_id]
+				return html.P( text, className="card-text" )
+			if not self.is_report_complete():
+				text = "Evaluating %d topic models using %s ..." % ( len(self.all_metadata), self.current_embed_id )
+				return html.P( text, className="card-text" )
+			return ""
+		text = "Based on %d topic models, the recommended number of topics is **k=%d**." % ( sweep["models"], sweep["recommended_k"] )
+		best = []
+		for measure_id in measure_names:
+			name = "%s/%s" % ( self.current_embed_id, measure_id )
+			if name in sweep["best_k"]:
+				best.append( "%s (k=%d)" % ( measure_short_names[measure_id], sweep["best_k"][name] ) )
+		if "stability" in sweep["best_k"]:
+			best.append( "Stability (k=%d)" % sweep["best_k"]["stability"] )
+		text += " Best values for each measure: %s." % ", ".join( best )
+		return dcc.Markdown( text, className="card-text" )
+
+	def generate_stable( self ):
+		""" Generate a table of the per-k statistics for the current sweep. """
+		sweep = self.get_sweep_report()
+		if sweep is None:
+			return ""
+		fmt = config.get( "float_format", "%.3f" )
+		rows = []
+		for row in sweep["k"]:
+			table_row = { "Topics" : row["k"], "Runs" : row["runs"] }
+			table_row["Stability"] = "" if row["stability"] is None else fmt % row["stability"]
+			scores = row["scores"][self.current_embed_id]
+			for measure_id in measure_names:
+				if measure_id in scores:
+					table_row[measure_short_names[measure_id]] = fmt % scores[measure_id]["mean"]
+			table_row["Mean Rank"] = "%.2f" % row["mean_rank"]
+			rows.append( table_row )
+		df = pd.DataFrame( rows )
+		alignments = { c : "right" for c in df.columns }
+		return DataFrameDataTable( df, id="selection-k-table", alignments=alignments ).generate_layout()
+
+	def generate_schart( self ):
+		""" Generate a chart of the mean and standard deviation of the current measure for each
+		number of topics, with the stability of the topics on a secondary axis. """
+		sweep = self.get_sweep_report()
+		if sweep is None:
+			return ""
+		xvalues, yvalues, errors, stability = [], [], [], []
+		for row in sweep["k"]:
+			score = row["scores"][self.current_embed_id].get(self.current_measure_id)
+			if score is None:
+				continue
+			xvalues.append( row["k"] )
+			yvalues.append( score["mean"] )
+			errors.append( score["var"] ** 0.5 )
+			stability.append( row["stability"] )
+		return dcc.Graph(
+			id='chart_selection',
+			figure={
+				'data': [
+					{
+						'x': xvalues,
+						'y': yvalues,
+						'error_y' : { 'type' : 'data', 'array' : errors, 'visible' : True },
+						'type': 'scatter',
+						'mode' : 'lines+markers',
+						'name' : measure_short_names[self.current_measure_id],
+						'marker' : { 'color': 'rgba(18, 0, 230, 0.6)' },
+						'hoverlabel' : { 'bgcolor' : 'rgb(250, 246, 208)' }
+					},
+					{
+						'x': xvalues,
+						'y': stability,
+						'yaxis' : 'y2',
+						'type': 'scatter',
+						'mode' : 'lines+markers',
+						'name' : 'Stability',
+						'line' : { 'dash' : 'dot' },
+						'marker' : { 'color': 'rgba(230, 120, 0, 0.6)' },
+						'hoverlabel' : { 'bgcolor' : 'rgb(250, 246, 208)' }
+					},
+				],
+				'layout':
+				{
+					'height' : 500,
+					'margin': { "t" : 40, "l" : 80, "r" : 80 },
+					'xaxis' : { 'title' : 'Number of Topics', 'titlefont' : { "size" : 15 }, 'dtick' : 1 },
+					'yaxis' : { 'title' : measure_names[self.current_measure_id], 'titlefont' : { "size" : 15 } },
+					'yaxis2' : { 'title' : 'Stability', 'titlefont' : { "size" : 15 }, 'overlaying' : 'y', 'side' : 'right', 'range' : [0, 1] },
+					'legend' : { 'orientation' : 'h' },
+				}
+			})
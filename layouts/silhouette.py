@@ -246,42 +246,45 @@ class SilhouetteLayout( GeneralLayout ):
 			if scores is None:
 				return ""
 			self.termlevel_cache[self.current_embed_id] = scores
-		# create the values for the chart, based on the currently selected topic
-		term_scores = pd.Series( scores[self.current_topic_index-1] ).sort_values(ascending=True)
+		# generate the charts for all topics, to allow switching between topics on the client
+		figures = [ self.generate_termlevel_figure( scores, topic_index ) for topic_index in range( 1, self.metadata["k"] + 1 ) ]
+		return self.generate_topic_figure_chart( 'chart_termsil', 'store_termsil', figures, self.current_topic_index )
+
+	def generate_termlevel_figure( self, scores, topic_index ):
+		""" Generate the figure for the term-level silhouette chart for the specified topic. """
+		term_scores = pd.Series( scores[topic_index-1] ).sort_values(ascending=True)
 		xvalues, yvalues = [], []
-		for term, score in term_scores.iteritems():
+		for term, score in term_scores.items():
 			xvalues.append( round( score, config.get("precision", 3) ) )
 			yvalues.append( term )
 		# choose a sensible range for the x-axis
 		min_value, max_value = -1, 1
 		# get the color from the palette
 		colors =  self.get_colors( self.metadata["k"] )
-		s_rgb = self.format_color_string( colors[self.current_topic_index-1] )
+		s_rgb = self.format_color_string( colors[topic_index-1] )
 		# generate the chart
-		return dcc.Graph(
-			id='chart_topicsil',
-			figure={
-				'data': [
-					{
-						'x': xvalues, 
-						'y': yvalues, 
-						'type': 'bar',
-						'orientation' : 'h',
-						'marker' : { 'color': s_rgb, 'opacity': 0.4 },
-						'hovertemplate': '<b>%{y}</b>: %{x}<extra></extra>',
-						'hoverlabel' : { 'bgcolor' : 'rgb(250, 246, 208)' }
-		    		},
-				],
-				'layout': 
-				{ 
-					'margin': { "t" : 30, "l" : 120, "r" : 120 },
-					'yaxis' : { 'tickfont' : { "size" : 14 } },
-					'xaxis' : { 'title' : "Term Silhouette Score", 
-						'tickfont' : { "size" : 14 },
-						'titlefont' : { "size" : 15 },
-						'range': [min_value, max_value] }
-				}
-			})	
+		return {
+			'data': [
+				{
+					'x': xvalues, 
+					'y': yvalues, 
+					'type': 'bar',
+					'orientation' : 'h',
+					'marker' : { 'color': s_rgb, 'opacity': 0.4 },
+					'hovertemplate': '<b>%{y}</b>: %{x}<extra></extra>',
+					'hoverlabel' : { 'bgcolor' : 'rgb(250, 246, 208)' }
+	    		},
+			],
+			'layout': 
+			{ 
+				'margin': { "t" : 30, "l" : 120, "r" : 120 },
+				'yaxis' : { 'tickfont' : { "size" : 14 } },
+				'xaxis' : { 'title' : "Term Silhouette Score", 
+					'tickfont' : { "size" : 14 },
+					'titlefont' : { "size" : 15 },
+					'range': [min_value, max_value] }
+			}
+		}
 
 	def generate_distribution_chart( self ):
 		if self.current_embed_id is None:
@@ -6,7 +6,7 @@ import dash_bootstrap_components as dbc
 # TopicScan imports
 from webconfig import config
 from layouts.general import GeneralLayout
-from layouts.dftable import DataFrameTable
+from layouts.dftable import DataFrameDataTable
 
 # --------------------------------------------------------------
 
@@ -25,8 +25,6 @@ class TopicModelLayout( GeneralLayout ):
 		self.current_term_topic_index = 1
 		self.current_document_topic_index = 1
 		# cache
-		self.term_associations = None
-		self.document_associations = None
 		self.partition_df = None
 
 	def get_header_subtext( self ):
@@ -191,109 +189,111 @@ class TopicModelLayout( GeneralLayout ):
 		""" Generate the topic model table """
 		df = self.metadata.get_descriptor_df()
 		alignments = { "Topic" : "center" }
-		return DataFrameTable( df, id="descriptor-table", alignments=alignments, striped=False, hover=False ).generate_layout()
+		return DataFrameDataTable( df, id="descriptor-table", alignments=alignments ).generate_layout()
 
 	def generate_term_association_chart( self ):
+		""" Generate the term association chart for the selected topic, along with the precomputed
+		charts for all other topics. """
 		descriptors = self.metadata.get_descriptors()
 		if descriptors is None:
 			return ""
-		if self.term_associations is None:
-			self.term_associations = self.metadata.get_term_associations()
-		if self.term_associations is None:
-			return ""
-		# get the top terms for this topic
-		weights = self.term_associations[self.current_term_topic_index].sort_values(ascending=False).head( self.top_associations )
-		max_value = self.term_associations.max().max()
+		figures = [ self.generate_term_association_figure( topic_index ) for topic_index in range( 1, self.metadata["k"] + 1 ) ]
+		return self.generate_topic_figure_chart( 'chart_term_assoc', 'store_term_assoc', figures, self.current_term_topic_index )
+
+	def generate_term_association_figure( self, topic_index ):
+		""" Generate the figure for the term association chart for the specified topic. """
+		descriptors = self.metadata.get_descriptors()
+		# get the precomputed top terms for this topic
+		terms, weights = self.metadata.get_top_term_associations( topic_index-1, self.top_associations )
+		max_value = self.metadata.get_max_term_association()
 		# reverse the order
-		weights = weights.sort_values(ascending=True)
 		xvalues, yvalues = [], []
-		for doc_id, score in weights.iteritems():
-			xvalues.append( round( score, config.get("precision", 3) ) )
-			yvalues.append( doc_id + " ")
+		for term, score in zip( reversed(terms), reversed(weights) ):
+			xvalues.append( round( float(score), config.get("precision", 3) ) )
+			yvalues.append( term + " ")
 		# get the color from the palette
 		colors = self.get_colors( self.metadata["k"] )
-		s_rgb = self.format_color_string( colors[self.current_term_topic_index-1] )
+		s_rgb = self.format_color_string( colors[topic_index-1] )
 		# generate the chart
-		title = "Topic %02d: %s" % ( self.current_term_topic_index, ", ".join( descriptors[self.current_term_topic_index-1] ) )
+		title = "Topic %02d: %s" % ( topic_index, ", ".join( descriptors[topic_index-1] ) )
 		chart_height = self.get_barchart_height( len(xvalues) )
-		return dcc.Graph(
-			id='chart_term_assoc',
-			figure={
-				'data': [
-					{
-						'x': xvalues, 
-						'y': yvalues, 
-						'type': 'bar',
-						'orientation' : 'h',
-						'marker' : { 'color': s_rgb, 'opacity': 0.4 },
-						'hovertemplate': '<b>%{y}</b>: %{x}<extra></extra>',
-						'hoverlabel' : { 'bgcolor' : 'rgb(250, 246, 208)' }
-		    		},
-				],
-				'layout': 
-				{ 
-					'title' : { 'text': title, 'font' : { "size" : 15 } },
-					'height' : chart_height,
-					'margin': { "t" : 40, "l" : 200, "r" : 200 },
-					'yaxis' : { 'tickfont' : { "size" : 14 } },
-					'xaxis' : { 'title' : "Topic-Term Association", 
-						'tickfont' : { "size" : 13 },
-						'titlefont' : { "size" : 15 },
-						'range': [0, max_value]
-					},
-				}
-			})			
+		return {
+			'data': [
+				{
+					'x': xvalues, 
+					'y': yvalues, 
+					'type': 'bar',
+					'orientation' : 'h',
+					'marker' : { 'color': s_rgb, 'opacity': 0.4 },
+					'hovertemplate': '<b>%{y}</b>: %{x}<extra></extra>',
+					'hoverlabel' : { 'bgcolor' : 'rgb(250, 246, 208)' }
+	    		},
+			],
+			'layout': 
+			{ 
+				'title' : { 'text': title, 'font' : { "size" : 15 } },
+				'height' : chart_height,
+				'margin': { "t" : 40, "l" : 200, "r" : 200 },
+				'yaxis' : { 'tickfont' : { "size" : 14 } },
+				'xaxis' : { 'title' : "Topic-Term Association", 
+					'tickfont' : { "size" : 13 },
+					'titlefont' : { "size" : 15 },
+					'range': [0, max_value]
+				},
+			}
+		}
 
 	def generate_document_association_chart( self ):
+		""" Generate the document association chart for the selected topic, along with the precomputed
+		charts for all other topics. """
 		descriptors = self.metadata.get_descriptors()
 		if descriptors is None:
 			return ""
-		if self.document_associations is None:
-			self.document_associations = self.metadata.get_document_associations()
-		if self.document_associations is None:
-			return ""
-		# get the top documents for this topic
-		weights = self.document_associations[self.current_document_topic_index].sort_values(ascending=False).head( self.top_associations )
-		max_value = self.document_associations.max().max()
+		figures = [ self.generate_document_association_figure( topic_index ) for topic_index in range( 1, self.metadata["k"] + 1 ) ]
+		return self.generate_topic_figure_chart( 'chart_document_assoc', 'store_document_assoc', figures, self.current_document_topic_index )
+
+	def generate_document_association_figure( self, topic_index ):
+		""" Generate the figure for the document association chart for the specified topic. """
+		descriptors = self.metadata.get_descriptors()
+		# get the precomputed top documents for this topic
+		doc_ids, weights = self.metadata.get_top_document_associations( topic_index-1, self.top_associations )
+		max_value = self.metadata.get_max_document_association()
 		# reverse the order
-		weights = weights.sort_values(ascending=True)
 		xvalues, yvalues = [], []
-		for doc_id, score in weights.iteritems():
-			xvalues.append( round( score, config.get("precision", 3) ) )
+		for doc_id, score in zip( reversed(doc_ids), reversed(weights) ):
+			xvalues.append( round( float(score), config.get("precision", 3) ) )
 			yvalues.append( doc_id + " " )
 		# get the color from the palette
 		colors = self.get_colors( self.metadata["k"] )
-		s_rgb = self.format_color_string( colors[self.current_document_topic_index-1] )
+		s_rgb = self.format_color_string( colors[topic_index-1] )
 		# generate the chart
-		title = "Topic %02d: %s" % ( self.current_document_topic_index, ", ".join( descriptors[self.current_document_topic_index-1] ) )
+		title = "Topic %02d: %s" % ( topic_index, ", ".join( descriptors[topic_index-1] ) )
 		chart_height = self.get_barchart_height( len(xvalues) )
-		return dcc.Graph(
-			id='chart_document_assoc',
-			figure={
-				'data': [
-					{
-						'x': xvalues, 
-						'y': yvalues, 
-						'type': 'bar',
-						'orientation' : 'h',
-						'marker' : { 'color': s_rgb, 'opacity': 0.4 },
-						'hovertemplate': '<b>%{y}</b>: %{x}<extra></extra>',
-						'hoverlabel' : { 'bgcolor' : 'rgb(250, 246, 208)' }
-		    		},
-				],
-				'layout': 
-				{ 
-					'title' : { 'text': title, 'font' : { "size" : 15 } },
-					'height' : chart_height,
-					'margin': { "t" : 40, "l" : 250, "r" : 100 },
-					'yaxis' : { 'tickfont' : { "size" : 14 } },
-					'xaxis' : { 'title' : "Topic-Document Association", 
-						'tickfont' : { "size" : 13 },
-						'titlefont' : { "size" : 15 },
-						'range': [0, max_value]
-					},
-				}
-			})
+		return {
+			'data': [
+				{
+					'x': xvalues, 
+					'y': yvalues, 
+					'type': 'bar',
+					'orientation' : 'h',
+					'marker' : { 'color': s_rgb, 'opacity': 0.4 },
+					'hovertemplate': '<b>%{y}</b>: %{x}<extra></extra>',
+					'hoverlabel' : { 'bgcolor' : 'rgb(250, 246, 208)' }
+	    		},
+			],
+			'layout': 
+			{ 
+				'title' : { 'text': title, 'font' : { "size" : 15 } },
+				'height' : chart_height,
+				'margin': { "t" : 40, "l" : 250, "r" : 100 },
+				'yaxis' : { 'tickfont' : { "size" : 14 } },
+				'xaxis' : { 'title' : "Topic-Document Association", 
+					'tickfont' : { "size" : 13 },
+					'titlefont' : { "size" : 15 },
+					'range': [0, max_value]
+				},
+			}
+		}
 
 	def generate_partition_chart( self ):
 		if self.partition_df is None:
@@ -5,9 +5,8 @@ import dash_html_components as html
 import dash_bootstrap_components as dbc
 # TopicScan imports
 from webconfig import config
-from webvalidation import TopicValidator, measure_names, measure_short_names
+from webvalidation import TopicValidator, compute_histogram, measure_names, measure_short_names
 from layouts.general import GeneralLayout
-from layouts.dftable import DataFrameTable
 
 # --------------------------------------------------------------
 
@@ -153,6 +152,7 @@ class ValidationLayout( GeneralLayout ):
 
 	def generate_vtable_card_text1( self ):		
 		text = "Validation of %d individual topics using a range of measures, based on the word embedding selected above." % self.metadata["k"]
+		text += " Coverage is the fraction of the terms in each topic descriptor which appear in the embedding."
 		return dcc.Markdown(text)
 
 	def generate_vtable_card_text2( self ):		
@@ -248,11 +248,13 @@ class ValidationLayout( GeneralLayout ):
 		df_mean = df_mean.round( config.get("precision",3) )
 		data = []
 		columns = [ "Measure", "Mean Value" ]
-		for i, value in df_mean.iteritems():
+		for i, value in df_mean.items():
 			if not i in measure_names:
 				continue
 			label = "%s (%s)" %( measure_names[i], measure_short_names[i] )
 			data.append( { "Measure" : label, "Mean Value" : value } )
+		if "Coverage" in df_mean:
+			data.append( { "Measure" : "Embedding Coverage", "Mean Value" : df_mean["Coverage"] } )
 		# generate 
 		return dash_table.DataTable(
 		    id='validation_summary',
@@ -337,12 +339,13 @@ class ValidationLayout( GeneralLayout ):
 			})	
 
 	def generate_vdistribution( self ):
-		""" Generates a Dash histogram plot of descriptor term pairwise similarity values. """
+		""" Generates a Dash chart of the histograms of descriptor term pairwise similarity values, where the
+		bin counts are computed on the server. """
 		if self.current_embed_id is None:
 			return ""
 		# already cached these results?
 		if self.current_embed_id in self.term_distribution_cache:
-			df = self.term_distribution_cache[self.current_embed_id]
+			sim_intra, sim_inter = self.term_distribution_cache[self.current_embed_id]
 			log.info("Using cached term similarity distribution values for embedding %s" % self.current_embed_id )
 		else:
 			# get the word embedding
@@ -350,15 +353,42 @@ class ValidationLayout( GeneralLayout ):
 			if embed is None:
 				return ""
 			log.info("Applying term similarity distribution analysis to topic model using %s ..." % self.current_embed_id )
-			df = self.validator.get_term_pair_similarity_df( self.metadata, embed, unique_only = True )
-			if df is None:
+			# separate out the intra-topic and inter-topic values
+			sim_intra, sim_inter = self.validator.get_term_pair_similarity_values( self.metadata, embed )
+			if sim_intra is None:
 				return ""
-			self.term_distribution_cache[self.current_embed_id] = df
-		# separate out the intra-topic and inter-topic values
-		sim_intra = df[df["intra"]==True]["sim"]
-		sim_inter = df[df["intra"]==False]["sim"]
+			self.term_distribution_cache[self.current_embed_id] = ( sim_intra, sim_inter )
 		log.info("Plotting term similarity distribution for %d intra- and %d inter-topic values" % (
 			len(sim_intra), len(sim_inter) ) )
+		# compute the histograms
+		num_bins = config.get("distribution_bins", 40)
+		apply_kde = config.get("distribution_kde", False)
+		precision = config.get("precision", 3)
+		data = []
+		series = [ ( "Inter-topic", sim_inter, 'rgba(18, 0, 230, 0.6)' ), ( "Intra-topic", sim_intra, 'rgba(103, 232, 0, 0.6)' ) ]
+		for name, values, color in series:
+			centers, probs, kde_probs = compute_histogram( values, num_bins, kde=apply_kde )
+			data.append( {
+				'x': centers.round( precision + 2 ).tolist(), 
+				'y': probs.round( precision ).tolist(), 
+				'width': 1.0 / num_bins,
+				'name': name,
+				'type': 'bar',
+				'marker' : { 'color': color, 'opacity': 0.6 },
+				'hovertemplate': 'Probability = %{y}<extra></extra>',
+				'hoverlabel' : { 'bgcolor' : 'rgb(250, 246, 208)' }
+			} )
+			if apply_kde:
+				data.append( {
+					'x': centers.round( precision + 2 ).tolist(), 
+					'y': kde_probs.round( precision ).tolist(), 
+					'name': "%s (KDE)" % name,
+					'type': 'scatter',
+					'mode': 'lines',
+					'line': { 'color': color.replace( "0.6)", "1.0)" ), 'width': 2, 'shape': 'spline' },
+					'hovertemplate': 'Density = %{y}<extra></extra>',
+					'hoverlabel' : { 'bgcolor' : 'rgb(250, 246, 208)' }
+				} )
 		# generate the chart
 		num_intra = '{:0,d}'.format( len(sim_intra) )
 		num_inter = '{:0,d}'.format( len(sim_inter) )
@@ -366,34 +396,12 @@ class ValidationLayout( GeneralLayout ):
 		return dcc.Graph(
 			id='chart_vdistribution',
 			figure={
-				'data': [
-					{
-						'x': sim_inter, 
-						'name': "Inter-topic",
-						'type': 'histogram',
-						# 'nbinsx': 10,
-						'bingroup': 1,
-						'histnorm' : 'probability',
-						'marker' : { 'color': 'rgba(18, 0, 230, 0.6)', 'opacity': 0.6 },
-						'hovertemplate': 'Probability = %{y}<extra></extra>',
-						'hoverlabel' : { 'bgcolor' : 'rgb(250, 246, 208)' }
-		    		},
-					{
-						'x': sim_intra, 
-						'name': "Intra-topic",
-						'type': 'histogram',
-						# 'nbinsx': 10,
-						'bingroup': 1,
-						'histnorm' : 'probability',
-						'marker' : { 'color': 'rgba(103, 232, 0, 0.6)', 'opacity': 0.6 },
-						'hovertemplate': 'Probability = %{y}<extra></extra>',
-						'hoverlabel' : { 'bgcolor' : 'rgb(250, 246, 208)' }
-		    		},
-				],
+				'data': data,
 				'layout': 
 				{ 
 					'title' : { 'text': title, 'font' : { "size" : 15 } },
 					'barmode': 'overlay',	
+					'bargap': 0,
 					'margin': { "t" : 32, "l" : 100, "r" : 50 },
 					'legend': {  'font' : { "size" : 15 }, 'orientation' : 'h' },
 					'yaxis' : { 'title' : 'Probability', 
@@ -4,15 +4,28 @@ import numpy as np
 # --------------------------------------------------------------
 
 class Embedding:
-	""" 
+	"""
 	Convenience wrapper for a Gensim word embedding, which caches pairwise similarity values
 	to improve performance when we need to repeatedly measure the similarity between the same
-	pairs of terms.
+	pairs of terms. If the paths of a matrix of normalized vectors and its vocabulary are
+	specified, these are memory-mapped directly rather than parsing the Gensim embedding file.
 	"""
-	def __init__(self, embedding_path):
+	def __init__(self, embedding_path, vectors_path = None, vocab_path = None):
 		# make sure it's a string, not a Path
 		embedding_path = str(embedding_path)
-		if "-ft" in embedding_path:
+		self.embedding_path = embedding_path
+		self.vectors_path, self.vocab_path = None, None
+		self.vectors = None
+		if not vectors_path is None and not vocab_path is None:
+			self.embedding = None
+			self.vectors_path, self.vocab_path = str(vectors_path), str(vocab_path)
+			self.vectors = np.load(self.vectors_path, mmap_mode="r")
+			with open(str(vocab_path), "r", encoding="utf8") as fin:
+				terms = fin.read().split("\n")[:-1]
+			self.terms = terms
+			self.term_index = { term : i for i, term in enumerate(terms) }
+			self.vocab = self.term_index.keys()
+		elif "-ft" in embedding_path:
 			self.embedding = gensim.models.FastText.load(embedding_path)
 			self.vocab = set(self.embedding.wv.vocab.keys())
 		else:
@@ -21,14 +34,21 @@ class Embedding:
 			self.vocab = set(self.embedding.vocab.keys())
 		# cache for pairwise term similarity scores
 		self.similarity_cache = {}
+		# cache for the row indices of topic descriptors
+		self.descriptor_cache = {}
 
 	def similarity(self, term1, term2):
 		""" Return the similarity between two terms in the embedding space """
 		pair = frozenset([term1,term2])
 		# have we already calculated the similarity between two terms?
 		if not pair in self.similarity_cache:
+			if self.vectors is None:
+				sim = self.embedding.similarity(term1, term2)
+			else:
+				# note: the vectors are already normalized to unit length
+				sim = float(np.dot(self.vectors[self.term_index[term1]], self.vectors[self.term_index[term2]]))
 			# note: we don't permit negative values
-			self.similarity_cache[pair] = max(self.embedding.similarity(term1, term2), 0)
+			self.similarity_cache[pair] = max(sim, 0)
 		return self.similarity_cache[pair]
 
 	def distance(self, term1, term2):
@@ -44,15 +64,110 @@ class Embedding:
 					valid_terms.append(term)
 			if len(valid_terms) == 0:
 				return []
-			most_similar = self.embedding.most_similar(positive=valid_terms, topn=num_neighbors)
 		else:
 			if not query in self:
 				return []
-			most_similar = self.embedding.most_similar(positive=[query], topn=num_neighbors)
-		return [ x[0] for x in most_similar ]
+			valid_terms = [query]
+		if self.vectors is None:
+			most_similar = self.embedding.most_similar(positive=valid_terms, topn=num_neighbors)
+			return [ x[0] for x in most_similar ]
+		return self.__most_similar(valid_terms, num_neighbors)
+
+	def __most_similar(self, terms, num_neighbors):
+		""" Find the nearest neighbors to the mean of the vectors for the specified terms,
+		excluding the terms themselves, in the same way as Gensim. """
+		indices = [self.term_index[term] for term in terms]
+		mean = np.mean(self.vectors[indices], axis=0)
+		mean /= max(np.linalg.norm(mean), 1e-12)
+		sims = self.vectors @ mean
+		num_candidates = min(num_neighbors + len(indices), len(sims))
+		candidates = np.argpartition(-sims, num_candidates-1)[:num_candidates]
+		candidates = candidates[np.argsort(-sims[candidates], kind="stable")]
+		exclude = set(indices)
+		return [self.terms[i] for i in candidates if not i in exclude][:num_neighbors]
+
+	def get_index(self, term):
+		""" Return the row index of a term in the embedding, or -1 if it is not in the vocabulary. """
+		if self.vectors is None:
+			if not term in self.vocab:
+				return -1
+			return self.__get_keyed_vectors().vocab[term].index
+		return self.term_index.get(term, -1)
+
+	def get_unit_vectors(self):
+		""" Return the matrix of unit-length vectors for all terms in the embedding. """
+		if self.vectors is None:
+			wv = self.__get_keyed_vectors()
+			wv.init_sims()
+			return wv.vectors_norm
+		return self.vectors
+
+	def similarity_matrix(self, indices1, indices2):
+		""" Return the similarities between the terms with two lists of row indices. As with 
+		similarity(), we don't permit negative values. """
+		V = self.get_unit_vectors()
+		return np.maximum(np.dot(V[indices1], V[indices2].T), 0).astype(float)
+
+	def get_descriptor_index(self, descriptors, cache = True):
+		""" Return the mapping from the specified topic descriptors to row indices in this embedding.
+		By default, this is only created once for each set of descriptors. """
+		if not cache:
+			return DescriptorIndex(descriptors, self)
+		key = tuple(tuple(descriptor) for descriptor in descriptors)
+		if not key in self.descriptor_cache:
+			self.descriptor_cache[key] = DescriptorIndex(descriptors, self)
+		return self.descriptor_cache[key]
+
+	def __get_keyed_vectors(self):
+		""" Return the Gensim vectors, for embeddings which are not memory-mapped. """
+		if hasattr(self.embedding, "wv"):
+			return self.embedding.wv
+		return self.embedding
+
+	def is_memory_mapped(self):
+		""" Return True if the embedding vectors are memory-mapped from disk, so that they can be
+		shared with other processes. """
+		return not self.vectors is None
 
 	def __contains__(self, term):
 		return term in self.vocab
 
 	def __len__(self):
 		return len(self.vocab)
+
+# --------------------------------------------------------------
+
+class DescriptorIndex:
+	"""
+	Maps the terms in a set of topic descriptors to their row indices in a word embedding, so that
+	each term only needs to be looked up in the vocabulary once. Terms which do not appear in the
+	embedding have the index -1, and are excluded by the coverage mask for each descriptor.
+	"""
+	def __init__(self, descriptors, embedding):
+		self.embedding = embedding
+		self.indices, self.masks = [], []
+		for descriptor in descriptors:
+			indices = np.array([embedding.get_index(term) for term in descriptor], dtype=int)
+			self.indices.append(indices)
+			self.masks.append(indices >= 0)
+		# unique rows of all terms which appear in the embedding
+		all_indices = np.concatenate(self.indices) if len(self.indices) > 0 else np.zeros(0, dtype=int)
+		self.rows = np.unique(all_indices[all_indices >= 0])
+
+	def __len__(self):
+		return len(self.indices)
+
+	def get_valid_indices(self, topic_index):
+		""" Return the row indices of the terms in a descriptor which appear in the embedding. """
+		return self.indices[topic_index][self.masks[topic_index]]
+
+	def get_coverage(self):
+		""" Return the fraction of the terms in each descriptor which appear in the embedding. """
+		return np.array([mask.mean() if len(mask) > 0 else 0.0 for mask in self.masks])
+
+	def get_similarity_matrix(self):
+		""" Return the similarities between all unique terms in the descriptors which appear in the
+		embedding, along with the positions of the valid terms from each descriptor in the matrix. """
+		S = self.embedding.similarity_matrix(self.rows, self.rows)
+		positions = [np.searchsorted(self.rows, self.get_valid_indices(i)) for i in range(len(self.indices))]
+		return S, positions
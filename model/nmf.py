@@ -1,25 +1,63 @@
+import time
 import numpy as np
 from sklearn import decomposition
+from sklearn.utils.extmath import randomized_svd
 
 # --------------------------------------------------------------
 
 class NMFWrapper:
 	""" Wrapper class backed by the scikit-learn package NMF implementation. """
-	
-	def __init__(self, max_iters = 100, init_strategy="random"):
+
+	def __init__(self, max_iters = 100, init_strategy="random", solver="cd", tol=1e-4, beta_loss="frobenius",
+		alpha=0.0, l1_ratio=0.0, use_float32=False):
 		self.max_iters = max_iters
 		self.init_strategy = init_strategy
+		self.solver = solver
+		self.tol = tol
+		self.beta_loss = beta_loss
+		self.alpha = alpha
+		self.l1_ratio = l1_ratio
+		self.use_float32 = use_float32
 		self.W = None
 		self.H = None
+		# convergence statistics for the last run
+		self.n_iter = 0
+		self.reconstruction_err = None
+		self.elapsed = 0.0
 
-	def apply(self, X, k = 2):
-		""" Apply NMF to the specified document-term matrix X. """
+	def apply(self, X, k = 2, W_init = None, H_init = None):
+		""" Apply NMF to the specified document-term matrix X. If initial factors are
+		specified, these are used to warm start the factorization. """
 		self.W = None
 		self.H = None
-		model = decomposition.NMF(init=self.init_strategy, n_components=k, max_iter=self.max_iters)
-		self.W = model.fit_transform(X)
-		self.H = model.components_			
-		
+		if self.use_float32:
+			X = X.astype(np.float32)
+		# warm start from existing factors?
+		if W_init is None or H_init is None:
+			init = self.init_strategy
+		else:
+			init = "custom"
+			W_init = np.array(W_init, dtype=X.dtype)
+			H_init = np.array(H_init, dtype=X.dtype)
+		model = decomposition.NMF(init=init, n_components=k, max_iter=self.max_iters, solver=self.solver,
+			tol=self.tol, beta_loss=self.beta_loss, alpha_W=self.alpha, alpha_H="same", l1_ratio=self.l1_ratio)
+		start = time.time()
+		self.W = model.fit_transform(X, W=W_init, H=H_init)
+		self.elapsed = time.time() - start
+		self.H = model.components_
+		self.n_iter = model.n_iter_
+		self.reconstruction_err = model.reconstruction_err_
+
+	def get_convergence_stats(self):
+		""" Return the convergence statistics for the last NMF run. """
+		if self.W is None:
+			raise ValueError("No results for previous run available")
+		return {
+			"iterations":int(self.n_iter),
+			"reconstruction_error":float(self.reconstruction_err),
+			"time":round(self.elapsed, 3)
+		}
+
 	def rank_terms(self, topic_index, top = -1):
 		""" Return the top ranked terms for the specified topic, generated during the last NMF run. """
 		if self.H is None:
@@ -35,4 +73,210 @@ class NMFWrapper:
 		""" Produce a disjoint partition of documents based on the factor generate during the last run. """
 		if self.W is None:
 			raise ValueError("No results for previous run available")
-		return np.argmax(self.W, axis = 1).flatten().tolist()		
+		return np.argmax(self.W, axis = 1).flatten().tolist()
+
+class OnlineNMFWrapper(NMFWrapper):
+	""" 
+	Mini-batch online NMF implementation for corpora which do not fit in memory, loosely based on 
+	the online approach of Mairal et al (2010). Each epoch streams row chunks of the document-term 
+	matrix, solving for the document factor of each chunk with the term factor H fixed, and then 
+	updating H from accumulated sufficient statistics. The final document factor W is built one 
+	chunk at a time, and can be written directly to a memory-mapped file.
+	"""
+	def __init__(self, max_iters = 100, init_strategy="random", tol=1e-4, use_float32=False, 
+		batch_size=2048, epochs=5, forget_factor=0.7, epoch_callback=None):
+		super(OnlineNMFWrapper, self).__init__(max_iters=max_iters, init_strategy=init_strategy, solver="mu", 
+			tol=tol, use_float32=use_float32)
+		self.batch_size = batch_size
+		self.epochs = epochs
+		self.forget_factor = forget_factor
+		# optional function called after each epoch, with the epoch number and the wrapper
+		self.epoch_callback = epoch_callback
+		self.partition = None
+		self.eps = 1e-10
+
+	def apply(self, X, k = 2, W_init = None, H_init = None, W_out_path = None):
+		""" Apply online NMF to the specified document-term matrix X, which can be any sparse matrix 
+		supporting row slicing, including one backed by memory-mapped arrays. If an output path is 
+		specified, the document factor is written to that file as a memory-mapped array. """
+		self.W = None
+		self.H = None
+		self.partition = None
+		dtype = np.float32 if self.use_float32 else np.float64
+		n, m = X.shape
+		start = time.time()
+		# initialize the term factor
+		# note: sum the stored values directly, as a memory-mapped matrix is read-only
+		avg = np.sqrt(X.data.sum() / (n * m * k))
+		if H_init is None:
+			H = (avg * np.abs(np.random.randn(k, m))).astype(dtype)
+		else:
+			H = np.array(H_init, dtype=dtype)
+		# sufficient statistics, with older batches downweighted over time
+		A = np.zeros((k, m), dtype=dtype)
+		B = np.zeros((k, k), dtype=dtype)
+		rho = self.forget_factor ** (min(self.batch_size, n) / n)
+		self.n_iter = 0
+		for epoch in range(self.epochs):
+			H_prev = H.copy()
+			for X_batch in self.__iter_batches(X, dtype):
+				W_batch = self.__solve_batch(X_batch, H, avg)
+				A = rho * A + np.asarray((X_batch.T @ W_batch).T)
+				B = rho * B + W_batch.T @ W_batch
+				# multiplicative update of the term factor
+				H *= A / (B @ H + self.eps)
+			self.n_iter += 1
+			self.H = H
+			if self.epoch_callback is not None:
+				self.epoch_callback(epoch+1, self)
+			# has the term factor converged?
+			change = np.linalg.norm(H - H_prev) / max(np.linalg.norm(H_prev), self.eps)
+			if change < self.tol:
+				break
+		# final pass to build the document factor and its partition
+		if W_out_path is None:
+			W = np.zeros((n, k), dtype=dtype)
+		else:
+			W = np.lib.format.open_memmap(str(W_out_path), mode="w+", dtype=dtype, shape=(n, k))
+		partition = []
+		HHt = H @ H.T
+		sq_err, row = 0.0, 0
+		for X_batch in self.__iter_batches(X, dtype):
+			W_batch = self.__solve_batch(X_batch, H, avg)
+			W[row:row+X_batch.shape[0], :] = W_batch
+			row += X_batch.shape[0]
+			partition += np.argmax(W_batch, axis=1).tolist()
+			# squared error ||X - WH||^2, without materializing the dense approximation
+			XHt = np.asarray(X_batch @ H.T)
+			sq_err += X_batch.multiply(X_batch).sum() - 2 * np.sum(W_batch * XHt) + np.sum((W_batch.T @ W_batch) * HHt)
+		if W_out_path is not None:
+			W.flush()
+		self.elapsed = time.time() - start
+		self.W = W
+		self.partition = partition
+		self.reconstruction_err = np.sqrt(max(sq_err, 0))
+
+	def generate_partition(self):
+		""" Return the disjoint partition of documents, computed during the final pass of the last run. """
+		if self.partition is None:
+			raise ValueError("No results for previous run available")
+		return self.partition
+
+	def __iter_batches(self, X, dtype):
+		""" Yield consecutive chunks of rows from the specified matrix. """
+		for start in range(0, X.shape[0], self.batch_size):
+			yield X[start:start+self.batch_size].astype(dtype)
+
+	def __solve_batch(self, X_batch, H, avg):
+		""" Estimate the document factor for a chunk of rows, with the term factor H fixed. """
+		W_batch = np.full((X_batch.shape[0], H.shape[0]), avg, dtype=H.dtype)
+		XHt = np.asarray(X_batch @ H.T)
+		HHt = H @ H.T
+		for i in range(self.max_iters):
+			W_prev = W_batch
+			W_batch = W_batch * XHt / (W_batch @ HHt + self.eps)
+			if np.linalg.norm(W_batch - W_prev) < self.tol * max(np.linalg.norm(W_prev), self.eps):
+				break
+		return W_batch
+
+# --------------------------------------------------------------
+
+class SVDInitializer:
+	""" 
+	Generates NNDSVD initial factors (Boutsidis, 2007) for a sweep over multiple values of k, 
+	based on a single truncated SVD which is computed once for the largest value of k. 
+	"""
+	def __init__(self, X, kmax, variant = "nndsvd", random_state = None, eps = 1e-6):
+		self.variant = variant
+		self.eps = eps
+		self.X_mean = X.mean()
+		self.random_state = random_state
+		start = time.time()
+		self.U, self.S, self.V = randomized_svd(X, kmax, random_state=random_state)
+		self.elapsed = time.time() - start
+
+	def estimate_separate_time(self, X, k_values, runs = 1):
+		""" Estimate the total time taken by computing a separate truncated SVD for every value of k 
+		and every run, as is done by the standard NNDSVD initialization. A separate SVD is timed for 
+		the smallest value of k, and the time for each value of k is interpolated linearly between 
+		this and the time for the shared SVD. """
+		kmin, kmax = min(k_values), len(self.S)
+		start = time.time()
+		randomized_svd(X, kmin, random_state=self.random_state)
+		elapsed_min = time.time() - start
+		if kmax == kmin:
+			return runs * len(k_values) * elapsed_min
+		return runs * sum(elapsed_min + (self.elapsed - elapsed_min) * (k - kmin) / (kmax - kmin) for k in k_values)
+
+	def init_factors(self, k):
+		""" Return initial factors W and H for k topics, using the leading k singular components. """
+		U, S, V = self.U, self.S, self.V
+		if k > len(S):
+			raise ValueError("Only %d singular components available for k=%d" % (len(S), k))
+		W = np.zeros((U.shape[0], k))
+		H = np.zeros((k, V.shape[1]))
+		# the leading singular vectors can be chosen non-negative
+		W[:, 0] = np.sqrt(S[0]) * np.abs(U[:, 0])
+		H[0, :] = np.sqrt(S[0]) * np.abs(V[0, :])
+		for j in range(1, k):
+			x, y = U[:, j], V[j, :]
+			# extract the positive and negative parts of the column vectors
+			x_p, y_p = np.maximum(x, 0), np.maximum(y, 0)
+			x_n, y_n = np.abs(np.minimum(x, 0)), np.abs(np.minimum(y, 0))
+			x_p_nrm, y_p_nrm = np.linalg.norm(x_p), np.linalg.norm(y_p)
+			x_n_nrm, y_n_nrm = np.linalg.norm(x_n), np.linalg.norm(y_n)
+			m_p, m_n = x_p_nrm * y_p_nrm, x_n_nrm * y_n_nrm
+			# choose the dominant part
+			if m_p > m_n:
+				u, v, sigma = x_p / x_p_nrm, y_p / y_p_nrm, m_p
+			else:
+				u, v, sigma = x_n / x_n_nrm, y_n / y_n_nrm, m_n
+			lbd = np.sqrt(S[j] * sigma)
+			W[:, j] = lbd * u
+			H[j, :] = lbd * v
+		W[W < self.eps] = 0
+		H[H < self.eps] = 0
+		# fill in the zeros for the NNDSVD variants
+		if self.variant == "nndsvda":
+			W[W == 0] = self.X_mean
+			H[H == 0] = self.X_mean
+		elif self.variant == "nndsvdar":
+			scale = self.X_mean / 100
+			W[W == 0] = np.abs(scale * np.random.randn(len(W[W == 0])))
+			H[H == 0] = np.abs(scale * np.random.randn(len(H[H == 0])))
+		return W, H
+
+	def get_split_vector(self, k):
+		""" Return the right singular vector used to split a topic when moving to k topics. """
+		if k > len(self.S):
+			return None
+		return self.V[k-1, :]
+
+def split_factors(W, H, k, split_vector = None):
+	""" Extend a pair of factors to k topics for warm starting NMF, by repeatedly splitting the 
+	topic with the largest contribution to the approximation into two topics. The terms of the
+	topic are divided based on the sign of the split vector, if specified, or randomly otherwise. """
+	W, H = np.array(W), np.array(H)
+	while H.shape[0] < k:
+		# find the topic with the largest contribution
+		contrib = np.linalg.norm(W, axis=0) * np.linalg.norm(H, axis=1)
+		j = np.argmax(contrib)
+		support = H[j, :] > 0
+		if split_vector is None:
+			mask = np.random.rand(H.shape[1]) < 0.5
+		else:
+			mask = split_vector >= 0
+			# make sure the split divides the terms for this topic
+			if np.all(mask[support]) or not np.any(mask[support]):
+				mask = np.random.rand(H.shape[1]) < 0.5
+			split_vector = None
+		h1, h2 = H[j, :] * mask, H[j, :] * ~mask
+		# avoid zero entries which some solvers cannot update
+		fill = 1e-6 * H[j, :].max()
+		h1[support & ~mask] = fill
+		h2[support & mask] = fill
+		# the two topics share the original document associations
+		H[j, :] = h1
+		H = np.vstack([H, h2])
+		W = np.hstack([W, W[:, j:j+1]])
+	return W, H
@@ -0,0 +1,131 @@
+import time
+import warnings
+import numpy as np
+from scipy.sparse.linalg import eigsh
+from sklearn import manifold
+
+# --------------------------------------------------------------
+
+def classical_mds(D, n_components = 2):
+	""" Apply classical (Torgerson) MDS to a precomputed dissimilarity matrix, by double-centering
+	the squared dissimilarities and taking the leading eigenvectors. """
+	eigenvalues, eigenvectors = top_eigenvectors(double_center(D ** 2), n_components)
+	return fix_signs(eigenvectors * np.sqrt(np.maximum(eigenvalues, 0)))
+
+def double_center(D_sq):
+	""" Return the double-centered Gram matrix -1/2 J D^2 J for the specified squared dissimilarities. """
+	B = D_sq - D_sq.mean(axis=0, keepdims=True)
+	B -= B.mean(axis=1, keepdims=True)
+	return -0.5 * B
+
+def top_eigenvectors(B, n_components):
+	""" Return the largest eigenvalues and corresponding eigenvectors of the symmetric matrix B,
+	in descending order. For larger matrices, only the leading eigenvectors are computed. """
+	if B.shape[0] <= max(100, 4 * n_components):
+		eigenvalues, eigenvectors = np.linalg.eigh(B)
+	else:
+		eigenvalues, eigenvectors = eigsh(B, k=n_components, which="LA")
+	# eigenvalues are returned in ascending order
+	order = np.argsort(eigenvalues)[::-1][:n_components]
+	return eigenvalues[order], eigenvectors[:, order]
+
+def select_landmarks(D, num_landmarks, random_state = None):
+	""" Select landmark points using MaxMin sampling, where each new landmark is the point which is
+	farthest from all landmarks selected so far. """
+	rng = np.random.RandomState(random_state)
+	landmarks = [rng.randint(D.shape[0])]
+	min_dists = np.array(D[landmarks[0]], dtype=float)
+	while len(landmarks) < num_landmarks:
+		index = int(np.argmax(min_dists))
+		landmarks.append(index)
+		min_dists = np.minimum(min_dists, D[index])
+	return np.array(landmarks)
+
+def landmark_mds(D, n_components = 2, num_landmarks = 500, random_state = None):
+	""" Apply Landmark MDS (de Silva and Tenenbaum, 2004), where classical MDS is applied to a subset of
+	landmark points only, and the remaining points are positioned by distance-based triangulation. """
+	n = D.shape[0]
+	if num_landmarks >= n:
+		return classical_mds(D, n_components)
+	landmarks = select_landmarks(D, max(num_landmarks, n_components + 1), random_state)
+	D_sq = D[landmarks, :] ** 2
+	L_sq = D_sq[:, landmarks]
+	# classical MDS on the landmarks
+	eigenvalues, eigenvectors = top_eigenvectors(double_center(L_sq), n_components)
+	# triangulate all points, based on their squared distances to the landmarks
+	pinv = eigenvectors / np.sqrt(np.maximum(eigenvalues, 1e-12))
+	coords = -0.5 * (D_sq - L_sq.mean(axis=1, keepdims=True)).T @ pinv
+	return fix_signs(coords)
+
+def fix_signs(coords):
+	""" Flip the sign of each dimension so that its largest absolute value is positive, which makes the
+	orientation of the projection deterministic. """
+	signs = np.sign(coords[np.argmax(np.abs(coords), axis=0), range(coords.shape[1])])
+	signs[signs == 0] = 1
+	return coords * signs
+
+# --------------------------------------------------------------
+
+class MDSProjection:
+	"""
+	Projects points into a low-dimensional space using Multidimensional scaling (MDS) applied to a
+	precomputed dissimilarity matrix. Supported methods are classical MDS, landmark MDS for larger
+	numbers of points, and SMACOF warm started from the classical solution. By default, the method is
+	chosen automatically based on the number of points.
+	"""
+	def __init__(self, method = "auto", n_components = 2, num_landmarks = 500, smacof_max_size = 500,
+		landmark_min_size = 2000, max_iters = 300, tol = 1e-3, random_state = None):
+		self.method = method
+		self.n_components = n_components
+		self.num_landmarks = num_landmarks
+		self.smacof_max_size = smacof_max_size
+		self.landmark_min_size = landmark_min_size
+		self.max_iters = max_iters
+		self.tol = tol
+		self.random_state = random_state
+		# statistics for the last run
+		self.method_used = None
+		self.stress = None
+		self.elapsed = 0.0
+
+	def choose_method(self, n):
+		""" Return the MDS method which will be applied to the specified number of points. """
+		if self.method != "auto":
+			return self.method
+		if n <= self.smacof_max_size:
+			return "smacof"
+		if n >= self.landmark_min_size:
+			return "landmark"
+		return "classical"
+
+	def apply(self, D):
+		""" Apply MDS to the specified dissimilarity matrix, and return the resulting coordinates. """
+		# make sure the dissimilarities are symmetric, with zero self-dissimilarity
+		D = np.array(D, dtype=float)
+		D = (D + D.T) / 2
+		np.fill_diagonal(D, 0)
+		self.method_used = self.choose_method(D.shape[0])
+		self.stress = None
+		start = time.time()
+		if self.method_used == "classical":
+			coords = classical_mds(D, self.n_components)
+		elif self.method_used == "landmark":
+			coords = landmark_mds(D, self.n_components, self.num_landmarks, self.random_state)
+		elif self.method_used == "smacof":
+			init = classical_mds(D, self.n_components)
+			with warnings.catch_warnings():
+				warnings.simplefilter("ignore")
+				coords, self.stress = manifold.smacof(D, n_components=self.n_components, init=init, n_init=1,
+					max_iter=self.max_iters, eps=self.tol, random_state=self.random_state)
+			coords = fix_signs(coords)
+		else:
+			raise ValueError("Unknown MDS method: %s" % self.method_used)
+		self.elapsed = time.time() - start
+		return coords
+
+	def get_stats(self):
+		""" Return the statistics for the last MDS run. """
+		stats = { "method" : self.method_used, "time" : round(self.elapsed, 3) }
+		if self.stress is not None:
+			stats["stress"] = float(self.stress)
+		return stats
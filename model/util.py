@@ -1,5 +1,6 @@
 import random
 import numpy as np
+from scipy import sparse
 import joblib
 
 # --------------------------------------------------------------
@@ -40,13 +41,71 @@ def save_nmf_factors(out_path, W, H, doc_ids, terms):
     """
     joblib.dump((W,H,doc_ids,terms), out_path) 
 
+def save_compact_nmf_factors(out_path, W, H, doc_ids, terms, top = 0, threshold = 0.0):
+	"""
+	Save a NMF factorization result using Joblib in a compact format, where W and H are stored as 
+	sparse single precision matrices, only retaining the top weights for each topic. The exact
+	ranked lists of the top documents and terms for each topic are saved separately, using
+	save_top_associations.
+	"""
+	data = {
+		"format":"compact",
+		"W":sparsify_factor(W, top, threshold).tocsr(),
+		"H":sparsify_factor(H.T, top, threshold).T.tocsc(),
+		"doc_ids":doc_ids,
+		"terms":terms
+	}
+	joblib.dump(data, out_path) 
+
 def load_nmf_factors(in_path):
 	"""
-	Load a NMF factorization result using Joblib.
+	Load a NMF factorization result using Joblib, stored in either the standard or compact format.
+	Note that W and H will be sparse matrices for the compact format.
 	"""
-	(W,H,doc_ids,terms) = joblib.load(in_path)
+	data = joblib.load(in_path)
+	if type(data) == dict:
+		return (data["W"],data["H"],data["doc_ids"],data["terms"])
+	(W,H,doc_ids,terms) = data
 	return (W,H,doc_ids,terms)
 
+def load_nmf_top_associations(in_path):
+	"""
+	Load the exact ranked lists of top documents and terms for each topic, which are only
+	included in NMF factorization results stored by earlier versions of the compact format.
+	"""
+	data = joblib.load(in_path)
+	if type(data) != dict:
+		return None
+	return data.get("top", None)
+
+def save_top_associations(out_path, W, H, doc_ids, terms, num_top = 100):
+	"""
+	Save the ranked lists of the top documents and terms for each topic in a NMF factorization 
+	result using Joblib, along with the maximum document and term association weights.
+	"""
+	joblib.dump(build_top_associations(W, H, doc_ids, terms, num_top), out_path) 
+
+def load_top_associations(in_path):
+	"""
+	Load the ranked lists of the top documents and terms for each topic using Joblib.
+	"""
+	return joblib.load(in_path)
+
+def build_top_associations(W, H, doc_ids, terms, num_top = 100):
+	"""
+	Build the ranked lists of the top documents and terms for each topic in a NMF factorization.
+	"""
+	top = {}
+	for key, F, labels in [("documents", W, doc_ids), ("terms", H.T, terms)]:
+		(indices, weights) = rank_factor(F, num_top)
+		top[key] = {
+			"indices":indices,
+			"weights":weights,
+			"labels":[[labels[i] for i in row] for row in indices],
+			"max":float(weights[:,0].max())
+		}
+	return top
+
 def save_partition(out_path, partition, doc_ids):
 	"""
 	Save a disjoint partition documments result using Joblib.
@@ -93,6 +152,40 @@ def truncate_term_rankings(orig_rankings, top, vocab = None):
 			trunc_rankings.append(temp)
 	return trunc_rankings
 
+def sparsify_factor(F, top = 0, threshold = 0.0):
+	"""
+	Sparsify a factor matrix with one column per topic (e.g. W, or the transpose of H) by 
+	retaining only the top weights in each column, or those weights which are at least the specified
+	fraction of the maximum weight in each column. The maximum weight in each row is always kept, 
+	so that the partition implied by the factor is unchanged.
+	"""
+	F = np.asarray(F)
+	n, k = F.shape
+	keep = np.zeros(F.shape, dtype=bool)
+	if top > 0 and top < n:
+		top_rows = np.argpartition(-F, top-1, axis=0)[0:top, :]
+		keep[top_rows, np.arange(k)] = True
+	elif threshold > 0:
+		keep = F >= threshold * F.max(axis=0)
+	else:
+		keep[:, :] = True
+	keep[np.arange(n), np.argmax(F, axis=1)] = True
+	return sparse.csr_matrix(np.where(keep & (F > 0), F, 0).astype(np.float32))
+
+def rank_factor(F, top):
+	"""
+	Return the indices and weights of the top rows for each column of a factor matrix, with one
+	column per topic, as two arrays of shape (k, top) sorted in descending order of weight.
+	"""
+	F = np.asarray(F)
+	if top < 1:
+		raise ValueError("Invalid number of top rows %s" % top)
+	top = min(top, F.shape[0])
+	indices = np.argpartition(-F, top-1, axis=0)[0:top, :].T
+	weights = np.take_along_axis(F.T, indices, axis=1)
+	order = np.argsort(-weights, axis=1)
+	return (np.take_along_axis(indices, order, axis=1), np.take_along_axis(weights, order, axis=1))
+
 def clustermap_to_partition(cluster_map, doc_ids):
 	""" Convert a dictionary, representing a clustering of documents, into a partition. """
 	cluster_names = list(cluster_map.keys())
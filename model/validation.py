@@ -1,5 +1,35 @@
 import itertools
 import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+# --------------------------------------------------------------
+
+def mean_pair_similarity(S, positions):
+	""" Return the mean similarity between all unique pairs of terms at the specified positions
+	in a similarity matrix, or 0 if there are no such pairs. """
+	if len(positions) < 2:
+		return 0.0
+	rows, cols = np.triu_indices(len(positions), 1)
+	return S[positions[rows], positions[cols]].mean()
+
+def pair_similarity_sums(S, positions):
+	""" Return a matrix containing the sums of the similarities between all pairs of terms from 
+	each pair of descriptors, along with the number of valid terms in each descriptor. """
+	# note: each row counts the occurrences of the terms in a descriptor
+	M = np.zeros((len(positions), S.shape[0]))
+	for i, topic_positions in enumerate(positions):
+		np.add.at(M[i], topic_positions, 1)
+	counts = M.sum(axis=1)
+	return M @ S @ M.T, counts
+
+def pair_similarity_means(S, positions):
+	""" Return a matrix containing the mean similarity between all pairs of terms from each pair of
+	descriptors, where the mean is 0 if either descriptor has no valid terms. """
+	sums, counts = pair_similarity_sums(S, positions)
+	denom = np.outer(counts, counts)
+	means = np.zeros(sums.shape)
+	np.divide(sums, denom, out=means, where=denom > 0)
+	return means
 
 # --------------------------------------------------------------
 
@@ -20,19 +50,15 @@ class CoherenceScore:
 		return self.evaluate_topics(descriptors).mean()
 
 	def evaluate_topics(self, descriptors):
+		S, positions = self.embedding.get_descriptor_index(descriptors).get_similarity_matrix()
 		topic_scores = []
-		for descriptor in descriptors:
-			topic_scores.append(self.evaluate_topic(descriptor))
+		for topic_positions in positions:
+			topic_scores.append(mean_pair_similarity(S, topic_positions))
 		return np.array(topic_scores)
 
 	def evaluate_topic(self, descriptor):	
-		pair_scores = []
-		for term1, term2 in itertools.combinations(descriptor, 2):
-			if term1 in self.embedding and term2 in self.embedding:
-				pair_scores.append(self.embedding.similarity(term1, term2))
-		if len(pair_scores) == 0:
-			return 0.0
-		return np.array(pair_scores).mean()
+		S, positions = self.embedding.get_descriptor_index([descriptor], False).get_similarity_matrix()
+		return mean_pair_similarity(S, positions[0])
 
 
 class TopicDifferenceScore:
@@ -48,34 +74,27 @@ class TopicDifferenceScore:
 		return True
 
 	def evaluate_model(self, descriptors):
-		topic_pair_scores = []
-		for descriptor1, descriptor2 in itertools.combinations(descriptors, 2):
-			topic_pair_scores.append(self.evaluate_distance(descriptor1, descriptor2))
-		return np.array(topic_pair_scores).mean()
+		D = self.evaluate_distance_matrix(descriptors)
+		rows, cols = np.triu_indices(len(descriptors), 1)
+		return D[rows, cols].mean()
 
 	def evaluate_topics(self, descriptors):
 		k = len(descriptors)
-		topic_scores = np.zeros(k)
-		for i in range(k):
-			for j in range(i+1, k):
-				dist = self.evaluate_distance(descriptors[i], descriptors[j])
-				topic_scores[i] += dist
-				topic_scores[j] += dist
-		topic_scores /= (k-1)
-		return topic_scores
+		D = self.evaluate_distance_matrix(descriptors)
+		np.fill_diagonal(D, 0)
+		return D.sum(axis=1) / (k-1)
+
+	def evaluate_distance_matrix(self, descriptors):
+		""" Calculate the distances between all pairs of descriptors """
+		S, positions = self.embedding.get_descriptor_index(descriptors).get_similarity_matrix()
+		return 1.0 - pair_similarity_means(S, positions)
 
 	def evaluate_distance(self, descriptor1, descriptor2):
 		return 1.0 - self.evaluate_similarity(descriptor1, descriptor2)
 
 	def evaluate_similarity(self, descriptor1, descriptor2):
-		pair_scores = []
-		for term1 in descriptor1:
-			for term2 in descriptor2:
-				if term1 in self.embedding and term2 in self.embedding:
-					pair_scores.append(self.embedding.similarity(term1, term2))
-		if len(pair_scores) == 0:
-			return 0.0
-		return np.array(pair_scores).mean()
+		S, positions = self.embedding.get_descriptor_index([descriptor1, descriptor2], False).get_similarity_matrix()
+		return pair_similarity_means(S, positions)[0,1]
 
 
 class MinMaxScore:
@@ -93,22 +112,26 @@ class MinMaxScore:
 	def evaluate_model(self, descriptors):
 		""" Calculate the overall model score based on the mean score across all unique pairs
 		of topics """
-		topic_pair_scores = []
-		for descriptor1, descriptor2 in itertools.combinations(descriptors, 2):
-			topic_pair_scores.append(self.evaluate_similarity(descriptor1, descriptor2))
-		return np.array(topic_pair_scores).mean()
+		N = self.evaluate_similarity_matrix(descriptors)
+		rows, cols = np.triu_indices(len(descriptors), 1)
+		return N[rows, cols].mean()
 
 	def evaluate_topics(self, descriptors):
 		""" Return the scores for all individual topics """
 		k = len(descriptors)
-		topic_scores = np.zeros(k)
-		for i in range(k):
-			for j in range(i+1, k):
-				sim = self.evaluate_similarity(descriptors[i], descriptors[j])
-				topic_scores[i] += sim
-				topic_scores[j] += sim
-		topic_scores /= (k-1)
-		return topic_scores
+		N = self.evaluate_similarity_matrix(descriptors)
+		np.fill_diagonal(N, 0)
+		return N.sum(axis=1) / (k-1)
+
+	def evaluate_similarity_matrix(self, descriptors):
+		""" Calculate the normalized similarity scores between all pairs of descriptors """
+		S, positions = self.embedding.get_descriptor_index(descriptors).get_similarity_matrix()
+		raw = pair_similarity_means(S, positions)
+		self_raw = np.diag(raw)
+		denom = np.outer(self_raw, self_raw)
+		N = np.zeros(raw.shape)
+		np.divide(raw, denom, out=N, where=denom != 0)
+		return N
 
 	def evaluate_similarity(self, descriptor1, descriptor2):
 		""" Calculate the normalized similarity score """
@@ -120,14 +143,8 @@ class MinMaxScore:
 
 	def evaluate_raw_similarity(self, descriptor1, descriptor2):
 		""" Calculate the raw (non-normalized) similarity score """
-		pair_scores = []
-		for term1 in descriptor1:
-			for term2 in descriptor2:
-				if term1 in self.embedding and term2 in self.embedding:
-					pair_scores.append(self.embedding.similarity(term1, term2))
-		if len(pair_scores) == 0:
-			return 0.0
-		return np.array(pair_scores).mean()
+		S, positions = self.embedding.get_descriptor_index([descriptor1, descriptor2], False).get_similarity_matrix()
+		return pair_similarity_means(S, positions)[0,1]
 
 
 class InternalExternalScore:
@@ -147,16 +164,16 @@ class InternalExternalScore:
 		return self.evaluate_topics(descriptors).mean()
 
 	def evaluate_topics(self, descriptors):
+		S, positions = self.embedding.get_descriptor_index(descriptors).get_similarity_matrix()
+		sums, counts = pair_similarity_sums(S, positions)
 		topic_scores = []
-		for topic_index1, descriptor in enumerate(descriptors):
+		for topic_index1, topic_positions in enumerate(positions):
 			# get the internal score
-			internal = self.evaluate_topic_internal(descriptor)
-			# get the external score
-			other_terms = []
-			for topic_index2, descriptor2 in enumerate(descriptors):
-				if topic_index1 != topic_index2:
-					other_terms += descriptor2
-			external = self.evaluate_topic_external(descriptor, other_terms)
+			internal = mean_pair_similarity(S, topic_positions)
+			# get the external score, based on the terms from all other topics
+			external_sum = sums[topic_index1].sum() - sums[topic_index1, topic_index1]
+			external_count = counts[topic_index1] * (counts.sum() - counts[topic_index1])
+			external = external_sum / external_count if external_count > 0 else 0.0
 			# combine the two scores
 			denom = internal + external
 			if denom == 0:
@@ -167,23 +184,12 @@ class InternalExternalScore:
 		return np.array(topic_scores)
 
 	def evaluate_topic_internal(self, descriptor):	
-		pair_scores = []
-		for term1, term2 in itertools.combinations(descriptor, 2):
-			if term1 in self.embedding and term2 in self.embedding:
-				pair_scores.append(self.embedding.similarity(term1, term2))
-		if len(pair_scores) == 0:
-			return 0.0
-		return np.array(pair_scores).mean()
+		S, positions = self.embedding.get_descriptor_index([descriptor], False).get_similarity_matrix()
+		return mean_pair_similarity(S, positions[0])
 
 	def evaluate_topic_external(self, descriptor, other_terms):
-		pair_scores = []
-		for term1 in descriptor:
-			for term2 in other_terms:
-				if term1 in self.embedding and term2 in self.embedding:
-					pair_scores.append(self.embedding.similarity(term1, term2))
-		if len(pair_scores) == 0:
-			return 0.0
-		return np.array(pair_scores).mean()
+		S, positions = self.embedding.get_descriptor_index([descriptor, other_terms], False).get_similarity_matrix()
+		return pair_similarity_means(S, positions)[0,1]
 
 
 class TopicSilhouetteScore:
@@ -208,48 +214,105 @@ class TopicSilhouetteScore:
 
 	def evaluate_topics(self, descriptors):
 		""" Evaluate a single topic """
+		index = self.embedding.get_descriptor_index(descriptors)
+		S, positions = index.get_similarity_matrix()
 		topic_scores = []
 		self.topic_term_scores = []
 		for topic_index1, descriptor1 in enumerate(descriptors):
-			topic_score = 0
-			term_scores = {}
-			# process each term
-			for term in descriptor1:
-				a, b = 0, None
-				for topic_index2, descriptor2 in enumerate(descriptors):
-					if topic_index1 == topic_index2:
-						a = self.evaluate_term_topic_distance(term, descriptor2, True)
-					else:
-						topic2_dist = self.evaluate_term_topic_distance(term, descriptor2, False)
-						if b is None or topic2_dist < b:
-							b = topic2_dist
-				# calculate the silhouette score for this term
-				numer = b - a
-				denom = max(a,b)
-				if denom == 0:
-					term_sil = 0
+			# distances from the valid terms in this topic to the valid terms in every topic
+			a, b = None, None
+			for topic_index2 in range(len(descriptors)):
+				D = 1.0 - S[np.ix_(positions[topic_index1], positions[topic_index2])]
+				if topic_index1 == topic_index2:
+					# ignore the distance from each term to itself
+					valid_indices = index.get_valid_indices(topic_index1)
+					keep = valid_indices[:,np.newaxis] != valid_indices[np.newaxis,:]
+					a = self.__mean_rows(D, keep)
 				else:
-					term_sil = numer/denom
-				topic_score += term_sil
+					topic2_dist = self.__mean_rows(D, np.ones(D.shape, dtype=bool))
+					b = topic2_dist if b is None else np.minimum(b, topic2_dist)
+			# calculate the silhouette score for each term, where terms which do not appear 
+			# in the embedding have a score of 0
+			term_sils = np.zeros(len(descriptor1))
+			if b is not None:
+				denom = np.maximum(a, b)
+				valid_sils = np.zeros(len(denom))
+				np.divide(b - a, denom, out=valid_sils, where=denom != 0)
+				term_sils[index.masks[topic_index1]] = valid_sils
+			term_scores = {}
+			for term, term_sil in zip(descriptor1, term_sils):
 				term_scores[term] = term_sil
 			# convert to average
-			topic_score /= len(descriptor1)
-			topic_scores.append(topic_score)
+			topic_scores.append(term_sils.sum() / len(descriptor1))
 			self.topic_term_scores.append(term_scores)
 		return np.array(topic_scores)
 
 	def evaluate_term_topic_distance(self, term, descriptor, ignore_self = False):
 		""" Measure the distance between a term and a topic descriptor """
+		if not term in self.embedding:
+			return 0.0
+		index = self.embedding.get_descriptor_index([[term], descriptor], False)
+		S, positions = index.get_similarity_matrix()
+		D = 1.0 - S[np.ix_(positions[0], positions[1])]
+		keep = np.ones(D.shape, dtype=bool)
+		if ignore_self:
+			keep = index.get_valid_indices(0)[:,np.newaxis] != index.get_valid_indices(1)[np.newaxis,:]
+		return self.__mean_rows(D, keep)[0]
+
+	def __mean_rows(self, D, keep):
+		""" Return the mean of the retained values in each row of a distance matrix, or 0 for
+		rows with no retained values. """
+		counts = keep.sum(axis=1)
+		means = np.zeros(D.shape[0])
+		np.divide((D * keep).sum(axis=1), counts, out=means, where=counts > 0)
+		return means
+
+
+class TopicStabilityScore:
+	"""
+	Evaluates the stability of topic models generated over multiple runs for the same number of
+	topics, based on the agreement between their topic descriptors (Greene et al, 2014). Unlike
+	the other measures, this does not require a word embedding.
+	"""
+	def __init__(self, top = 10):
+		self.top = top
+
+	def is_maximize(self):
+		""" Should good topics maximize this score? """
+		return True
+
+	def evaluate_runs(self, all_descriptors):
+		""" Calculate the stability as the mean agreement between all pairs of runs, or None
+		if fewer than two runs were specified. """
 		pair_scores = []
-		for term2 in descriptor:
-			if term == term2 and ignore_self:
-				continue
-			if term in self.embedding and term2 in self.embedding:
-				pair_scores.append(self.embedding.distance(term, term2))
+		for descriptors1, descriptors2 in itertools.combinations(all_descriptors, 2):
+			pair_scores.append(self.evaluate_agreement(descriptors1, descriptors2))
 		if len(pair_scores) == 0:
-			return 0.0
+			return None
 		return np.array(pair_scores).mean()
 
+	def evaluate_agreement(self, descriptors1, descriptors2):
+		""" Calculate the agreement between two models, by matching their topics using the 
+		Hungarian method, and averaging the similarities of the matched descriptors. """
+		S = np.zeros((len(descriptors1), len(descriptors2)))
+		for i, descriptor1 in enumerate(descriptors1):
+			for j, descriptor2 in enumerate(descriptors2):
+				S[i,j] = self.evaluate_similarity(descriptor1, descriptor2)
+		rows, cols = linear_sum_assignment(-S)
+		# note: unmatched topics contribute zero similarity
+		return S[rows, cols].sum() / max(len(descriptors1), len(descriptors2), 1)
+
+	def evaluate_similarity(self, descriptor1, descriptor2):
+		""" Calculate the Average Jaccard similarity between two ranked descriptors, taken over 
+		all depths up to the number of top terms. """
+		top = min(self.top, len(descriptor1), len(descriptor2))
+		if top == 0:
+			return 0.0
+		scores = []
+		for depth in range(1, top+1):
+			sx, sy = set(descriptor1[0:depth]), set(descriptor2[0:depth])
+			scores.append(len(sx.intersection(sy)) / len(sx.union(sy)))
+		return np.array(scores).mean()
 
 # --------------------------------------------------------------
 
@@ -259,16 +322,21 @@ class TopicMatcher:
 	another.
 	"""
 	def __init__(self, embed):
-		self.measure = TopicDifferenceScore(embed)
+		self.embedding = embed
 
 	def match(self, descriptors1, descriptors2):
 		permutation = []
 		similarities = []
-		for descriptor1 in descriptors1:
+		# calculate the embedding similarities between all pairs of topics from both models
+		k1 = len(descriptors1)
+		index = self.embedding.get_descriptor_index(list(descriptors1) + list(descriptors2), False)
+		S, positions = index.get_similarity_matrix()
+		embedding_sims = pair_similarity_means(S, positions)[:k1, k1:]
+		for topic_index1, descriptor1 in enumerate(descriptors1):
 			best_match = -1
 			max_sim = -1000
 			for topic_index2, descriptor2 in enumerate(descriptors2):
-				embedding_sim = self.measure.evaluate_similarity(descriptor1, descriptor2)
+				embedding_sim = embedding_sims[topic_index1, topic_index2]
 				jaccard_sim = self.__jaccard(descriptor1, descriptor2)
 				sim = max(embedding_sim, jaccard_sim)
 				if sim > max_sim:
@@ -9,8 +9,22 @@ two possible input formats for files:
 
 Sample usage:
 ``` python topicscan/prep_text.py -s topicscan/text/stopwords/english.txt --tfidf --norm -o bbc --lines ./topicscan/data/bbc.txt ```
+``` python topicscan/prep_text.py -s topicscan/text/stopwords/english.txt --tfidf --norm --workers 8 -o bbc ./topicscan/data/bbc/* ```
+``` python topicscan/prep_text.py -s topicscan/text/stopwords/english.txt --tfidf --norm --workers 8 --outofcore -o bbc ./topicscan/data/bbc/* ```
+``` python topicscan/prep_text.py -s topicscan/text/stopwords/english.txt --tfidf --norm --workers 8 --ngram 2 --prune -o bbc ./topicscan/data/bbc/* ```
+
+The tokenized documents can also be stored in a directory with the --tokens option, so that they can be
+reused by this tool or by prep_word2vec.py without reading and tokenizing the files again:
+``` python topicscan/prep_text.py -s topicscan/text/stopwords/english.txt --tfidf --norm --tokens bbc-tokens -o bbc ./topicscan/data/bbc/* ```
+``` python topicscan/prep_text.py -s topicscan/text/stopwords/english.txt --tfidf --norm --tokens bbc-tokens -o bbc ```
+
+The corpus can also be saved as a directory of memory-mappable files rather than a single pickle file:
+``` python topicscan/prep_text.py -s topicscan/text/stopwords/english.txt --tfidf --norm --format dir -o bbc ./topicscan/data/bbc/* ```
+
+New documents can then be appended to a corpus saved in this format, without preprocessing the existing documents again:
+``` python topicscan/prep_text.py -s topicscan/text/stopwords/english.txt --append -o bbc ./topicscan/data/bbc-new/* ```
 """
-import os, os.path, sys
+import os, os.path, sys, shutil, tempfile
 import logging as log
 from optparse import OptionParser
 import text.util
@@ -25,12 +39,24 @@ def main():
 	parser.add_option("--norm", action="store_true", dest="apply_norm", help="apply unit length normalization to the document-term matrix")
 	parser.add_option("--minlen", action="store", type="int", dest="min_doc_length", help="minimum document length (in characters)", default=50)
 	parser.add_option("--ngram", action="store", type="int", dest="max_ngram", help="maximum ngram range (default is 1, i.e. unigrams only)", default=1)
+	parser.add_option("--prune", action="store_true", dest="prune_ngrams", 
+		help="find frequent n-grams using a count-min sketch before building the document-term matrix, to reduce memory usage", default=False)
+	parser.add_option("--sketchwidth", action="store", type="int", dest="sketch_width", help="width of the count-min sketch used to prune n-grams", default=2**22)
+	parser.add_option("--workers", action="store", type="int", dest="workers", help="number of worker processes used to read documents", default=1)
+	parser.add_option("--chunksize", action="store", type="int", dest="chunk_size", help="number of files to read per chunk", default=1000)
+	parser.add_option("--outofcore", action="store_true", dest="out_of_core", help="build the document-term matrix on disk in two passes, for corpora which do not fit in memory", default=False)
+	parser.add_option("-t","--tokens", action="store", type="string", dest="tokens_dir", help="directory of a tokenized corpus to use if it exists, or to create otherwise", default=None)
+	parser.add_option("--format", action="store", type="choice", choices=["pkl", "dir"], dest="corpus_format", 
+		help="output format for the corpus, either a single pickle file (pkl) or a directory of memory-mappable files (dir)", default="pkl")
+	parser.add_option("--append", action="store_true", dest="append", 
+		help="append the documents to an existing corpus saved in the directory format, using its preprocessing settings", default=False)
 	parser.add_option("-s", action="store", type="string", dest="stoplist_file", help="custom stopword file path", default=None)
 	parser.add_option("-o", action="store", type="string", dest="prefix", help="output prefix for corpus files", default=None)
 	parser.add_option("--debug", action="store_true", dest="debug", help="enable debugging information", default=False)
 	# parse command line arguments
 	(options, args) = parser.parse_args()
-	if len(args) < 1:
+	use_tokens = options.tokens_dir is not None and text.util.TokenizedCorpus.exists(options.tokens_dir)
+	if len(args) < 1 and not use_tokens:
 		parser.error("Must specify at least one directory of file path")	
 	# control level of log output
 	log_level = log.DEBUG if options.debug else log.INFO
@@ -51,51 +77,11 @@ def main():
 				file_paths.append(fpath)
 		else:
 			file_paths.append(in_path)
-	if len(file_paths) == 0:
+	if len(file_paths) == 0 and not use_tokens:
 		log.error("Error: Found no text files to preprocess")
 		sys.exit(1)
-	log.info("Found %d text files to preprocess" % len(file_paths))
-
-	# Read the files
-	documents, document_ids = [], []
-	num_short_documents = 0
-	label_counts, labels = {}, {}
-	for in_path in file_paths:
-		# create the document ID
-		label = os.path.basename(os.path.dirname(in_path).replace(" ", "_"))
-		doc_id = os.path.splitext(os.path.basename(in_path))[0]
-		if not doc_id.startswith(label):
-			doc_id = "%s_%s" % (label, doc_id)
-		if label not in labels:
-			labels[label] = set()
-			label_counts[label] = 0
-		log.debug("Reading text from %s ..." % in_path)
-		# is each line a separate document?
-		if options.is_lines:
-			for i, body in enumerate(text.util.read_text_lines(in_path)):
-				if len(body) < options.min_doc_length:
-					num_short_documents += 1
-					continue
-				documents.append(body)	
-				line_doc_id = "%s_%04d" % (doc_id,(i+1))
-				document_ids.append(line_doc_id)	
-				labels[label].add(line_doc_id)
-				label_counts[label] += 1
-		# otherwise each file is a sparate document
-		else:
-			body = text.util.read_text(in_path)
-			if len(body) < options.min_doc_length:
-				num_short_documents += 1
-				continue
-			documents.append(body)	
-			document_ids.append(doc_id)	
-			labels[label].add(doc_id)
-			label_counts[label] += 1
-	log.info("Kept %d documents. Skipped %d documents with length < %d" % 
-		(len(documents), num_short_documents, options.min_doc_length))
-	# any document labels?
-	if len(labels) >= 2:
-		log.info("Document categories: %d labels - %s" % (len(labels), label_counts))
+	if len(file_paths) > 0:
+		log.info("Found %d text files to preprocess" % len(file_paths))
 
 	# load stopwords, if any file path has been specified
 	stopwords = set()
@@ -103,19 +89,107 @@ def main():
 		stopwords = text.util.load_word_set(options.stoplist_file)
 		log.info("Using %d stopwords from %s" % (len(stopwords), options.stoplist_file))
 
+	prefix = options.prefix
+	if prefix is None:
+		prefix = "corpus"
+
+	# appending to an existing corpus? then use its preprocessing settings
+	if options.append:
+		if not os.path.exists(os.path.join(prefix, "manifest.json")):
+			log.error("Error: No corpus in the directory format found at %s" % prefix)
+			sys.exit(1)
+		settings = text.util.CorpusDirectory(prefix).manifest.get("settings", None)
+		if settings is None:
+			log.error("Error: Corpus %s does not include the document frequencies required to append documents" % prefix)
+			sys.exit(1)
+		options.min_df, options.max_ngram = settings["min_df"], settings["max_ngram"]
+		options.apply_tfidf, options.apply_norm = settings["tfidf"], settings["norm"]
+		options.min_doc_length = settings.get("min_doc_length", options.min_doc_length)
+		options.is_lines = settings.get("lines", options.is_lines)
+		# the new documents must be tokenized with the same stopwords as the original corpus
+		if not "stopwords" in settings:
+			log.warning("Warning: Corpus %s does not record its stopwords, so they cannot be checked" % prefix)
+		elif settings["stopwords"] != text.util.hash_word_set(stopwords):
+			log.error("Error: The stopwords differ from those used to preprocess corpus %s" % prefix)
+			sys.exit(1)
+
+	# Read and tokenize the files, streaming the documents to the vectorizer
+	if options.tokens_dir is None:
+		reader = text.util.ParallelDocumentReader(file_paths, options.is_lines, options.min_doc_length, stopwords, 
+			ngram_range = (1,options.max_ngram), workers = options.workers, chunk_size = options.chunk_size)
+	else:
+		if use_tokens:
+			log.info("Using existing tokenized corpus from %s" % options.tokens_dir)
+			corpus = text.util.TokenizedCorpus(options.tokens_dir)
+		else:
+			log.info("Writing tokenized corpus to %s ..." % options.tokens_dir)
+			corpus = text.util.build_tokenized_corpus(options.tokens_dir, file_paths, options.is_lines, 
+				workers = options.workers, chunk_size = options.chunk_size)
+		log.info("Tokenized corpus has %d documents, %d tokens, %d distinct terms" % 
+			(len(corpus), corpus.manifest["tokens"], corpus.manifest["terms"]))
+		reader = text.util.TokenizedDocumentReader(corpus, options.min_doc_length, stopwords, ngram_range = (1,options.max_ngram))
+
+	# find the frequent n-grams before vectorizing?
+	if options.prune_ngrams and options.max_ngram > 1:
+		if options.append:
+			log.warning("Warning: N-gram pruning is not applied when appending documents")
+		elif not options.tokens_dir is None:
+			log.warning("Warning: N-gram pruning is not supported for a tokenized corpus")
+		else:
+			log.info("Pruning n-grams with document frequency < %d ..." % options.min_df)
+			reader.prune_ngrams(options.min_df, sketch_width = options.sketch_width)
+
+	if options.append:
+		log.info("Appending documents to corpus '%s' (tfidf=%s, normalize=%s, min_df=%d, max_ngram=%d) ..." % 
+			(prefix, options.apply_tfidf, options.apply_norm, options.min_df, options.max_ngram))
+		try:
+			(num_docs, num_terms) = text.util.append_corpus_dir(prefix, reader)
+		except ValueError as e:
+			log.error("Error: %s" % e)
+			sys.exit(1)
+		log.info("Appended %d documents and %d new terms. Skipped %d documents with length < %d" % 
+			(num_docs, num_terms, reader.num_short_documents, options.min_doc_length))
+		return
+
 	# Convert the documents to a vector representation
-	log.info("Preprocessing data (%d stopwords, tfidf=%s, normalize=%s, min_df=%d, max_ngram=%d) ..." % 
-		(len(stopwords), options.apply_tfidf, options.apply_norm, options.min_df, options.max_ngram))
-	(X,terms) = text.util.preprocess(documents, stopwords, min_df = options.min_df, 
-		apply_tfidf = options.apply_tfidf, apply_norm = options.apply_norm, ngram_range = (1,options.max_ngram))
+	log.info("Preprocessing data (%d stopwords, tfidf=%s, normalize=%s, min_df=%d, max_ngram=%d, workers=%d) ..." % 
+		(len(stopwords), options.apply_tfidf, options.apply_norm, options.min_df, options.max_ngram, options.workers))
+	dir_temp = None
+	if options.out_of_core:
+		# the matrix is built in a temporary directory alongside the output files
+		dir_temp = tempfile.mkdtemp(prefix="prep-", dir=os.path.dirname(os.path.abspath(prefix)))
+		log.info("Building document-term matrix out-of-core in %s" % dir_temp)
+		vectorizer = text.util.OutOfCoreVectorizer(min_df = options.min_df, 
+			apply_tfidf = options.apply_tfidf, apply_norm = options.apply_norm)
+		(X,terms) = vectorizer.fit_transform(reader, dir_temp)
+		df = vectorizer.document_frequencies
+	elif options.corpus_format == "dir":
+		# record the document frequencies of all terms, so that documents can be appended later
+		(X,terms,df) = text.util.preprocess_frequencies(reader, min_df = options.min_df, 
+			apply_tfidf = options.apply_tfidf, apply_norm = options.apply_norm)
+	else:
+		(X,terms) = text.util.preprocess(reader, stopwords, min_df = options.min_df, 
+			apply_tfidf = options.apply_tfidf, apply_norm = options.apply_norm, pretokenized = True)
+		df = None
+	document_ids, labels = reader.document_ids, reader.labels
+	log.info("Kept %d documents. Skipped %d documents with length < %d" % 
+		(len(document_ids), reader.num_short_documents, options.min_doc_length))
+	# any document labels?
+	if len(labels) >= 2:
+		log.info("Document categories: %d labels - %s" % (len(labels), reader.label_counts))
 	log.info("Built document-term matrix: %d documents, %d terms" % (X.shape[0], X.shape[1]))
 	
 	# Save the preprocessed corpus
-	prefix = options.prefix
-	if prefix is None:
-		prefix = "corpus"
 	log.info("Saving corpus '%s'" % prefix)
-	text.util.save_corpus(prefix, X, terms, document_ids, labels)
+	if options.corpus_format == "dir":
+		settings = { "min_df":options.min_df, "tfidf":bool(options.apply_tfidf), "norm":bool(options.apply_norm), 
+			"max_ngram":options.max_ngram, "min_doc_length":options.min_doc_length, "lines":bool(options.is_lines),
+			"stopwords":text.util.hash_word_set(stopwords) }
+		text.util.save_corpus_dir(prefix, X, terms, document_ids, labels, df, settings)
+	else:
+		text.util.save_corpus(prefix, X, terms, document_ids, labels)
+	if dir_temp is not None:
+		shutil.rmtree(dir_temp)
   
 # --------------------------------------------------------------
 
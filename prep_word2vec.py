@@ -12,8 +12,16 @@ two possible input formats for files:
 
 Sample usage:
 python topicscan/prep_word2vec.py -m sg -d 100 -s topicscan/text/stopwords/english.txt -o bbc-w2v-sg.bin --lines ./topicscan/data/bbc.txt
+
+A tokenized corpus directory created by this tool or by prep_text.py can be specified with the --tokens option, 
+in which case the token IDs are streamed from disk on each training epoch rather than re-reading the files:
+python topicscan/prep_word2vec.py -m sg -d 100 -s topicscan/text/stopwords/english.txt -o bbc-w2v-sg.bin --tokens bbc-tokens
+
+For large corpora, the --corpusfile option writes the documents to a temporary file in LineSentence format, so that 
+training can make use of all worker threads rather than being limited by reading the documents in Python:
+python topicscan/prep_word2vec.py -m sg -d 100 -s topicscan/text/stopwords/english.txt -o bbc-w2v-sg.bin --corpusfile --workers 32 --tokens bbc-tokens
 """
-import os, os.path, sys, json
+import os, os.path, sys, json, time, tempfile
 import logging as log
 from optparse import OptionParser
 import numpy as np
@@ -31,14 +39,24 @@ def main():
 	parser.add_option("-d","--dimensions", action="store", type="int", dest="dimensions", help="the dimensionality of the word vectors", default=100)
 	parser.add_option("--window", action="store", type="int", dest="window_size", 
 		help="the maximum distance for Word2Vec to use between the current and predicted word within a sentence", default=5)
+	parser.add_option("--epochs", action="store", type="int", dest="epochs", help="number of training epochs over the corpus", default=5)
+	parser.add_option("--sample", action="store", type="float", dest="sample", 
+		help="threshold for downsampling frequent words (default is chosen based on the corpus size)", default=None)
+	parser.add_option("--negative", action="store", type="int", dest="negative", help="number of negative samples (0 for no negative sampling)", default=5)
+	parser.add_option("--workers", action="store", type="int", dest="workers", 
+		help="number of worker threads used for training (default is the number of CPU cores with --corpusfile, otherwise at most 8)", default=None)
+	parser.add_option("--corpusfile", action="store_true", dest="corpus_file", 
+		help="write the documents to a temporary file in LineSentence format, for faster training with many workers", default=False)
 	parser.add_option("-m", action="store", type="string", dest="embed_type", help="type of word embedding to build (sg or cbow)", default="sg")
+	parser.add_option("-t","--tokens", action="store", type="string", dest="tokens_dir", help="directory of a tokenized corpus to use if it exists, or to create otherwise", default=None)
 	parser.add_option("-s", action="store", type="string", dest="stoplist_file", help="custom stopword file path", default=None)
 	parser.add_option("--minlen", action="store", type="int", dest="min_doc_length", help="minimum document length (in characters)", default=10)
 	parser.add_option("-o", action="store", type="string", dest="out_path", help="output path for corpus files", default=None)
 	parser.add_option("--debug", action="store_true", dest="debug", help="enable debugging information", default=False)
 	# parse command line arguments
 	(options, args) = parser.parse_args()
-	if len(args) < 1:
+	use_tokens = options.tokens_dir is not None and text.util.TokenizedCorpus.exists(options.tokens_dir)
+	if len(args) < 1 and not use_tokens:
 		parser.error("Must specify at least one directory of file path")	
 	# control level of log output
 	log_level = log.DEBUG if options.debug else log.INFO
@@ -68,13 +86,30 @@ def main():
 				file_paths.append(fpath)
 		else:
 			file_paths.append(in_path)
-	if len(file_paths) == 0:
+	if len(file_paths) == 0 and not use_tokens:
 		log.error("Error: Found no text files to preprocess")
 		sys.exit(1)
-	log.info("Found %d text files to preprocess" % len(file_paths))
+	if len(file_paths) > 0:
+		log.info("Found %d text files to preprocess" % len(file_paths))
+
+	# note: when iterating over documents in Python, gensim cannot make use of many more workers
+	num_cores = os.cpu_count() or 1
+	num_workers = options.workers
+	if num_workers is None:
+		num_workers = num_cores if options.corpus_file else min(num_cores, 8)
 
 	# process all specified inputs
-	if options.is_lines:
+	if options.tokens_dir is not None:
+		if use_tokens:
+			log.info("Using existing tokenized corpus from %s" % options.tokens_dir)
+			corpus = text.util.TokenizedCorpus(options.tokens_dir)
+		else:
+			log.info("Writing tokenized corpus to %s ..." % options.tokens_dir)
+			corpus = text.util.build_tokenized_corpus(options.tokens_dir, file_paths, options.is_lines, workers = num_workers)
+		log.info("Tokenized corpus has %d documents, %d tokens, %d distinct terms" % 
+			(len(corpus), corpus.manifest["tokens"], corpus.manifest["terms"]))
+		token_generator = text.util.TokenizedSentences(corpus, options.min_doc_length, stopwords)
+	elif options.is_lines:
 		token_generator = text.util.LineTokenGenerator(file_paths, options.min_doc_length, stopwords)
 	else:
 		token_generator = text.util.FileTokenGenerator(file_paths, options.min_doc_length, stopwords)
@@ -88,9 +123,52 @@ def main():
 	else:
 		log.error("Unknown embedding variant type '%s'" % options.embed_type )
 		sys.exit(1)
-	embed = Word2Vec(token_generator, size=options.dimensions, min_count=options.min_df, 
-		window=options.window_size, workers=4, sg = sg, seed=options.seed)
-	log.info( "Built word embedding %s" % embed )
+	corpus_path, num_words = None, None
+	if options.tokens_dir is not None:
+		num_words = corpus.manifest["tokens"]
+	if options.corpus_file:
+		# write the documents in LineSentence format, one per line
+		out_dir = os.path.dirname(os.path.abspath(options.out_path or "."))
+		with tempfile.NamedTemporaryFile(mode="w", encoding="utf8", suffix=".txt", prefix="w2v-", dir=out_dir, delete=False) as fout:
+			corpus_path = fout.name
+			log.info("Writing documents to temporary corpus file %s ..." % corpus_path)
+			num_words = 0
+			for tokens in token_generator:
+				if len(tokens) > 0:
+					fout.write(" ".join(tokens))
+					fout.write("\n")
+					num_words += len(tokens)
+	# choose the downsampling threshold based on the corpus size, if known and not specified
+	sample = options.sample
+	if sample is None:
+		if num_words is not None and num_words > 10**9:
+			sample = 1e-5
+		elif num_words is not None and num_words > 10**8:
+			sample = 1e-4
+		else:
+			sample = 1e-3
+	try:
+		embed = Word2Vec(size=options.dimensions, min_count=options.min_df, window=options.window_size, workers=num_workers, 
+			sg=sg, seed=options.seed, iter=options.epochs, sample=sample, negative=options.negative)
+		if corpus_path is None:
+			embed.build_vocab(sentences=token_generator)
+		else:
+			embed.build_vocab(corpus_file=corpus_path)
+		log.info("Training on %d documents, %d words (workers=%d, epochs=%d, sample=%g, negative=%d) ..." % 
+			(embed.corpus_count, embed.corpus_total_words, num_workers, options.epochs, sample, options.negative))
+		start = time.time()
+		if corpus_path is None:
+			trained_words, raw_words = embed.train(sentences=token_generator, total_examples=embed.corpus_count, 
+				total_words=embed.corpus_total_words, epochs=embed.epochs)
+		else:
+			trained_words, raw_words = embed.train(corpus_file=corpus_path, total_examples=embed.corpus_count, 
+				total_words=embed.corpus_total_words, epochs=embed.epochs)
+		train_time = time.time() - start
+	finally:
+		if corpus_path is not None:
+			os.remove(corpus_path)
+	words_per_sec = trained_words / max(train_time, 1e-9)
+	log.info( "Built word embedding %s in %.1f secs (%.0f words/sec)" % (embed, train_time, words_per_sec) )
 
 	# save the Word2Vec model
 	out_path = options.out_path
@@ -99,6 +177,16 @@ def main():
 	log.info( "Writing word embedding to %s ..." % out_path )
 	# always save in binary format
 	embed.wv.save_word2vec_format(out_path, binary=True) 
+	# also save the normalized vectors and the vocabulary, which can be memory-mapped when loading
+	out_base = os.path.splitext(out_path)[0]
+	vectors = np.array(embed.wv.vectors, dtype=np.float32)
+	norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+	norms[norms == 0] = 1.0
+	vectors /= norms
+	vectors_path, vocab_path = "%s_vectors.npy" % out_base, "%s_vocab.txt" % out_base
+	log.info( "Writing normalized vectors to %s ..." % vectors_path )
+	np.save(vectors_path, vectors)
+	text.util.write_lines(vocab_path, embed.wv.index2word)
 
 	# create the metadata for this embedding
 	out_filename = os.path.split(out_path)[-1]
@@ -107,16 +195,30 @@ def main():
 		"file":out_filename,
 		"corpus":os.path.splitext(out_filename)[0],
 		"description":"",
-		"dimensions":options.dimensions,
-		"terms":3078,
+		"dimensions":int(vectors.shape[1]),
+		"terms":len(embed.wv.index2word),
+		"files":{
+			"vectors":os.path.split(vectors_path)[-1],
+			"vocab":os.path.split(vocab_path)[-1]
+		},
 		"algorithm":{ 
 			"id":"word2vec-%s" % options.embed_type,
 			"parameters":{
 				"window":options.window_size,
 				"dimensions":options.dimensions,
-				"seed":options.seed
+				"seed":options.seed,
+				"epochs":options.epochs,
+				"sample":sample,
+				"negative":options.negative,
+				"workers":num_workers,
+				"corpus_file":bool(options.corpus_file)
 			}
-		} 
+		},
+		"training":{
+			"time":round(train_time, 3),
+			"words":int(trained_words),
+			"words_per_sec":round(words_per_sec, 1)
+		}
 	}	
 	# write the metadata
 	metadata_out_path = "%s.meta" % os.path.splitext(out_path)[0]
@@ -19,7 +19,7 @@ from webcore import WebCore
 from webcallbacks import layout_cache
 from webcallbacks import register_topics_callbacks, register_embedding_callbacks, register_validation_callbacks
 from webcallbacks import register_heatmap_callbacks, register_scatter_callbacks, register_silhouette_callbacks
-from webcallbacks import register_comparison_callbacks
+from webcallbacks import register_comparison_callbacks, register_selection_callbacks
 from layouts.general import external_stylesheets
 from layouts.index import IndexLayout
 from layouts.topics import TopicModelLayout
@@ -30,6 +30,7 @@ from layouts.silhouette import SilhouetteLayout
 from layouts.heatmap import HeatmapLayout
 from layouts.scatter import ScatterLayout
 from layouts.comparison import ComparisonLayout
+from layouts.selection import SelectionLayout
 
 # --------------------------------------------------------------
 
@@ -180,6 +181,23 @@ def main():
 				return ErrorLayout(webcore, "No valid model identifiers were provided.").generate_layout()
 			layout_cache[param_uid] = ComparisonLayout(webcore, all_model_metadata)
 			return layout_cache[param_uid].generate_layout()
+		# model selection page
+		elif layout_name == "selection":
+			if len(param_uid) == 0:
+				return ErrorLayout(webcore, "No unique state identifier was provided.").generate_layout()
+			all_model_metadata = []
+			for key in query:
+				if key.startswith("id") and len(query[key]) > 0:
+					model_id = query[key][0]
+					topic_metadata = webcore.get_topic_model_metadata(model_id)
+					if topic_metadata is None:
+						log.warning("Cannot load topic model metadata for model_id=%s" % model_id)
+					else:
+						all_model_metadata.append( topic_metadata )
+			if len(all_model_metadata) == 0:
+				return ErrorLayout(webcore, "No valid model identifiers were provided.").generate_layout()
+			layout_cache[param_uid] = SelectionLayout(webcore, all_model_metadata)
+			return layout_cache[param_uid].generate_layout()
 		# unknown layout
 		log.warning("404: Invalid request for layout %s: %s" % (layout_name, pathname))
 		return ErrorLayout(webcore, "Cannot access unknown page **%s**." % layout_name).generate_layout()
@@ -192,17 +210,13 @@ def main():
 	register_heatmap_callbacks(app)
 	register_scatter_callbacks(app)
 	register_comparison_callbacks(app)
+	register_selection_callbacks(app)
 
 	# Additional main page callbacks
-	count = webcore.get_topic_model_count()
-	# create callbacks for all the checkboxes
-	checkbox_inputs = []
-	for i in range(count):
-		checkbox_inputs.append( Input("check_%d" % i, "checked") )		
-	@app.callback(Output("div-compare-btn", "children"), checkbox_inputs )
-	def on_checkbox_change( *args ):
-		layout_index.checkbox_state = list(args)
-		log.debug("Callback: on_checkbox_change: %s" % layout_index.checkbox_state)
+	@app.callback(Output("div-compare-btn", "children"), [Input("model-table", "selected_row_ids")] )
+	def on_checkbox_change( selected_ids ):
+		layout_index.selected_model_ids = selected_ids or []
+		log.debug("Callback: on_checkbox_change: %s" % layout_index.selected_model_ids)
 		return layout_index.generate_model_button()
 
 	# set browser to open
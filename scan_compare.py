@@ -14,6 +14,7 @@ from dash.dependencies import Input, Output
 import dash_html_components as html
 # TopicScan imports
 from webcore import WebCore, TopicModelMeta, filepath_to_metadata_id
+from webcallbacks import get_triggered_ids
 from layouts.general import external_stylesheets
 from layouts.comparison import ComparisonLayout
 
@@ -72,28 +73,27 @@ def main():
 	# --------------------------------------------------------------
 	# Callbacks for ComparisonLayout 
 
-	@app.callback(Output('content_compare_vtable', 'children'),
-		[Input('embed-dropdown', 'value')])
-	def update_compare_embed_dropdown(embed_id):
-		log.info("Callback: update_embed_dropdown: embed_id=%s" % embed_id)
-		layout.current_embed_id = embed_id
-		return layout.generate_vtable()
-
-	@app.callback(Output('content_compare_vchart', 'children'),
-		[Input('measure-dropdown', 'value'), Input('embed-dropdown', 'value')])
-	def update_compare_measure_dropdown(measure_id, embed_id):
-		log.info("Callback: update_measure_dropdown: measure_id=%s embed_id=%s" % (measure_id, embed_id))
+	@app.callback([Output('content_compare_vtable', 'children'), Output('content_compare_vchart', 'children'),
+		Output('content_compare_matching', 'children'), Output('compare-vtable-interval', 'disabled')],
+		[Input('measure-dropdown', 'value'), Input('embed-dropdown', 'value'),
+		Input('compare-model-dropdown1', 'value'), Input('compare-model-dropdown2', 'value'),
+		Input('compare-vtable-interval', 'n_intervals')])
+	def comparison_dropdowns(measure_id, embed_id, s_index1, s_index2, n_intervals):
+		model_index1, model_index2 = int(s_index1), int(s_index2)
+		log.info("Callback: comparison_dropdowns: measure_id=%s embed_id=%s model_index1=%d model_index2=%d" % (
+			measure_id, embed_id, model_index1, model_index2) )
+		triggered = get_triggered_ids()
+		embed_changed = triggered is None or "embed-dropdown" in triggered
+		# refresh the validation scores while they are being computed
+		refresh = embed_changed or "compare-vtable-interval" in triggered
 		layout.current_measure_id = measure_id
 		layout.current_embed_id = embed_id
-		return layout.generate_vchart()
-
-	@app.callback(Output('content_compare_matching', 'children'),
-		[Input('compare-model-dropdown1', 'value'), Input('compare-model-dropdown2', 'value')])
-	def update_compare_model_dropdown1(s_index1, s_index2):
-		model_index1, model_index2 = int(s_index1), int(s_index2)
-		log.info("Callback: update_compare_model_dropdown: model_index1=%d model_index2=%d" % (model_index1, model_index2) )
 		layout.current_metadata_indices = [ model_index1, model_index2 ]
-		return layout.generate_matching_table()
+		vtable = layout.generate_vtable() if refresh else dash.no_update
+		vchart = layout.generate_vchart() if refresh or "measure-dropdown" in triggered else dash.no_update
+		matching = layout.generate_matching_table() if embed_changed or len(triggered.intersection(
+			{"compare-model-dropdown1", "compare-model-dropdown2"})) > 0 else dash.no_update
+		return vtable, vchart, matching, layout.is_validation_complete()
 
 	# start the web server
 	app.run_server(debug=options.debug)
@@ -10,10 +10,11 @@ from pathlib import Path
 import logging as log
 from optparse import OptionParser
 import dash
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
 import dash_html_components as html
 # TopicScan imports
 from webcore import WebCore, TopicModelMeta
+from webcallbacks import register_topic_figure_callback
 from layouts.general import external_stylesheets
 from layouts.heatmap import HeatmapLayout
 
@@ -75,14 +76,17 @@ def main():
 		return layout.generate_topiclevel_heatmap()
 
 	@app.callback(Output('heatmap_content_termlevel', 'children'),
-		[Input('termlevel-dropdown', 'value'), Input('embed-dropdown', 'value')])
-	def heatmap_termlevel_dropdown(topic_index, embed_id):
-		""" Callback to handle changes to the topic dropdown """
+		[Input('embed-dropdown', 'value')], [State('termlevel-dropdown', 'value')])
+	def heatmap_termlevel_dropdown(embed_id, topic_index):
+		""" Callback to handle changes to the embedding dropdown, where changes to the topic dropdown
+		are handled on the client """
 		log.info("Callback: heatmap_termlevel_dropdown: topic_index=%s embed_id=%s" % (topic_index, embed_id))
 		layout.current_topic_index = int(topic_index)
 		layout.current_embed_id = embed_id
 		return layout.generate_termlevel_heatmap()
 
+	register_topic_figure_callback(app, 'termlevel-dropdown', 'chart_termheatmap', 'store_termheatmap')
+
 	# --------------------------------------------------------------
 
 	# start the web server
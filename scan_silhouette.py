@@ -10,10 +10,11 @@ from pathlib import Path
 import logging as log
 from optparse import OptionParser
 import dash
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
 import dash_html_components as html
 # TopicScan imports
 from webcore import WebCore, TopicModelMeta
+from webcallbacks import register_topic_figure_callback
 from layouts.general import external_stylesheets
 from layouts.silhouette import SilhouetteLayout
 
@@ -81,13 +82,15 @@ def main():
 		return layout.generate_distribution_chart()
 
 	@app.callback(Output('silhouette_content_termlevel', 'children'),
-		[Input('topic-sil-dropdown', 'value'), Input('embed-dropdown', 'value')])
-	def silhouette_topic_termlevel(topic_index, embed_id):
+		[Input('embed-dropdown', 'value')], [State('topic-sil-dropdown', 'value')])
+	def silhouette_topic_termlevel(embed_id, topic_index):
 		log.info("Callback: silhouette_topic_termlevel: (%s,%s)" % (topic_index,embed_id))
 		layout.current_topic_index = int(topic_index)
 		layout.current_embed_id = embed_id
 		return layout.generate_termlevel_chart()
 
+	register_topic_figure_callback(app, 'topic-sil-dropdown', 'chart_termsil', 'store_termsil')
+
 	# --------------------------------------------------------------
 
 	# start the web server
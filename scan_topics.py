@@ -10,10 +10,10 @@ from pathlib import Path
 import logging as log
 from optparse import OptionParser
 import dash
-from dash.dependencies import Input, Output
 import dash_html_components as html
 # TopicScan imports
 from webcore import WebCore, TopicModelMeta
+from webcallbacks import register_topics_callbacks
 from layouts.general import external_stylesheets
 from layouts.topics import TopicModelLayout
 
@@ -66,17 +66,7 @@ def main():
 	# --------------------------------------------------------------
 	# Callbacks for TopicModelLayout 
 
-	@app.callback(Output('content_term_assoc', 'children'), [Input('topic-term-dropdown', 'value')])
-	def topics_term_assoc_topic(topic_index):
-		log.info("Callback: topics_term_assoc_topic: %s" % topic_index)
-		layout.current_term_topic_index = int(topic_index)
-		return layout.generate_term_association_chart()
-
-	@app.callback(Output('content_document_assoc', 'children'), [Input('topic-document-dropdown', 'value')])
-	def topics_document_assoc_topic(topic_index):
-		log.info("Callback: topics_document_assoc_topic: %s" % topic_index)
-		layout.current_document_topic_index = int(topic_index)
-		return layout.generate_document_association_chart()
+	register_topics_callbacks(app)
 
 	# --------------------------------------------------------------
 
@@ -14,6 +14,7 @@ from dash.dependencies import Input, Output
 import dash_html_components as html
 # TopicScan imports
 from webcore import WebCore, TopicModelMeta
+from webcallbacks import get_triggered_ids
 from layouts.general import external_stylesheets
 from layouts.validation import ValidationLayout
 
@@ -67,35 +68,19 @@ def main():
 	# --------------------------------------------------------------
 	# Callbacks for ValidationlLayout 
 
-	@app.callback(Output('content_vtable', 'children'),
-		[Input('embed-dropdown', 'value')])
-	def update_embed_dropdown1(embed_id):
-		log.info("Callback: update_embed_dropdown1: embed_id=%s" % embed_id)
-		layout.current_embed_id = embed_id
-		return layout.generate_vtable()
-
-	@app.callback(Output('content_vchart', 'children'),
-		[Input('measure-dropdown', 'value'), Input('embed-dropdown', 'value')])
-	def validation_measure_dropdown1(measure_id, embed_id):
-		log.info("Callback: validation_measure_dropdown1: measure_id=%s embed_id=%s" % (measure_id, embed_id))
-		layout.current_measure_id = measure_id
-		layout.current_embed_id = embed_id
-		return layout.generate_vchart()
-
-	@app.callback(Output('content_vsummary', 'children'),
+	@app.callback([Output('content_vtable', 'children'), Output('content_vchart', 'children'),
+		Output('content_vsummary', 'children'), Output('content_vdistribution', 'children')],
 		[Input('measure-dropdown', 'value'), Input('embed-dropdown', 'value')])
-	def validation_measure_dropdown2(measure_id, embed_id):
-		log.info("Callback: validation_measure_dropdown2: measure_id=%s embed_id=%s" % (measure_id, embed_id))
+	def validation_dropdowns(measure_id, embed_id):
+		log.info("Callback: validation_dropdowns: measure_id=%s embed_id=%s" % (measure_id, embed_id))
+		# only the chart and summary depend on the selected measure
+		triggered = get_triggered_ids()
+		embed_changed = triggered is None or not triggered.issubset({"measure-dropdown"})
 		layout.current_measure_id = measure_id
 		layout.current_embed_id = embed_id
-		return layout.generate_vsummary()
-
-	@app.callback(Output('content_vdistribution', 'children'), 
-		[Input('embed-dropdown', 'value')])
-	def validation_embed_dropdown2(embed_id):
-		log.info("Callback: validation_embed_dropdown2: embed_id=%s" % embed_id)
-		layout.current_embed_id = embed_id
-		return layout.generate_vdistribution()
+		vtable = layout.generate_vtable() if embed_changed else dash.no_update
+		vdistribution = layout.generate_vdistribution() if embed_changed else dash.no_update
+		return vtable, layout.generate_vchart(), layout.generate_vsummary(), vdistribution
 
 	# --------------------------------------------------------------
 
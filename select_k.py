@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+"""
+Tool to recommend the number of topics k for parameter sweeps of topic models, such as those generated
+by topic_nmf.py using --kmin and --kmax with multiple runs. All models are evaluated using the specified
+word embeddings, and the validation scores and the stability of the topics are aggregated across the runs
+for each value of k. The results are written as a JSON report.
+
+Model-level scores are cached on disk, so that only new models are evaluated when the tool is run again.
+Cached scores are not reused if an embedding file has been modified.
+With the --watch option, the directory is scanned repeatedly and the report is updated as new runs finish.
+
+Sample usage:
+python topicscan/select_k.py ~/sample/models/bbc --embeddir ~/sample/embeddings -o bbc-k.json
+python topicscan/select_k.py ~/sample/models/bbc --embeddir ~/sample/embeddings -e bbc-w2v-sg --watch 60 -o bbc-k.json
+"""
+import sys, json, time
+from pathlib import Path
+import logging as log
+from optparse import OptionParser
+# TopicScan imports
+from webcore import WebCore
+from webselection import KSelector, load_score_cache, save_score_cache
+from webvalidation import measure_names
+
+# --------------------------------------------------------------
+
+def main():
+	parser = OptionParser(usage="usage: %prog [options] dir_core")
+	parser.add_option("--embeddir", action="store", type="string", dest="dir_embed",
+		help="directory containing the word embedding metadata (default is the same as the topic model directory)", default=None)
+	parser.add_option("-e", "--embeddings", action="store", type="string", dest="embed_ids",
+		help="comma-separated list of word embedding IDs to use (default is all embeddings)", default=None)
+	parser.add_option("-m", "--measures", action="store", type="string", dest="measure_ids",
+		help="comma-separated list of validation measures to use (default is all measures)", default=None)
+	parser.add_option("--workers", action="store", type="int", dest="workers",
+		help="number of worker processes (default is taken from the configuration, 0 for all CPU cores)", default=None)
+	parser.add_option("--cache", action="store", type="string", dest="cache_path",
+		help="file used to cache model-level scores between runs (default is based on the report path)", default=None)
+	parser.add_option("--watch", action="store", type="int", dest="watch",
+		help="scan the directory for new models every specified number of seconds (default is 0, i.e. run once)", default=0)
+	parser.add_option("-o","--output", action="store", type="string", dest="out_path", help="output path for the JSON report", default="k_selection.json")
+	parser.add_option("--debug", action="store_true", dest="debug", help="enable debugging information", default=False)
+	(options, args) = parser.parse_args()
+	if len(args) != 1:
+		parser.error("Must specify the directory containing the topic model metadata")
+	# control level of log output
+	log_level = log.DEBUG if options.debug else log.INFO
+	log.basicConfig(level=log_level, format='%(message)s')
+
+	dir_core = Path(args[0])
+	if not dir_core.is_dir():
+		log.error("Error: Invalid topic model directory specified: %s" % dir_core)
+		sys.exit(1)
+	if options.measure_ids is None:
+		measure_ids = list(measure_names.keys())
+	else:
+		measure_ids = [measure_id.strip() for measure_id in options.measure_ids.split(",")]
+		for measure_id in measure_ids:
+			if not measure_id in measure_names:
+				parser.error("Unknown validation measure: %s" % measure_id)
+	out_path = Path(options.out_path)
+	if options.cache_path is None:
+		cache_path = out_path.with_name(out_path.stem + "_scores.pkl")
+	else:
+		cache_path = Path(options.cache_path)
+
+	# load the word embeddings
+	webcore = WebCore(dir_core)
+	webcore.init(False)
+	if options.dir_embed is None:
+		embed_core = webcore
+	else:
+		embed_core = WebCore(Path(options.dir_embed))
+		embed_core.init(False)
+	if options.embed_ids is None:
+		embed_ids = embed_core.get_embedding_ids()
+	else:
+		embed_ids = [embed_id.strip() for embed_id in options.embed_ids.split(",")]
+	if len(embed_ids) == 0:
+		log.error("Error: No word embeddings found")
+		sys.exit(1)
+	embeds = {}
+	for embed_id in embed_ids:
+		embeds[embed_id] = embed_core.get_embedding(embed_id)
+		if embeds[embed_id] is None:
+			log.error("Error: Failed to load word embedding %s" % embed_id)
+			sys.exit(1)
+
+	# reuse any scores from previous runs
+	load_score_cache(cache_path)
+	selector = KSelector(measure_ids, options.workers)
+	previous_model_ids = None
+	while True:
+		model_ids = webcore.get_topic_model_ids()
+		# only update the report when the set of models has changed
+		if model_ids != previous_model_ids and len(model_ids) > 0:
+			all_meta = [webcore.get_topic_model_metadata(model_id) for model_id in model_ids]
+			start_time = time.time()
+			report = selector.get_report(all_meta, embeds)
+			save_score_cache(cache_path)
+			log.info("Evaluated %d topic models in %.1f seconds" % (len(all_meta), time.time() - start_time))
+			for sweep in report["sweeps"]:
+				log.info("Sweep %s: %d models, recommended k=%d" % (sweep["id"], sweep["models"], sweep["recommended_k"]))
+			log.info("Writing report to %s" % out_path)
+			with open(out_path, "w") as fout:
+				json.dump(report, fout, indent=4)
+			previous_model_ids = model_ids
+		elif len(model_ids) == 0:
+			log.warning("No topic models found in %s" % dir_core)
+		if options.watch <= 0:
+			break
+		time.sleep(options.watch)
+		# find any new models
+		webcore.init(False)
+
+# --------------------------------------------------------------
+
+if __name__ == "__main__":
+	main()
@@ -1,5 +1,10 @@
-import os, os.path, re
-from sklearn.feature_extraction.text import TfidfVectorizer
+import os, os.path, re, json, io, zlib, shutil, hashlib
+from array import array
+from collections import Counter
+from multiprocessing import Pool
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer, TfidfTransformer, strip_accents_unicode
 import logging as log
 import joblib
 
@@ -8,6 +13,10 @@ import joblib
 token_pattern = re.compile(r"\b\w\w+\b", re.U)
 url_pattern = re.compile('https?[:;]?/?/?\S*')
 min_term_length = 2
+# single pattern which also applies the minimum length and alphabetic first character filters
+filtered_token_pattern = re.compile(r"(?<!\w)[^\W\d_]\w{%d,}" % (min_term_length-1), re.U)
+# pattern which matches all maximal runs of word characters
+word_pattern = re.compile(r"\w+", re.U)
 
 # --------------------------------------------------------------
 
@@ -24,25 +33,64 @@ def find_text_files( root_path ):
 	filepaths.sort()
 	return filepaths	
 
-def read_text( in_path ):
-	""" Read and normalize body text from the specified text file. """
-	body = ""
+def normalize_lines( block ):
+	""" Normalize a block of text containing multiple lines, returning the list of non-empty lines. """
+	lines = map(str.strip, block.split("\n"))
+	# Remove URIs at this point (Note: this simple regex captures MOST URIs but may occasionally let others slip through)
+	# note: the stripped lines are joined so that a single regex pass is applied to the whole block
+	if "http" in block:
+		lines = re.sub(url_pattern, '', "\n".join(lines)).split("\n")
+	return [line for line in lines if len(line) > 1]
+
+def iter_text_lines( in_path, block_size = 1 << 23 ):
+	""" Read and normalize body text from the specified text file, and yield its lines lazily. The
+	file is read and normalized in large blocks, rather than one line at a time. """
 	with open(in_path, 'r', encoding="utf8", errors='ignore') as fin:
+		remainder = ""
 		while True:
-			line = fin.readline()
-			if not line:
+			block = fin.read(block_size)
+			if not block:
 				break
-			# Remove URIs at this point (Note: this simple regex captures MOST URIs but may occasionally let others slip through)
-			normalized_line = re.sub(url_pattern, '', line.strip())
-			if len(normalized_line) > 1:
-				body += normalized_line
-				body += "\n"
-	return body
+			# only process complete lines, and keep the rest for the next block
+			block = remainder + block
+			end = block.rfind("\n")
+			if end < 0:
+				remainder = block
+				continue
+			block, remainder = block[:end], block[end+1:]
+			for line in normalize_lines(block):
+				yield line
+		for line in normalize_lines(remainder):
+			yield line
+
+def read_text( in_path ):
+	""" Read and normalize body text from the specified text file. """
+	lines = list(iter_text_lines(in_path))
+	if len(lines) == 0:
+		return ""
+	lines.append("")
+	return "\n".join(lines)
 
 def read_text_lines( in_path ):
 	""" Read and normalize body text from the specified text file, and
 	return multiple documents, one for each line. """
-	return read_text( in_path ).split( "\n" )
+	return list(iter_text_documents(in_path))
+
+def iter_text_documents( in_path ):
+	""" Read and normalize body text from the specified text file, and lazily yield multiple 
+	documents, one for each line, followed by an empty document as for read_text_lines. """
+	for line in iter_text_lines(in_path):
+		yield line
+	yield ""
+
+def create_document_id( in_path ):
+	""" Create the document ID and label for the specified text file, where the label is
+	based on the name of its parent directory. """
+	label = os.path.basename(os.path.dirname(in_path).replace(" ", "_"))
+	doc_id = os.path.splitext(os.path.basename(in_path))[0]
+	if not doc_id.startswith(label):
+		doc_id = "%s_%s" % (label, doc_id)
+	return doc_id, label
 
 def load_word_set( in_path ):
 	""" Load stopwords from a file into a set. """
@@ -55,21 +103,90 @@ def load_word_set( in_path ):
 				stopwords.add(l)
 	return stopwords
 
+def hash_word_set( words ):
+	""" Return a hash of a set of words, such as stopwords, which does not depend on their order. """
+	return hashlib.sha1("\n".join(sorted(words)).encode("utf8")).hexdigest()
+
 # --------------------------------------------------------------
 
 def custom_tokenizer( s ):
 	""" Custom string tokenizer. """
-	return [x.lower() for x in token_pattern.findall(s) if (len(x) >= min_term_length and x[0].isalpha() ) ]
+	# note: the pattern can still match a few non-alphabetic characters, such as superscript digits
+	return [x.lower() for x in filtered_token_pattern.findall(s) if x[0].isalpha()]
+
+class CachedTokenizer:
+	""" Callable tokenizer which produces the same tokens as custom_tokenizer followed by stopword 
+	filtering for a lowercased document. Each document is lowercased once and split into runs of
+	word characters, while the length, alphabetic, and stopword decisions are made once for each 
+	distinct run and then cached. Stopwords are either removed or, if a placeholder is specified, 
+	replaced by it. """
+
+	def __init__(self, stopwords = set(), placeholder = None, lowercase = True, max_cache_size = 1000000):
+		self.stopwords = stopwords
+		self.placeholder = placeholder
+		self.lowercase = lowercase
+		self.max_cache_size = max_cache_size
+		self.cache = {}
+
+	def __call__( self, s ):
+		if self.lowercase:
+			s = s.lower()
+		cache, tokens = self.cache, []
+		for x in word_pattern.findall(s):
+			tok = cache.get(x)
+			if tok is None:
+				if len(cache) >= self.max_cache_size:
+					cache.clear()
+				tok = cache[x] = self.__decide(x)
+			# note: an empty string indicates the token should be removed
+			if tok:
+				tokens.append(tok)
+		return tokens
+
+	def __decide( self, x ):
+		""" Return the output for a distinct run of word characters in a lowercased document. """
+		x = x.lower()
+		if len(x) < min_term_length or not x[0].isalpha():
+			return ""
+		if x in self.stopwords:
+			return self.placeholder or ""
+		return x
+
+def analyze_document( s, stopwords, ngram_range = (1,1), tokenizer = None ):
+	""" Normalize and tokenize a document, remove stopwords, and generate n-grams, in the 
+	same way as the vectorizer used by the preprocess function. A CachedTokenizer for the same 
+	stopwords can be specified to speed up tokenization. """
+	s = strip_accents_unicode(s.lower())
+	if tokenizer is None:
+		tokens = [tok for tok in custom_tokenizer(s) if not tok in stopwords]
+	else:
+		tokens = tokenizer(s)
+	min_n, max_n = ngram_range
+	if max_n == 1:
+		return tokens
+	ngrams = tokens if min_n == 1 else []
+	for n in range(max(min_n, 2), max_n+1):
+		for i in range(len(tokens) - n + 1):
+			ngrams.append(" ".join(tokens[i:i+n]))
+	return ngrams
+
+def pretokenized_analyzer( tokens ):
+	""" Analyzer for documents which have already been tokenized using analyze_document. """
+	return tokens
 
-def preprocess( docs, stopwords, min_df = 3, ngram_range = (1,1), apply_tfidf = True, apply_norm = True ):
-	""" Preprocess a list containing text documents stored as strings. """	
+def preprocess( docs, stopwords, min_df = 3, ngram_range = (1,1), apply_tfidf = True, apply_norm = True, pretokenized = False ):
+	""" Preprocess an iterable of text documents stored as strings, or of documents which have 
+	already been tokenized with the specified stopwords and n-gram range. """	
 	if apply_norm:
 		norm_function = "l2"
 	else:
 		norm_function = None
 	# build the Vector Space Model, apply TF-IDF and normalize lines to unit length all in one call
-	tfidf = TfidfVectorizer(stop_words=stopwords, lowercase=True, strip_accents="unicode", 
-		tokenizer=custom_tokenizer, use_idf=apply_tfidf, norm=norm_function, min_df = min_df, ngram_range = ngram_range) 
+	if pretokenized:
+		tfidf = TfidfVectorizer(analyzer=pretokenized_analyzer, use_idf=apply_tfidf, norm=norm_function, min_df = min_df) 
+	else:
+		tfidf = TfidfVectorizer(stop_words=stopwords, lowercase=True, strip_accents="unicode", 
+			tokenizer=custom_tokenizer, use_idf=apply_tfidf, norm=norm_function, min_df = min_df, ngram_range = ngram_range) 
 	X = tfidf.fit_transform(docs)
 	terms = []
 	# create the vocabulary map
@@ -88,13 +205,748 @@ def save_corpus(out_prefix, X, terms, doc_ids, document_labels = None):
 	log.info( "Saving document-term matrix to %s" % matrix_outpath )
 	joblib.dump((X,terms,doc_ids,document_labels), matrix_outpath ) 
 
-def load_corpus(in_path):
-	""" Load a pre-processed scikit-learn corpus and associated metadata using Joblib. """
-	(X,terms,doc_ids,document_labels) = joblib.load( in_path )
+def load_corpus(in_path, mmap = False):
+	""" Load a pre-processed scikit-learn corpus and associated metadata using Joblib. If mmap
+	is enabled, the arrays of the document-term matrix are memory-mapped from disk rather
+	than being read into memory. Corpora stored in the directory format are always memory-mapped. """
+	if os.path.isdir(in_path):
+		corpus = CorpusDirectory(in_path)
+		return (corpus.X, corpus.terms, corpus.doc_ids, corpus.document_labels)
+	mmap_mode = "r" if mmap else None
+	(X,terms,doc_ids,document_labels) = joblib.load( in_path, mmap_mode = mmap_mode )
 	return (X, terms, doc_ids, document_labels)
 
+def save_corpus_dir(dir_out, X, terms, doc_ids, document_labels = None, document_frequencies = None, settings = None):
+	""" Save a pre-processed scikit-learn corpus and associated metadata in the directory format, 
+	where the arrays of the sparse document-term matrix are stored as separate NumPy files which
+	can be memory-mapped, along with the terms, document IDs, document labels, and a manifest. 
+	If the document frequencies of all terms and the preprocessing settings are specified, these 
+	are also stored so that new documents can be appended to the corpus later. """
+	log.info( "Saving document-term matrix to %s" % dir_out )
+	if not os.path.exists(dir_out):
+		os.makedirs(dir_out)
+	X = sparse.csr_matrix(X)
+	# the rows are stored with sorted, duplicate-free indices, so the matrix can be used without modifying it
+	if not X.has_canonical_format:
+		X = X.copy()
+		X.sum_duplicates()
+	for name in ["data", "indices", "indptr"]:
+		np.save(os.path.join(dir_out, "%s.npy" % name), getattr(X, name))
+	write_lines(os.path.join(dir_out, "terms.txt"), terms)
+	write_lines(os.path.join(dir_out, "documents.txt"), doc_ids)
+	# labels are stored as an index for each document, or -1 if the document has no label
+	label_names = sorted(document_labels.keys()) if document_labels else []
+	doc_index = { doc_id : i for i, doc_id in enumerate(doc_ids) }
+	labels = np.full(len(doc_ids), -1, dtype=np.int32)
+	for label_index, label in enumerate(label_names):
+		labels[[doc_index[doc_id] for doc_id in document_labels[label]]] = label_index
+	np.save(os.path.join(dir_out, "labels.npy"), labels)
+	manifest = { "format":"csr", "documents":X.shape[0], "terms":X.shape[1], "nnz":int(X.nnz), 
+		"dtype":str(X.dtype), "labels":label_names }
+	if not document_frequencies is None:
+		joblib.dump(document_frequencies, os.path.join(dir_out, "df.pkl"))
+		manifest["settings"] = settings or {}
+	write_manifest(dir_out, manifest)
+
+def write_manifest(dir_out, manifest):
+	""" Write the JSON manifest for a corpus stored in the directory format. The manifest is written
+	to a temporary file first, so that an existing manifest is only replaced once it is complete. """
+	temp_path = os.path.join(dir_out, "manifest.json.tmp")
+	with open(temp_path, "w") as fout:
+		fout.write(json.dumps(manifest, indent=4))
+		fout.write("\n")
+	os.replace(temp_path, os.path.join(dir_out, "manifest.json"))
+
+def convert_corpus(in_path, dir_out):
+	""" Convert a corpus saved with save_corpus to the directory format. """
+	(X,terms,doc_ids,document_labels) = load_corpus(in_path, mmap = True)
+	save_corpus_dir(dir_out, X, terms, doc_ids, document_labels)
+
+def append_corpus_dir(dir_corpus, reader, block_size = 1000000):
+	""" Append the documents from the specified ParallelDocumentReader to a corpus stored in the 
+	directory format with its document frequencies. The document frequencies are extended, terms 
+	which now meet the minimum document frequency are added to the end of the vocabulary, and the 
+	rows for the new documents are added to the document-term matrix. The values for existing 
+	documents are rescaled to reflect the updated IDF weights, using a temporary copy of the data. 
+	If any step fails, the corpus is left unchanged. Note that existing documents are not tokenized 
+	again, so their values for any newly-added terms are zero. Returns the number of documents and 
+	terms added. """
+	corpus = CorpusDirectory(dir_corpus)
+	manifest = corpus.manifest
+	if not "settings" in manifest:
+		raise ValueError("Corpus %s does not include document frequencies, and so cannot be appended to" % dir_corpus)
+	settings = manifest["settings"]
+	df = joblib.load(os.path.join(dir_corpus, "df.pkl"))
+	terms = corpus.terms
+	old_num_docs, old_num_terms = manifest["documents"], manifest["terms"]
+	old_idf = compute_idf([df[term] for term in terms], old_num_docs)
+	# count the document frequencies for the new documents, and extend the vocabulary
+	new_df, new_num_docs = reader.count_document_frequencies()
+	df.update(new_df)
+	num_docs = old_num_docs + new_num_docs
+	vocab = { term : i for i, term in enumerate(terms) }
+	added_terms = sorted(term for term in new_df if df[term] >= settings["min_df"] and not term in vocab)
+	for term in added_terms:
+		vocab[term] = len(vocab)
+	terms = terms + added_terms
+	idf = compute_idf([df[term] for term in terms], num_docs)
+	# build the rows for the new documents
+	new_data, new_indices, new_indptr = array("d"), array("i"), array("q", [0])
+	for tokens in reader:
+		counts = Counter(vocab[tok] for tok in tokens if tok in vocab)
+		for col in sorted(counts):
+			new_indices.append(col)
+			new_data.append(counts[col])
+		new_indptr.append(new_indptr[-1] + len(counts))
+	new_doc_ids = reader.document_ids
+	# check for document IDs which are already in the corpus, before making any changes
+	collisions = set(corpus.doc_ids).intersection(new_doc_ids)
+	if len(new_doc_ids) != len(set(new_doc_ids)) or len(collisions) > 0:
+		raise ValueError("Found %d document IDs which are already in the corpus, such as %s" % 
+			(len(collisions), sorted(collisions)[0] if collisions else "duplicates in the new documents"))
+	new_data, new_indices = np.array(new_data), np.array(new_indices, dtype=np.int32)
+	new_indptr = np.array(new_indptr)
+	if settings["tfidf"]:
+		scale_columns_inplace(new_data, new_indices, idf)
+	if settings["norm"]:
+		normalize_rows_inplace(new_data, new_indptr)
+	label_names = list(manifest["labels"])
+	doc_index = { doc_id : i for i, doc_id in enumerate(new_doc_ids) }
+	new_labels = np.full(len(new_doc_ids), -1, dtype=np.int32)
+	for label, label_doc_ids in reader.labels.items():
+		if not label in label_names:
+			label_names.append(label)
+		new_labels[[doc_index[doc_id] for doc_id in label_doc_ids]] = label_names.index(label)
+	# check that every array can be appended to, before making any changes
+	new_arrays = [("data", new_data), ("indices", new_indices), ("indptr", new_indptr[1:] + manifest["nnz"]), ("labels", new_labels)]
+	for name, values in new_arrays:
+		prepare_append_npy(os.path.join(dir_corpus, "%s.npy" % name), values)
+	# the existing values are rescaled for the updated IDF weights in a copy of the data, which only 
+	# replaces the original once all other files have been updated
+	data_path = os.path.join(dir_corpus, "data.npy")
+	temp_data_path = None
+	if settings["tfidf"] and old_num_docs > 0 and manifest["nnz"] > 0:
+		temp_data_path = os.path.join(dir_corpus, "data.npy.tmp")
+	temp_df_path = os.path.join(dir_corpus, "df.pkl.tmp")
+	# original sizes and headers of the files which are appended to, so that they can be restored on failure
+	backups = []
+	try:
+		if temp_data_path is not None:
+			shutil.copyfile(data_path, temp_data_path)
+			data = np.load(temp_data_path, mmap_mode="r+")
+			indices = np.load(os.path.join(dir_corpus, "indices.npy"), mmap_mode="r")
+			scale_columns_inplace(data, indices, idf[:old_num_terms] / old_idf, block_size)
+			if settings["norm"]:
+				normalize_rows_inplace(data, np.load(os.path.join(dir_corpus, "indptr.npy"), mmap_mode="r"), block_size)
+			data.flush()
+			del data
+		# append the new rows and the other details
+		for name, values in new_arrays:
+			in_path = os.path.join(dir_corpus, "%s.npy" % name)
+			if name == "data" and temp_data_path is not None:
+				in_path = temp_data_path
+			else:
+				backups.append(backup_file(in_path, len(prepare_append_npy(in_path, values)[0])))
+			append_npy(in_path, values)
+		for fname, values in [("terms.txt", added_terms), ("documents.txt", new_doc_ids)]:
+			backups.append(backup_file(os.path.join(dir_corpus, fname)))
+			append_lines(os.path.join(dir_corpus, fname), values)
+		joblib.dump(df, temp_df_path)
+	except BaseException:
+		for backup in reversed(backups):
+			restore_file(*backup)
+		for temp_path in [temp_data_path, temp_df_path]:
+			if temp_path is not None and os.path.exists(temp_path):
+				os.remove(temp_path)
+		raise
+	if temp_data_path is not None:
+		os.replace(temp_data_path, data_path)
+	os.replace(temp_df_path, os.path.join(dir_corpus, "df.pkl"))
+	manifest["documents"], manifest["terms"] = num_docs, len(terms)
+	manifest["nnz"] += len(new_data)
+	manifest["labels"] = label_names
+	write_manifest(dir_corpus, manifest)
+	return new_num_docs, len(added_terms)
+
+def prepare_append_npy(in_path, values):
+	""" Check that values can be appended to the end of a one-dimensional array stored in a NumPy 
+	file, and return the updated header, which has the same length as the existing header so that 
+	it can be written in place, along with the dtype of the array. """
+	with open(in_path, "rb") as f:
+		version = np.lib.format.read_magic(f)
+		if version == (1, 0):
+			shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+		else:
+			shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+		header_length = f.tell()
+	values = np.asarray(values)
+	# note: integer values can be appended to a narrower integer array if they are in range
+	if len(values) > 0 and not np.can_cast(values.dtype, dtype, casting="safe") and not (values.dtype.kind in "iu" 
+		and dtype.kind in "iu" and values.min() >= np.iinfo(dtype).min and values.max() <= np.iinfo(dtype).max):
+		raise ValueError("Cannot append values of type %s to array of type %s in %s" % (values.dtype, dtype, in_path))
+	# the header is padded, so that the new shape can usually be written in place
+	header = { "shape":(shape[0] + len(values),), "fortran_order":fortran_order, "descr":np.lib.format.dtype_to_descr(dtype) }
+	buf = io.BytesIO()
+	if version == (1, 0):
+		np.lib.format.write_array_header_1_0(buf, header)
+	else:
+		np.lib.format.write_array_header_2_0(buf, header)
+	if len(buf.getvalue()) != header_length:
+		raise ValueError("Cannot update the array header in %s" % in_path)
+	return buf.getvalue(), dtype
+
+def append_npy(in_path, values):
+	""" Append values to the end of a one-dimensional array stored in a NumPy file, without
+	reading the existing values into memory. """
+	header, dtype = prepare_append_npy(in_path, values)
+	with open(in_path, "r+b") as f:
+		f.write(header)
+		f.seek(0, os.SEEK_END)
+		np.asarray(values).astype(dtype).tofile(f)
+
+def backup_file(in_path, header_length = 0):
+	""" Record the size and the header of a file before appending to it, so that it can be restored 
+	by restore_file. """
+	with open(in_path, "rb") as f:
+		header = f.read(header_length)
+	return (in_path, os.path.getsize(in_path), header)
+
+def restore_file(in_path, size, header):
+	""" Restore a file to its original size and header, discarding any appended values. """
+	with open(in_path, "r+b") as f:
+		f.write(header)
+		f.truncate(size)
+
+def append_lines(out_path, values):
+	""" Append a list of strings to a newline-delimited file. """
+	with open(out_path, "a", encoding="utf8") as fout:
+		for value in values:
+			fout.write(value)
+			fout.write("\n")
+
+def write_lines(out_path, values):
+	""" Write a list of strings to a newline-delimited file. """
+	with open(out_path, "w", encoding="utf8") as fout:
+		for value in values:
+			fout.write(value)
+			fout.write("\n")
+
+def read_lines(in_path):
+	""" Read the list of strings from a newline-delimited file. """
+	with open(in_path, encoding="utf8") as fin:
+		return fin.read().split("\n")[:-1]
+
+class CorpusDirectory:
+	""" A pre-processed corpus stored in the directory format by save_corpus_dir. The document-term 
+	matrix, terms, document IDs, and document labels are only loaded when first accessed, and the 
+	arrays of the matrix are memory-mapped from disk. The rows of the matrix are stored with sorted,
+	duplicate-free indices by save_corpus_dir and append_corpus_dir. """
+
+	def __init__(self, dir_in):
+		self.dir_in = dir_in
+		with open(os.path.join(dir_in, "manifest.json")) as fin:
+			self.manifest = json.load(fin)
+		self.__X, self.__terms, self.__doc_ids = None, None, None
+
+	@property
+	def X(self):
+		if self.__X is None:
+			arrays = [np.load(os.path.join(self.dir_in, "%s.npy" % name), mmap_mode="r") for name in ["data", "indices", "indptr"]]
+			self.__X = sparse.csr_matrix(tuple(arrays), shape=(self.manifest["documents"], self.manifest["terms"]), copy=False)
+			# note: the read-only arrays cannot be sorted in place, but are already in canonical format
+			self.__X.has_canonical_format = True
+		return self.__X
+
+	@property
+	def terms(self):
+		if self.__terms is None:
+			self.__terms = read_lines(os.path.join(self.dir_in, "terms.txt"))
+		return self.__terms
+
+	@property
+	def doc_ids(self):
+		if self.__doc_ids is None:
+			self.__doc_ids = read_lines(os.path.join(self.dir_in, "documents.txt"))
+		return self.__doc_ids
+
+	@property
+	def labels(self):
+		""" Return the array of label indices for all documents, where -1 indicates no label. """
+		return np.load(os.path.join(self.dir_in, "labels.npy"), mmap_mode="r")
+
+	@property
+	def document_labels(self):
+		""" Return the mapping from each label to its set of document IDs, or None if the corpus has no labels. """
+		label_names = self.manifest["labels"]
+		if len(label_names) == 0:
+			return None
+		document_labels = { label : set() for label in label_names }
+		for doc_id, label_index in zip(self.doc_ids, self.labels):
+			if label_index >= 0:
+				document_labels[label_names[label_index]].add(doc_id)
+		return document_labels
+
+# --------------------------------------------------------------
+
+# settings shared by the worker processes of a ParallelDocumentReader
+worker_settings = {}
+
+def init_document_worker( is_lines, min_doc_length, stopwords, ngram_range, vocabulary = None, ngram_filter = None ):
+	""" Initialize the settings for a worker process used to read documents. If a vocabulary is 
+	specified, only tokens in the vocabulary are retained. """
+	worker_settings["is_lines"] = is_lines
+	worker_settings["min_doc_length"] = min_doc_length
+	worker_settings["stopwords"] = stopwords
+	worker_settings["ngram_range"] = ngram_range
+	worker_settings["vocabulary"] = vocabulary
+	worker_settings["ngram_filter"] = ngram_filter
+	# note: documents are lowercased before tokenization
+	worker_settings["tokenizer"] = CachedTokenizer(stopwords, lowercase = False)
+
+def read_file_documents( in_path ):
+	""" Read, normalize, and tokenize the documents in a single text file, based on the current
+	worker settings. Returns the label, a list of (document ID, tokens) pairs, and the number of 
+	short documents which were skipped. """
+	file_doc_id, label = create_document_id(in_path)
+	if worker_settings["is_lines"]:
+		bodies = (("%s_%04d" % (file_doc_id,(i+1)), body) for i, body in enumerate(iter_text_documents(in_path)))
+	else:
+		bodies = [(file_doc_id, read_text(in_path))]
+	documents, num_short = [], 0
+	for doc_id, body in bodies:
+		if len(body) < worker_settings["min_doc_length"]:
+			num_short += 1
+			continue
+		tokens = analyze_document(body, worker_settings["stopwords"], worker_settings["ngram_range"], worker_settings["tokenizer"])
+		if not worker_settings["vocabulary"] is None:
+			tokens = [tok for tok in tokens if tok in worker_settings["vocabulary"]]
+		documents.append((doc_id, tokens))
+	return label, documents, num_short
+
+def count_document_frequencies( file_paths ):
+	""" Count the number of documents containing each term for a shard of text files, based on 
+	the current worker settings. Returns the counts and the number of documents. """
+	df, num_docs = Counter(), 0
+	for in_path in file_paths:
+		label, documents, num_short = read_file_documents(in_path)
+		for doc_id, tokens in documents:
+			df.update(set(tokens))
+			num_docs += 1
+	return df, num_docs
+
+def hash_ngrams( ngrams ):
+	""" Return a pair of deterministic 32-bit hash values for each of the specified n-grams, 
+	which are consistent across worker processes. """
+	h1 = np.fromiter((zlib.crc32(ngram.encode("utf8")) for ngram in ngrams), dtype=np.uint64, count=len(ngrams))
+	h2 = np.fromiter((zlib.crc32(ngram.encode("utf8"), 0x9e3779b9) for ngram in ngrams), dtype=np.uint64, count=len(ngrams))
+	return h1, h2
+
+def sketch_columns( h1, h2, depth, width ):
+	""" Return the column for each hashed n-gram in each row of a count-min sketch. """
+	return [(h1 + row * (h2 | 1)) % width for row in range(depth)]
+
+def sketch_document_frequencies( file_paths ):
+	""" Count the number of documents containing each unigram for a shard of text files, and 
+	hash each distinct n-gram per document, based on the current worker settings. Returns the 
+	unigram counts, the hash values for the n-grams, and the number of documents. """
+	df, ngrams, num_docs = Counter(), [], 0
+	for in_path in file_paths:
+		label, documents, num_short = read_file_documents(in_path)
+		for doc_id, tokens in documents:
+			for tok in set(tokens):
+				if " " in tok:
+					ngrams.append(tok)
+				else:
+					df[tok] += 1
+			num_docs += 1
+	h1, h2 = hash_ngrams(ngrams)
+	return df, h1, h2, num_docs
+
+def count_candidate_ngrams( file_paths ):
+	""" Count the number of documents containing each candidate n-gram for a shard of text files, 
+	where candidates are n-grams whose unigrams are all frequent, if unigrams are available, and 
+	whose estimated document frequency in the count-min sketch is high enough. """
+	sketch, unigrams, min_df = worker_settings["ngram_filter"]
+	depth, width = sketch.shape
+	df = Counter()
+	for in_path in file_paths:
+		label, documents, num_short = read_file_documents(in_path)
+		for doc_id, tokens in documents:
+			ngrams = [tok for tok in set(tokens) if " " in tok and (unigrams is None or all(part in unigrams for part in tok.split(" ")))]
+			if len(ngrams) == 0:
+				continue
+			h1, h2 = hash_ngrams(ngrams)
+			estimates = np.min([sketch[row, cols] for row, cols in enumerate(sketch_columns(h1, h2, depth, width))], axis=0)
+			df.update(ngram for ngram, estimate in zip(ngrams, estimates) if estimate >= min_df)
+	return df
+
+class ParallelDocumentReader:
+	""" An iterable which reads, normalizes, and tokenizes a collection of text files using a pool 
+	of worker processes, yielding the tokens for each document. Files are processed in chunks to
+	bound memory usage, and documents are always yielded in the same order as the input files. The 
+	document IDs and labels are recorded as the documents are yielded. """
+
+	def __init__(self, file_paths, is_lines = False, min_doc_length = 0, stopwords = set(), 
+			ngram_range = (1,1), workers = 1, chunk_size = 1000):
+		self.file_paths = file_paths
+		self.settings = (is_lines, min_doc_length, stopwords, ngram_range)
+		self.workers = workers
+		self.chunk_size = chunk_size
+		self.document_ids = []
+		self.labels, self.label_counts = {}, {}
+		self.num_short_documents = 0
+
+	def __iter__( self ):
+		self.document_ids = []
+		self.labels, self.label_counts = {}, {}
+		self.num_short_documents = 0
+		pool = None
+		if self.workers > 1:
+			pool = Pool(self.workers, initializer=init_document_worker, initargs=self.settings)
+		else:
+			init_document_worker(*self.settings)
+		try:
+			for start in range(0, len(self.file_paths), self.chunk_size):
+				chunk = self.file_paths[start:start+self.chunk_size]
+				log.debug("Reading files %d-%d of %d ..." % (start+1, start+len(chunk), len(self.file_paths)))
+				# note that the results are returned in the same order as the files
+				if pool is None:
+					results = map(read_file_documents, chunk)
+				else:
+					results = pool.imap(read_file_documents, chunk, max(1, len(chunk) // (4 * self.workers)))
+				for label, documents, num_short in results:
+					if label not in self.labels:
+						self.labels[label] = set()
+						self.label_counts[label] = 0
+					self.num_short_documents += num_short
+					for doc_id, tokens in documents:
+						self.document_ids.append(doc_id)
+						self.labels[label].add(doc_id)
+						self.label_counts[label] += 1
+						yield tokens
+		finally:
+			if pool is not None:
+				pool.terminate()
+
+	def count_document_frequencies( self ):
+		""" Count the number of documents containing each term, where each chunk of files is 
+		counted as a separate shard in parallel and the counts are then merged. """
+		df, num_docs = Counter(), 0
+		for shard_df, shard_num_docs in self.__map_shards(count_document_frequencies, self.settings):
+			df.update(shard_df)
+			num_docs += shard_num_docs
+		return df, num_docs
+
+	def prune_ngrams( self, min_df, sketch_width = 2**22, sketch_depth = 4 ):
+		""" Find the terms which appear in at least min_df documents when using n-grams, without 
+		holding the counts for all candidate n-grams in memory, and restrict the tokens yielded by 
+		this reader to those terms. In the first pass, unigram document frequencies are counted 
+		exactly, while n-gram frequencies are estimated using a count-min sketch. In the second 
+		pass, exact frequencies are only counted for n-grams made up of frequent unigrams, whose 
+		estimated frequency is high enough. As the sketch never underestimates a frequency, the 
+		resulting terms are the same as those found by counting all n-grams. Returns the number of 
+		candidate n-grams that were counted exactly. """
+		settings = self.settings[0:4]
+		unigram_df, sketch = Counter(), np.zeros((sketch_depth, sketch_width), dtype=np.uint32)
+		for shard_df, h1, h2, shard_num_docs in self.__map_shards(sketch_document_frequencies, settings):
+			unigram_df.update(shard_df)
+			for row, cols in enumerate(sketch_columns(h1, h2, sketch_depth, sketch_width)):
+				sketch[row] += np.bincount(cols.astype(np.int64), minlength=sketch_width).astype(np.uint32)
+		# note: unigrams are only generated when the n-gram range starts at 1
+		min_n = settings[3][0]
+		if min_n == 1:
+			unigrams = set(term for term in unigram_df if unigram_df[term] >= min_df)
+			log.info("Found %d unigrams with document frequency >= %d" % (len(unigrams), min_df))
+		else:
+			unigrams = None
+		ngram_df = Counter()
+		for shard_df in self.__map_shards(count_candidate_ngrams, settings + (None, (sketch, unigrams, min_df))):
+			ngram_df.update(shard_df)
+		ngrams = set(term for term in ngram_df if ngram_df[term] >= min_df)
+		log.info("Found %d n-grams with document frequency >= %d, from %d candidates" % (len(ngrams), min_df, len(ngram_df)))
+		# only the frequent terms are yielded from now on
+		vocabulary = ngrams if unigrams is None else ngrams.union(unigrams)
+		self.settings = settings + (vocabulary,)
+		return len(ngram_df)
+
+	def __map_shards( self, func, settings ):
+		""" Apply a function to each chunk of files as a separate shard, in parallel if there are
+		multiple workers, and yield the results in any order. """
+		shards = [self.file_paths[start:start+self.chunk_size] for start in range(0, len(self.file_paths), self.chunk_size)]
+		if self.workers > 1:
+			with Pool(self.workers, initializer=init_document_worker, initargs=settings) as pool:
+				for result in pool.imap_unordered(func, shards):
+					yield result
+		else:
+			init_document_worker(*settings)
+			for shard in shards:
+				yield func(shard)
+
+def compute_idf( doc_freqs, num_documents ):
+	""" Compute smoothed IDF term weights, in the same way as the vectorizer used by the preprocess function. """
+	return np.log((1 + num_documents) / (1 + np.asarray(doc_freqs, dtype=np.float64))) + 1
+
+def scale_columns_inplace( data, indices, weights, block_size = 1000000 ):
+	""" Multiply the values of a sparse matrix, given by its data and indices arrays, by the 
+	weight for their columns, one block of values at a time. """
+	for start in range(0, len(data), block_size):
+		data[start:start+block_size] *= weights[indices[start:start+block_size]]
+
+def normalize_rows_inplace( data, indptr, block_size = 1000000 ):
+	""" Normalize the rows of a sparse matrix, given by its data and indptr arrays, to unit length, 
+	processing blocks of rows with approximately the specified number of values at a time. """
+	num_rows = len(indptr) - 1
+	rows_per_block = max(1, (block_size * len(indptr)) // max(len(data), 1))
+	for r0 in range(0, num_rows, rows_per_block):
+		r1 = min(r0 + rows_per_block, num_rows)
+		s0, s1 = indptr[r0], indptr[r1]
+		row_ids = np.repeat(np.arange(r1-r0), np.diff(indptr[r0:r1+1]))
+		norms = np.sqrt(np.bincount(row_ids, data[s0:s1]**2, minlength=r1-r0))
+		norms[norms == 0] = 1.0
+		data[s0:s1] /= norms[row_ids]
+
+def preprocess_frequencies( docs, min_df = 3, apply_tfidf = True, apply_norm = True ):
+	""" Preprocess an iterable of documents which have already been tokenized, in the same way as the
+	preprocess function, while also returning the document frequencies of all terms, including those 
+	which were removed by the minimum document frequency, so that documents can be appended later. """
+	# note: the vectorizer builds the matrix for all terms before pruning anyway, so this needs no extra memory
+	counter = CountVectorizer(analyzer=pretokenized_analyzer, min_df = 1)
+	X = counter.fit_transform(docs).tocsc()
+	all_terms = counter.get_feature_names_out()
+	counts = np.diff(X.indptr)
+	document_frequencies = Counter({ term : int(counts[i]) for i, term in enumerate(all_terms) })
+	keep = np.flatnonzero(counts >= min_df)
+	X = X[:, keep].tocsr()
+	X.sort_indices()
+	terms = [all_terms[i] for i in keep]
+	tfidf = TfidfTransformer(use_idf=apply_tfidf, norm="l2" if apply_norm else None)
+	return (tfidf.fit_transform(X), terms, document_frequencies)
+
+class OutOfCoreVectorizer:
+	""" Builds a TF-IDF document-term matrix in two passes over a collection of documents, without 
+	holding the documents or the full set of matrix rows in memory. The first pass counts document 
+	frequencies in parallel shards to build the vocabulary. The second pass appends blocks of rows 
+	to an on-disk sparse matrix, which is then weighted and normalized in place. The output matrix 
+	is equivalent to that produced by the preprocess function. """
+
+	def __init__( self, min_df = 3, apply_tfidf = True, apply_norm = True, block_size = 1000000 ):
+		self.min_df = min_df
+		self.apply_tfidf = apply_tfidf
+		self.apply_norm = apply_norm
+		# number of non-zero values processed at once
+		self.block_size = block_size
+
+	def fit_transform( self, reader, dir_out ):
+		""" Build the document-term matrix for the documents from the specified ParallelDocumentReader, 
+		storing its arrays in the specified directory. Returns the memory-mapped matrix and the terms. """
+		# first pass: build the vocabulary
+		log.info("Counting document frequencies ...")
+		df, n = reader.count_document_frequencies()
+		terms = sorted(term for term in df if df[term] >= self.min_df)
+		vocab = { term : i for i, term in enumerate(terms) }
+		log.info("Found %d terms with document frequency >= %d" % (len(terms), self.min_df))
+		# second pass: write the term counts for each document
+		log.info("Building document-term matrix ...")
+		data_path, indices_path = os.path.join(dir_out, "data.bin"), os.path.join(dir_out, "indices.bin")
+		indptr = array("q", [0])
+		with open(data_path, "wb") as fdata, open(indices_path, "wb") as findices:
+			block_data, block_indices = array("d"), array("i")
+			for tokens in reader:
+				counts = Counter(vocab[tok] for tok in tokens if tok in vocab)
+				for col in sorted(counts):
+					block_indices.append(col)
+					block_data.append(counts[col])
+				indptr.append(indptr[-1] + len(counts))
+				if len(block_data) >= self.block_size:
+					block_data.tofile(fdata)
+					block_indices.tofile(findices)
+					block_data, block_indices = array("d"), array("i")
+			block_data.tofile(fdata)
+			block_indices.tofile(findices)
+		nnz = indptr[-1]
+		indptr = np.array(indptr, dtype=np.int32 if nnz < 2**31 else np.int64)
+		if nnz == 0:
+			data, indices = np.zeros(0), np.zeros(0, dtype=np.int32)
+		else:
+			data = np.memmap(data_path, dtype=np.float64, mode="r+")
+			indices = np.memmap(indices_path, dtype=np.int32, mode="r")
+		# apply the weighting and normalization in place, one block at a time
+		self.document_frequencies, self.num_documents = df, n
+		if self.apply_tfidf:
+			idf = compute_idf([df[term] for term in terms], n)
+			scale_columns_inplace(data, indices, idf, self.block_size)
+		if self.apply_norm:
+			normalize_rows_inplace(data, indptr, self.block_size)
+		if nnz > 0:
+			data.flush()
+		X = sparse.csr_matrix((data, indices, indptr), shape=(len(indptr)-1, len(terms)), copy=False)
+		return (X, terms)
+
 # --------------------------------------------------------------
 
+def read_file_tokens( in_path ):
+	""" Read and tokenize the documents in a single text file, without removing stopwords or short
+	documents. Accents are stripped before tokenization, as in analyze_document. Returns the label 
+	and a list of (document ID, document length, tokens) tuples. """
+	file_doc_id, label = create_document_id(in_path)
+	if worker_settings["is_lines"]:
+		bodies = (("%s_%04d" % (file_doc_id,(i+1)), body) for i, body in enumerate(iter_text_documents(in_path)))
+	else:
+		bodies = [(file_doc_id, read_text(in_path))]
+	return label, [(doc_id, len(body), worker_settings["tokenizer"](strip_accents_unicode(body.lower()))) for doc_id, body in bodies]
+
+def build_tokenized_corpus( dir_out, file_paths, is_lines = False, workers = 1, chunk_size = 1000 ):
+	""" Read and tokenize a collection of text files, and store the token IDs of all documents, 
+	along with the vocabulary and document details, in the specified directory. Stopwords and short
+	documents are retained, so that the corpus can be shared by tools which filter them differently. 
+	Accents are stripped before tokenization, so the tokens match those of the direct preprocessing path. """
+	if not os.path.exists(dir_out):
+		os.makedirs(dir_out)
+	settings = (is_lines, 0, set(), (1,1))
+	pool = None
+	if workers > 1:
+		pool = Pool(workers, initializer=init_document_worker, initargs=settings)
+	else:
+		init_document_worker(*settings)
+	vocab, offsets = {}, array("q", [0])
+	try:
+		with open(os.path.join(dir_out, "tokens.bin"), "wb") as ftokens, \
+			open(os.path.join(dir_out, "documents.txt"), "w", encoding="utf8") as fdocs:
+			for start in range(0, len(file_paths), chunk_size):
+				chunk = file_paths[start:start+chunk_size]
+				log.debug("Tokenizing files %d-%d of %d ..." % (start+1, start+len(chunk), len(file_paths)))
+				if pool is None:
+					results = map(read_file_tokens, chunk)
+				else:
+					results = pool.imap(read_file_tokens, chunk, max(1, len(chunk) // (4 * workers)))
+				for label, documents in results:
+					for doc_id, length, tokens in documents:
+						ids = array("i", [vocab.setdefault(tok, len(vocab)) for tok in tokens])
+						ids.tofile(ftokens)
+						offsets.append(offsets[-1] + len(ids))
+						fdocs.write("%s\t%s\t%d\n" % (doc_id, label, length))
+	finally:
+		if pool is not None:
+			pool.terminate()
+	with open(os.path.join(dir_out, "offsets.bin"), "wb") as fout:
+		offsets.tofile(fout)
+	with open(os.path.join(dir_out, "terms.txt"), "w", encoding="utf8") as fout:
+		for term in vocab:
+			fout.write(term + "\n")
+	manifest = { "format":"tokens", "documents":len(offsets)-1, "tokens":offsets[-1], "terms":len(vocab), 
+		"lines":is_lines, "strip_accents":True, "token_dtype":"int32", "offset_dtype":"int64" }
+	with open(os.path.join(dir_out, "manifest.json"), "w") as fout:
+		fout.write(json.dumps(manifest, indent=4))
+		fout.write("\n")
+	return TokenizedCorpus(dir_out)
+
+class TokenizedCorpus:
+	""" A tokenized corpus stored by build_tokenized_corpus, where the token IDs of all documents are
+	memory-mapped from disk, and the vocabulary and document details are held in memory. """
+
+	def __init__(self, dir_in):
+		self.dir_in = dir_in
+		with open(os.path.join(dir_in, "manifest.json")) as fin:
+			self.manifest = json.load(fin)
+		if self.manifest["tokens"] > 0:
+			self.tokens = np.memmap(os.path.join(dir_in, "tokens.bin"), dtype=self.manifest["token_dtype"], mode="r")
+		else:
+			self.tokens = np.zeros(0, dtype=self.manifest["token_dtype"])
+		self.offsets = np.fromfile(os.path.join(dir_in, "offsets.bin"), dtype=self.manifest["offset_dtype"])
+		with open(os.path.join(dir_in, "terms.txt"), encoding="utf8") as fin:
+			self.terms = np.array(fin.read().split("\n")[:-1], dtype=object)
+		self.document_ids, self.labels, self.lengths = [], [], []
+		with open(os.path.join(dir_in, "documents.txt"), encoding="utf8") as fin:
+			for line in fin:
+				doc_id, label, length = line.rstrip("\n").split("\t")
+				self.document_ids.append(doc_id)
+				self.labels.append(label)
+				self.lengths.append(int(length))
+
+	@staticmethod
+	def exists( dir_in ):
+		""" Check whether a tokenized corpus has been stored in the specified directory. """
+		return os.path.exists(os.path.join(dir_in, "manifest.json"))
+
+	def __len__( self ):
+		return len(self.document_ids)
+
+	def get_token_ids( self, doc_index ):
+		""" Return the memory-mapped array of token IDs for the specified document. """
+		return self.tokens[self.offsets[doc_index]:self.offsets[doc_index+1]]
+
+	def iter_token_ids( self, min_doc_length = 0 ):
+		""" Yield the index and token IDs for each document with the specified minimum length. """
+		for doc_index, length in enumerate(self.lengths):
+			if length >= min_doc_length:
+				yield doc_index, self.get_token_ids(doc_index)
+
+class TokenizedDocumentReader:
+	""" An iterable which yields the tokens for each document in a TokenizedCorpus in the same form as 
+	a ParallelDocumentReader, so that it can be used in its place when preprocessing a corpus. 
+	Stopword removal is applied once to the vocabulary rather than to every token. """
+
+	def __init__(self, corpus, min_doc_length = 0, stopwords = set(), ngram_range = (1,1)):
+		self.corpus = corpus
+		self.min_doc_length = min_doc_length
+		self.ngram_range = ngram_range
+		if corpus.manifest.get("strip_accents", False):
+			self.terms = corpus.terms
+		else:
+			# note: older corpora were tokenized before stripping accents, which can differ from the direct path
+			log.warning("Warning: Tokenized corpus was built without stripping accents, so some tokens may differ")
+			self.terms = np.array([strip_accents_unicode(term) for term in corpus.terms], dtype=object)
+		self.keep = np.array([not term in stopwords for term in self.terms], dtype=bool)
+		self.document_ids = []
+		self.labels, self.label_counts = {}, {}
+		self.num_short_documents = 0
+
+	def __iter__( self ):
+		self.document_ids = []
+		self.labels, self.label_counts = {}, {}
+		self.num_short_documents = len(self.corpus) - sum(1 for length in self.corpus.lengths if length >= self.min_doc_length)
+		min_n, max_n = self.ngram_range
+		for doc_index, ids in self.corpus.iter_token_ids(self.min_doc_length):
+			doc_id, label = self.corpus.document_ids[doc_index], self.corpus.labels[doc_index]
+			if label not in self.labels:
+				self.labels[label] = set()
+				self.label_counts[label] = 0
+			self.document_ids.append(doc_id)
+			self.labels[label].add(doc_id)
+			self.label_counts[label] += 1
+			tokens = self.terms[ids[self.keep[ids]]].tolist()
+			if max_n == 1:
+				yield tokens
+				continue
+			ngrams = tokens if min_n == 1 else []
+			for n in range(max(min_n, 2), max_n+1):
+				for i in range(len(tokens) - n + 1):
+					ngrams.append(" ".join(tokens[i:i+n]))
+			yield ngrams
+
+	def count_document_frequencies( self ):
+		""" Count the number of documents containing each term. """
+		df, num_docs = Counter(), 0
+		for tokens in self:
+			df.update(set(tokens))
+			num_docs += 1
+		return df, num_docs
+
+class TokenizedSentences:
+	""" An iterable which yields the tokens for each document in a TokenizedCorpus for training a 
+	word embedding, where stopwords are replaced by a placeholder. The corpus can be iterated 
+	repeatedly, with token IDs streamed from the memory-mapped array on each iteration. """
+
+	def __init__(self, corpus, min_doc_length = 0, stopwords = set()):
+		self.corpus = corpus
+		self.min_doc_length = min_doc_length
+		self.placeholder = "<stopword>"
+		self.terms = np.array([self.placeholder if term in stopwords else term for term in corpus.terms], dtype=object)
+
+	def __iter__( self ):
+		for doc_index, ids in self.corpus.iter_token_ids(self.min_doc_length):
+			yield self.terms[ids].tolist()
+
 class FileTokenGenerator:
 	""" A generator which yields tokens from a collection of text files,
 	where each file represents a separate document. """
@@ -104,6 +956,7 @@ class FileTokenGenerator:
 		self.min_doc_length = min_doc_length
 		self.stopwords = stopwords
 		self.placeholder = "<stopword>"
+		self.tokenizer = CachedTokenizer(stopwords, self.placeholder, lowercase = False)
 
 	def __iter__( self ):
 		for in_path in self.file_paths:
@@ -111,13 +964,7 @@ class FileTokenGenerator:
 			if len(doc) < self.min_doc_length:
 				log.debug("Skipping short document: %s" % in_path)
 				continue
-			tokens = []
-			for tok in custom_tokenizer(doc):
-				if tok in self.stopwords:
-					tokens.append(self.placeholder)
-				else:
-					tokens.append(tok)
-			yield tokens
+			yield self.tokenizer(doc)
 
 class LineTokenGenerator(FileTokenGenerator):
 	""" A generator which yields tokens from a collection of text files,
@@ -128,15 +975,9 @@ class LineTokenGenerator(FileTokenGenerator):
 
 	def __iter__( self ):
 		for in_path in self.file_paths:
-			text = read_text( in_path ).lower()
-			for doc in text.split("\n"):
+			for doc in iter_text_documents( in_path ):
+				doc = doc.lower()
 				if len(doc) < self.min_doc_length:
 					log.debug("Skipping short document: %s" % in_path)
 					continue
-				tokens = []
-				for tok in custom_tokenizer(doc):
-					if tok in self.stopwords:
-						tokens.append(self.placeholder)
-					else:
-						tokens.append(tok)
-				yield tokens
+				yield self.tokenizer(doc)
@@ -4,8 +4,13 @@ Applies NMF to the specified dataset to generate one or more topic models.
 
 Sample usage:
 python topicscan/topic_nmf.py bbc.pkl --init random --kmin 5 --kmax 5 -r 5 --maxiters 100 -o models/bbc
+python topicscan/topic_nmf.py bbc.pkl --init nndsvda --solver mu --tol 1e-3 --float32 --kmin 5 -r 1 -o models/bbc
+python topicscan/topic_nmf.py bbc.pkl --init nndsvd --sweep --warm --kmin 5 --kmax 30 -r 1 -o models/bbc
+python topicscan/topic_nmf.py bbc.pkl --online --batchsize 2048 --epochs 5 --kmin 5 -r 1 -o models/bbc
+python topicscan/topic_nmf.py bbc.pkl --compact --sparsetop 1000 --kmin 5 -r 1 -o models/bbc
+python topicscan/topic_nmf.py bbc --online --kmin 5 -r 1 -o models/bbc
 """
-import sys, json
+import sys, json, time
 from pathlib import Path
 import logging as log
 from optparse import OptionParser
@@ -20,8 +25,32 @@ def main():
 	parser.add_option("--kmin", action="store", type="int", dest="kmin", help="minimum number of topics (default is 5)", default=5)
 	parser.add_option("--kmax", action="store", type="int", dest="kmax", help="maximum number of topics (if not specified, this will be kmin)", default=-1)
 	parser.add_option('--step' ,type="int", dest="step", help="Step size for incrementing the number of topics", default=1)
-	parser.add_option("-i","--init", action="store", type="string", dest="init_strategy", help="initialization strategy (random or nndsvd)", default="random")
+	parser.add_option("-i","--init", action="store", type="string", dest="init_strategy", help="initialization strategy (random, nndsvd, nndsvda or nndsvdar)", default="random")
 	parser.add_option("--maxiters", action="store", type="int", dest="maxiters", help="maximum number of iterations", default=100)
+	parser.add_option("--solver", action="store", type="string", dest="solver", 
+		help="numerical solver (cd for coordinate descent, mu for multiplicative update), where online NMF always uses mu", default="cd")
+	parser.add_option("--tol", action="store", type="float", dest="tol", help="tolerance of the stopping condition", default=1e-4)
+	parser.add_option("--beta", action="store", type="string", dest="beta_loss", 
+		help="beta divergence to be minimized (frobenius, kullback-leibler, or itakura-saito)", default="frobenius")
+	parser.add_option("--alpha", action="store", type="float", dest="alpha", help="regularization strength alpha_W, also used for alpha_H (default is 0, i.e. no regularization)", default=0.0)
+	parser.add_option("--l1ratio", action="store", type="float", dest="l1_ratio", help="regularization mixing parameter, between 0 (L2) and 1 (L1)", default=0.0)
+	parser.add_option("--float32", action="store_true", dest="use_float32", help="perform computations in single precision", default=False)
+	parser.add_option("--sweep", action="store_true", dest="sweep", 
+		help="reuse a single truncated SVD for NNDSVD initialization across all values of k", default=False)
+	parser.add_option("--warm", action="store_true", dest="warm", 
+		help="warm start each value of k from the solution for the previous value of k", default=False)
+	parser.add_option("--online", action="store_true", dest="online", 
+		help="use mini-batch online NMF, streaming the memory-mapped corpus from disk", default=False)
+	parser.add_option("--batchsize", action="store", type="int", dest="batch_size", help="number of documents per batch for online NMF", default=2048)
+	parser.add_option("--epochs", action="store", type="int", dest="epochs", help="maximum number of passes over the corpus for online NMF", default=5)
+	parser.add_option("--compact", action="store_true", dest="compact", 
+		help="store the factors as sparse single precision matrices, only retaining the top weights per topic", default=False)
+	parser.add_option("--sparsetop", action="store", type="int", dest="sparse_top", 
+		help="for compact factors, number of top weights to retain per topic (default is 0, i.e. use the threshold)", default=0)
+	parser.add_option("--sparsethresh", action="store", type="float", dest="sparse_threshold", 
+		help="for compact factors, retain weights which are at least this fraction of the maximum weight per topic", default=0.0)
+	parser.add_option("--ntop", action="store", type="int", dest="num_top", 
+		help="number of top documents and terms per topic to store in ranked order", default=100)
 	parser.add_option("-r","--runs", action="store", type="int", dest="runs", help="number of runs", default=1)
 	parser.add_option("-o","--outdir", action="store", type="string", dest="dir_out", help="base output directory (default is current directory)", default=None)
 	parser.add_option("--debug", action="store_true", dest="debug", help="enable debugging information", default=False)
@@ -39,6 +68,34 @@ def main():
 		sys.exit(1)
 	if kmax < 2:
 		kmax = kmin
+	# validate the solver settings
+	if options.online and (options.beta_loss != "frobenius" or options.alpha != 0 or options.l1_ratio != 0):
+		log.error("Error: Online NMF only supports the frobenius beta loss, without regularization")
+		sys.exit(1)
+	# note: online NMF always uses multiplicative updates, so this is recorded in the metadata
+	if options.online:
+		options.solver = "mu"
+	if not options.solver in ["cd", "mu"]:
+		log.error("Error: Unknown NMF solver '%s'" % options.solver)
+		sys.exit(1)
+	if options.solver == "cd" and options.beta_loss != "frobenius":
+		log.error("Error: The cd solver only supports the frobenius beta loss")
+		sys.exit(1)
+	if options.online and options.init_strategy != "random" and not options.sweep:
+		log.error("Error: Online NMF only supports random initialization, or NNDSVD in sweep mode")
+		sys.exit(1)
+	if options.online and options.warm:
+		log.error("Error: Warm starts are not supported for online NMF")
+		sys.exit(1)
+	if options.num_top < 1:
+		log.error("Error: Invalid number of top documents and terms ntop=%s" % options.num_top)
+		sys.exit(1)
+	if options.online and options.compact:
+		log.error("Error: Compact factors are not supported for online NMF, since the document factor is written directly to disk")
+		sys.exit(1)
+	if options.sweep and not options.init_strategy.startswith("nndsvd"):
+		log.error("Error: Sweep mode requires an NNDSVD initialization strategy")
+		sys.exit(1)
 
 	# where will we store the output files?
 	if options.dir_out is None:
@@ -59,16 +116,41 @@ def main():
 	if not corpus_path.exists():
 		log.error("Error: No such input file %s" % corpus_path)
 		sys.exit(1)
-	(X,terms,doc_ids,_) = text.util.load_corpus(corpus_path)
+	(X,terms,doc_ids,_) = text.util.load_corpus(corpus_path, mmap = options.online)
 	corpus_id = corpus_path.stem
 	log.info("Loaded preprocessed corpus '%s': %d documents, %d terms" % (corpus_id, len(doc_ids), len(terms)))
 
 	# get the algorithm implementation
-	impl = model.nmf.NMFWrapper(max_iters=options.maxiters, init_strategy=options.init_strategy)
+	if options.online:
+		def log_descriptors(epoch, impl):
+			""" Report the partial topic descriptors after each epoch """
+			log.info("Epoch %d/%d" % (epoch, options.epochs))
+			for topic_index in range(impl.H.shape[0]):
+				descriptor = [terms[i] for i in impl.rank_terms(topic_index, 10)]
+				log.info("Topic %02d: %s" % (topic_index+1, ", ".join(descriptor)))
+		impl = model.nmf.OnlineNMFWrapper(max_iters=options.maxiters, init_strategy=options.init_strategy, tol=options.tol, 
+			use_float32=options.use_float32, batch_size=options.batch_size, epochs=options.epochs, epoch_callback=log_descriptors)
+	else:
+		impl = model.nmf.NMFWrapper(max_iters=options.maxiters, init_strategy=options.init_strategy, solver=options.solver, 
+			tol=options.tol, beta_loss=options.beta_loss, alpha=options.alpha, l1_ratio=options.l1_ratio, use_float32=options.use_float32)
+
+	# compute a single shared SVD for the full sweep?
+	svd_init = None
+	if options.sweep:
+		model.util.init_random_seeds(options.seed)
+		log.info("Computing shared truncated SVD for k=%d ..." % kmax)
+		X_svd = X.astype(np.float32) if options.use_float32 else X
+		svd_init = model.nmf.SVDInitializer(X_svd, kmax, options.init_strategy, random_state=options.seed)
+		log.info("Computed shared truncated SVD in %.2f secs" % svd_init.elapsed)
+	# factors from the previous value of k for each run, used for warm starts
+	prev_factors = {}
 
 	# generate all NMF topic models for the specified numbers of topics
-	log.info("Generating NMF models in range k=[%d,%d], init_strategy=%s" % (kmin, kmax, options.init_strategy))
+	log.info("Generating NMF models in range k=[%d,%d], init_strategy=%s, solver=%s" % (kmin, kmax, options.init_strategy, options.solver))
+	sweep_start = time.time()
+	num_sweep_k, total_iterations = 0, 0
 	for k in range(kmin, kmax+1, options.step):
+		num_sweep_k += 1
 		# set the current random state
 		model.util.init_random_seeds(options.seed)
 		log.info("Applying NMF (k=%d, runs=%d, seed=%s) ..." % (k, options.runs, options.seed))
@@ -89,18 +171,52 @@ def main():
 			"k":k,
 			"algorithm":{ "id":"nmf-%s" % options.init_strategy } 
 		}
+		if options.online:
+			metadata_template["algorithm"]["id"] = "online-nmf-%s" % options.init_strategy
 		metadata_template["algorithm"]["params"] = { 
 			"k":k, 
 			"init":options.init_strategy, 
 			"seed":options.seed, 
-			"max_iterations":options.maxiters
+			"max_iterations":options.maxiters,
+			"solver":options.solver,
+			"tol":options.tol,
+			"beta_loss":options.beta_loss,
+			"alpha_W":options.alpha,
+			"alpha_H":"same",
+			"l1_ratio":options.l1_ratio,
+			"float32":options.use_float32,
+			"sweep":options.sweep,
+			"warm_start":options.warm
 		} 
+		if options.online:
+			metadata_template["algorithm"]["params"]["batch_size"] = options.batch_size
+			metadata_template["algorithm"]["params"]["epochs"] = options.epochs
 		# execute the specified number of runs
 		for r in range(options.runs):
 			log.info("NMF run %d/%d (k=%d, max_iters=%d)" % (r+1, options.runs, k, options.maxiters))
 			file_prefix = "%s_%s_%03d" % (corpus_id, options.seed, r+1)
 			# apply NMF
-			impl.apply(X, k)
+			if options.warm and r in prev_factors:
+				(W_prev, H_prev) = prev_factors[r]
+				split_vector = None if svd_init is None else svd_init.get_split_vector(W_prev.shape[1]+1)
+				(W_init, H_init) = model.nmf.split_factors(W_prev, H_prev, k, split_vector)
+				log.debug("Warm starting from solution for k=%d" % W_prev.shape[1])
+			elif svd_init is not None:
+				(W_init, H_init) = svd_init.init_factors(k)
+			else:
+				W_init, H_init = None, None
+			if options.online:
+				# write the document factor directly to disk
+				fname_W = "%s_W.npy" % file_prefix
+				impl.apply(X, k, W_init, H_init, W_out_path = dir_out_k / fname_W)
+			else:
+				impl.apply(X, k, W_init, H_init)
+			if options.warm:
+				prev_factors[r] = (impl.W, impl.H)
+			stats = impl.get_convergence_stats()
+			total_iterations += stats["iterations"]
+			log.info("NMF converged after %d iterations in %.2f secs (reconstruction error=%.4f)" % 
+				(stats["iterations"], stats["time"], stats["reconstruction_error"]))
 			# get term rankings for each topic
 			term_rankings = []
 			for topic_index in range(k):		
@@ -123,24 +239,50 @@ def main():
 			factor_out_path = dir_out_k / fname_factors
 			# NB: need to make a copy of the factors
 			log.debug("Writing factorization to %s" % factor_out_path)
-			model.util.save_nmf_factors(factor_out_path, np.array(impl.W), np.array(impl.H), doc_ids, terms)
+			if options.online:
+				# the document factor has already been written to its own file
+				model.util.save_nmf_factors(factor_out_path, None, np.array(impl.H), doc_ids, terms)
+			elif options.compact:
+				model.util.save_compact_nmf_factors(factor_out_path, np.array(impl.W), np.array(impl.H), doc_ids, terms,
+					options.sparse_top, options.sparse_threshold)
+			else:
+				model.util.save_nmf_factors(factor_out_path, np.array(impl.W), np.array(impl.H), doc_ids, terms)
+			# write the ranked top documents and terms for each topic
+			fname_top = "%s_top.pkl" % file_prefix
+			top_out_path = dir_out_k / fname_top
+			log.debug("Writing top associations to %s" % top_out_path)
+			model.util.save_top_associations(top_out_path, impl.W, impl.H, doc_ids, terms, options.num_top)
 			# update the metadata and write it
 			metadata = metadata_template.copy()
 			metadata["files"] = {
 				"factors":fname_factors,
 				"partition":fname_partition,
-				"ranks":fname_ranks
+				"ranks":fname_ranks,
+				"top":fname_top
 			}
+			if options.online:
+				metadata["files"]["document_factor"] = fname_W
 			metadata["descriptors"] = []
 			truncated_rankings = model.util.truncate_term_rankings( term_rankings, 10 )
 			for descriptor in truncated_rankings:
 				metadata["descriptors"].append(descriptor)
 			metadata["algorithm"]["params"]["run"] = r+1
+			metadata["convergence"] = stats
 			metadata_out_path = dir_out_k / ("%s.meta" % file_prefix)
 			log.info("Writing topic model metadata to %s" % metadata_out_path)
 			with open(metadata_out_path, "w", encoding="utf8", errors="ignore") as fout:
 				fout.write(json.dumps(metadata, indent=4))
 				fout.write("\n")
+
+	# report the overall time for the sweep
+	log.info("Completed sweep of %d values of k in %.2f secs (%d total iterations)" % 
+		(num_sweep_k, time.time() - sweep_start, total_iterations))
+	if svd_init is not None:
+		log.info("Shared SVD computed once in %.2f secs, and reused for %d values of k and %d runs" % 
+			(svd_init.elapsed, num_sweep_k, options.runs))
+		separate_time = svd_init.estimate_separate_time(X_svd, range(kmin, kmax+1, options.step), options.runs)
+		log.info("Estimated time for separate SVDs is %.2f secs, saving %.2f secs" % 
+			(separate_time, separate_time - svd_init.elapsed))
 		  
 # --------------------------------------------------------------
 
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""
+Tool to evaluate all topic models in a directory using every validation measure, without starting
+the TopicScan web interface. Scores are written at both the topic level and the model level, for
+each of the specified word embeddings.
+
+Where an embedding has memory-mapped normalized vectors (see prep_word2vec.py), the models are
+evaluated in parallel using a pool of worker processes which share the vectors.
+
+Sample usage:
+python topicscan/validate_models.py ~/sample -o ~/sample/validation
+python topicscan/validate_models.py ~/sample/models --embeddir ~/sample/embeddings -e bbc-w2v-sg,wiki-w2v-sg --format parquet -o validation
+"""
+import sys, time
+from pathlib import Path
+import logging as log
+from optparse import OptionParser
+import pandas as pd
+# TopicScan imports
+from webcore import WebCore
+from webvalidation import ModelValidator, measure_names, evaluate_all_scores, evaluate_parallel, round_score
+
+# --------------------------------------------------------------
+
+def main():
+	parser = OptionParser(usage="usage: %prog [options] dir_core")
+	parser.add_option("--embeddir", action="store", type="string", dest="dir_embed",
+		help="directory containing the word embedding metadata (default is the same as the topic model directory)", default=None)
+	parser.add_option("-e", "--embeddings", action="store", type="string", dest="embed_ids",
+		help="comma-separated list of word embedding IDs to use (default is all embeddings)", default=None)
+	parser.add_option("--workers", action="store", type="int", dest="workers",
+		help="number of worker processes (default is taken from the configuration, 0 for all CPU cores)", default=None)
+	parser.add_option("--format", action="store", type="string", dest="format", help="output file format (csv or parquet)", default="csv")
+	parser.add_option("--prefix", action="store", type="string", dest="prefix", help="prefix for the output file names", default="validation")
+	parser.add_option("-o","--outdir", action="store", type="string", dest="dir_out", help="output directory (default is current directory)", default=None)
+	parser.add_option("--debug", action="store_true", dest="debug", help="enable debugging information", default=False)
+	(options, args) = parser.parse_args()
+	if len(args) != 1:
+		parser.error("Must specify the directory containing the topic model metadata")
+	if not options.format in ["csv", "parquet"]:
+		parser.error("Unsupported output format: %s" % options.format)
+	# control level of log output
+	log_level = log.DEBUG if options.debug else log.INFO
+	log.basicConfig(level=log_level, format='%(message)s')
+
+	# find the topic models and the embeddings
+	dir_core = Path(args[0])
+	if not dir_core.is_dir():
+		log.error("Error: Invalid topic model directory specified: %s" % dir_core)
+		sys.exit(1)
+	webcore = WebCore(dir_core)
+	webcore.init(False)
+	if options.dir_embed is None:
+		embed_core = webcore
+	else:
+		embed_core = WebCore(Path(options.dir_embed))
+		embed_core.init(False)
+	if options.embed_ids is None:
+		embed_ids = embed_core.get_embedding_ids()
+	else:
+		embed_ids = [embed_id.strip() for embed_id in options.embed_ids.split(",")]
+	if webcore.get_topic_model_count() == 0:
+		log.error("Error: No topic models found in %s" % dir_core)
+		sys.exit(1)
+	if len(embed_ids) == 0:
+		log.error("Error: No word embeddings found")
+		sys.exit(1)
+
+	# load the topic descriptors
+	tasks = []
+	for model_id in webcore.get_topic_model_ids():
+		descriptors = webcore.get_topic_model_metadata(model_id).get_descriptors()
+		if descriptors is None:
+			log.warning("Skipping topic model with no descriptors: %s" % model_id)
+			continue
+		tasks.append((model_id, descriptors))
+	workers = ModelValidator(options.workers).workers
+
+	# evaluate the models using each embedding
+	topic_rows, model_rows = [], []
+	for embed_id in embed_ids:
+		embed = embed_core.get_embedding(embed_id)
+		if embed is None:
+			log.error("Error: Failed to load word embedding %s" % embed_id)
+			sys.exit(1)
+		if not embed.is_memory_mapped():
+			log.warning("Word embedding %s has no memory-mapped vectors, so models will be evaluated serially" % embed_id)
+		log.info("Evaluating %d topic models using %s ..." % (len(tasks), embed_id))
+		start_time = time.time()
+		for i, (model_id, (model_scores, topic_scores)) in enumerate(evaluate_parallel(evaluate_all_scores, tasks, embed, workers)):
+			meta = webcore.get_topic_model_metadata(model_id)
+			topic_rows += build_topic_rows(embed_id, meta, topic_scores)
+			model_rows.append(build_model_row(embed_id, meta, model_scores))
+			if (i+1) % 100 == 0:
+				log.info("Evaluated %d/%d topic models" % (i+1, len(tasks)))
+		log.info("Completed evaluation using %s in %.1f seconds" % (embed_id, time.time() - start_time))
+
+	# restore a consistent order, since the models are evaluated in parallel
+	df_models = pd.DataFrame(model_rows).sort_values(by=["Embedding", "Model"])
+	df_topics = pd.DataFrame(topic_rows).sort_values(by=["Embedding", "Model", "Topic"])
+	# write the results
+	dir_out = Path.cwd() if options.dir_out is None else Path(options.dir_out)
+	dir_out.mkdir(parents=True, exist_ok=True)
+	for df, suffix in [(df_models, "models"), (df_topics, "topics")]:
+		out_path = dir_out / ("%s_%s.%s" % (options.prefix, suffix, options.format))
+		log.info("Writing %d rows to %s" % (len(df), out_path))
+		try:
+			if options.format == "parquet":
+				df.to_parquet(out_path, index=False)
+			else:
+				df.to_csv(out_path, index=False)
+		except ImportError as e:
+			log.error("Error: Failed to write %s" % out_path)
+			log.error(e)
+			sys.exit(1)
+
+# --------------------------------------------------------------
+
+def build_model_row(embed_id, meta, model_scores):
+	""" Build a row of model-level validation scores. """
+	row = { "Embedding" : embed_id, "Model" : meta["id"], "Corpus" : meta["corpus"],
+		"Algorithm" : meta["algorithm"]["id"], "Topics" : meta["k"] }
+	for measure_id in measure_names:
+		row[measure_id] = round_score(model_scores[measure_id])
+	return row
+
+def build_topic_rows(embed_id, meta, topic_scores):
+	""" Build the rows of topic-level validation scores for a single topic model. """
+	descriptors = meta.get_descriptors()
+	rows = []
+	for i, descriptor in enumerate(descriptors):
+		row = { "Embedding" : embed_id, "Model" : meta["id"], "Topic" : (i+1), "Descriptor" : ", ".join(descriptor) }
+		for measure_id in measure_names:
+			row[measure_id] = round_score(topic_scores[measure_id][i])
+		row["Coverage"] = round_score(topic_scores["coverage"][i])
+		rows.append(row)
+	return rows
+
+# --------------------------------------------------------------
+
+if __name__ == "__main__":
+	main()
@@ -1,18 +1,23 @@
+import threading
 from urllib.parse import urlparse, parse_qs
 import logging as log
-from dash.dependencies import Input, Output
+import dash
+from dash.dependencies import Input, Output, State, ClientsideFunction
 
 # --------------------------------------------------------------
 
 # cache for layouts that have already been generated by the Dash application
 layout_cache = {}
+# locks to ensure that each layout only handles one callback at a time
+layout_locks = {}
+layout_locks_guard = threading.Lock()
 
 def extract_uid(href):
 	""" Extract a layout page's unique ID from a URL, or return an error meessage
 	if it is not present in the URL. """
 	parts = urlparse(href.lower())
 	query = parse_qs(parts.query)
-	error = None
+	param_uid, error = None, None
 	if "uid" in query and len(query["uid"]) > 0:
 		param_uid = query["uid"][0]
 		if param_uid not in layout_cache:
@@ -21,32 +26,39 @@ def extract_uid(href):
 		error = "No unique state identifier was provided"
 	return param_uid, error
 
+def get_layout_lock(uid):
+	""" Return the lock for the layout page with the specified unique ID. """
+	with layout_locks_guard:
+		if not uid in layout_locks:
+			layout_locks[uid] = threading.Lock()
+		return layout_locks[uid]
+
+def get_triggered_ids():
+	""" Return the set of IDs of the components which triggered the current callback, or None
+	if this is the initial call for the callback. """
+	triggered_ids = set()
+	for trigger in dash.callback_context.triggered:
+		if trigger["prop_id"] == ".":
+			return None
+		triggered_ids.add(trigger["prop_id"].rsplit(".", 1)[0])
+	return triggered_ids
+
+def register_topic_figure_callback(app, dropdown_id, graph_id, store_id):
+	""" Set up a clientside callback which displays the figure for the topic selected in a 
+	dropdown, from the precomputed figures for all topics held in a store. """
+	app.clientside_callback(
+		ClientsideFunction(namespace="topicscan", function_name="select_topic_figure"),
+		Output(graph_id, 'figure'),
+		[Input(dropdown_id, 'value')],
+		[State(store_id, 'data')])
+
 # --------------------------------------------------------------
 
 def register_topics_callbacks(app):
 	""" Set up the callbacks for TopicModelLayout """
-
-	@app.callback(Output('content_term_assoc', 'children'), 
-		[Input('url', 'href'), Input('topic-term-dropdown', 'value')])
-	def topics_term_assoc_topic(href, topic_index):
-		log.debug("Callback: topics_term_assoc_topic: %s" % topic_index)
-		uid, error = extract_uid(href)
-		if error is not None:
-			log.error("%s: %s" % (error, href))
-			return error
-		layout_cache[uid].current_term_topic_index = int(topic_index)
-		return layout_cache[uid].generate_term_association_chart()
-
-	@app.callback(Output('content_document_assoc', 'children'), 
-		[Input('url', 'href'), Input('topic-document-dropdown', 'value')])
-	def topics_document_assoc_topic(href, topic_index):
-		log.debug("Callback: topics_document_assoc_topic: %s" % topic_index)
-		uid, error = extract_uid(href)
-		if error is not None:
-			log.error("%s: %s" % (error, href))
-			return error
-		layout_cache[uid].current_document_topic_index = int(topic_index)
-		return layout_cache[uid].generate_document_association_chart()
+	# note: the charts for all topics are precomputed, so topic selection is handled on the client
+	register_topic_figure_callback(app, 'topic-term-dropdown', 'chart_term_assoc', 'store_term_assoc')
+	register_topic_figure_callback(app, 'topic-document-dropdown', 'chart_document_assoc', 'store_document_assoc')
 
 # --------------------------------------------------------------
 
@@ -78,51 +90,28 @@ def register_embedding_callbacks(app):
 def register_validation_callbacks(app):
 	""" Set up the callbacks for ValidationlLayout """
 
-	@app.callback(Output('content_vtable', 'children'),
-		[Input('url', 'href'), Input('embed-dropdown', 'value')])
-	def update_embed_dropdown1(href, embed_id):
-		log.debug("Callback: update_embed_dropdown1: embed_id=%s" % embed_id)
-		uid, error = extract_uid(href)
-		if error is not None:
-			log.error("%s: %s" % (error, href))
-			return error
-		layout_cache[uid].current_embed_id = embed_id
-		return layout_cache[uid].generate_vtable()
-
-	@app.callback(Output('content_vchart', 'children'),
+	@app.callback([Output('content_vtable', 'children'), Output('content_vchart', 'children'),
+		Output('content_vsummary', 'children'), Output('content_vdistribution', 'children')],
 		[Input('url', 'href'), Input('measure-dropdown', 'value'), Input('embed-dropdown', 'value')])
-	def validation_measure_dropdown1(href, measure_id, embed_id):
-		log.debug("Callback: validation_measure_dropdown1: measure_id=%s embed_id=%s" % (measure_id, embed_id))
-		uid, error = extract_uid(href)
-		if error is not None:
-			log.error("%s: %s" % (error, href))
-			return error
-		layout_cache[uid].current_measure_id = measure_id
-		layout_cache[uid].current_embed_id = embed_id
-		return layout_cache[uid].generate_vchart()
-
-	@app.callback(Output('content_vsummary', 'children'),
-		[Input('url', 'href'), Input('measure-dropdown', 'value'), Input('embed-dropdown', 'value')])
-	def validation_measure_dropdown2(href, measure_id, embed_id):
-		log.debug("Callback: validation_measure_dropdown2: measure_id=%s embed_id=%s" % (measure_id, embed_id))
-		uid, error = extract_uid(href)
-		if error is not None:
-			log.error("%s: %s" % (error, href))
-			return error
-		layout_cache[uid].current_measure_id = measure_id
-		layout_cache[uid].current_embed_id = embed_id
-		return layout_cache[uid].generate_vsummary()
-
-	@app.callback(Output('content_vdistribution', 'children'), 
-		[Input('url', 'href'), Input('embed-dropdown', 'value')])
-	def validation_embed_dropdown2(href, embed_id):
-		log.debug("Callback: validation_embed_dropdown2: embed_id=%s" % embed_id)
+	def validation_dropdowns(href, measure_id, embed_id):
+		log.debug("Callback: validation_dropdowns: measure_id=%s embed_id=%s" % (measure_id, embed_id))
 		uid, error = extract_uid(href)
 		if error is not None:
 			log.error("%s: %s" % (error, href))
-			return error
-		layout_cache[uid].current_embed_id = embed_id
-		return layout_cache[uid].generate_vdistribution()
+			return error, error, error, error
+		# only the chart and summary depend on the selected measure
+		triggered = get_triggered_ids()
+		embed_changed = triggered is None or not triggered.issubset({"measure-dropdown"})
+		with get_layout_lock(uid):
+			layout = layout_cache[uid]
+			layout.current_measure_id = measure_id
+			layout.current_embed_id = embed_id
+			# note: the validation scores are computed once, then cached by the layout for the other outputs
+			vtable = layout.generate_vtable() if embed_changed else dash.no_update
+			vchart = layout.generate_vchart()
+			vsummary = layout.generate_vsummary()
+			vdistribution = layout.generate_vdistribution() if embed_changed else dash.no_update
+		return vtable, vchart, vsummary, vdistribution
 
 # --------------------------------------------------------------
 
@@ -137,8 +126,9 @@ def register_silhouette_callbacks(app):
 		if error is not None:
 			log.error("%s: %s" % (error, href))
 			return error
-		layout_cache[uid].current_embed_id = embed_id
-		return layout_cache[uid].generate_topiclevel_chart()
+		with get_layout_lock(uid):
+			layout_cache[uid].current_embed_id = embed_id
+			return layout_cache[uid].generate_topiclevel_chart()
 
 	@app.callback(Output('silhouette_content_distribution', 'children'),
 		[Input('url', 'href'), Input('embed-dropdown', 'value')])
@@ -148,20 +138,25 @@ def register_silhouette_callbacks(app):
 		if error is not None:
 			log.error("%s: %s" % (error, href))
 			return error
-		layout_cache[uid].current_embed_id = embed_id
-		return layout_cache[uid].generate_distribution_chart()
+		# note: the term-level scores are shared with the term-level chart
+		with get_layout_lock(uid):
+			layout_cache[uid].current_embed_id = embed_id
+			return layout_cache[uid].generate_distribution_chart()
 
 	@app.callback(Output('silhouette_content_termlevel', 'children'),
-		[Input('url', 'href'), Input('topic-sil-dropdown', 'value'), Input('embed-dropdown', 'value')])
-	def silhouette_topic_termlevel(href, topic_index, embed_id):
+		[Input('url', 'href'), Input('embed-dropdown', 'value')], [State('topic-sil-dropdown', 'value')])
+	def silhouette_topic_termlevel(href, embed_id, topic_index):
 		log.debug("Callback: silhouette_topic_termlevel: (%s,%s)" % (topic_index,embed_id))
 		uid, error = extract_uid(href)
 		if error is not None:
 			log.error("%s: %s" % (error, href))
 			return error
-		layout_cache[uid].current_topic_index = int(topic_index)
-		layout_cache[uid].current_embed_id = embed_id
-		return layout_cache[uid].generate_termlevel_chart()
+		with get_layout_lock(uid):
+			layout_cache[uid].current_topic_index = int(topic_index)
+			layout_cache[uid].current_embed_id = embed_id
+			return layout_cache[uid].generate_termlevel_chart()
+
+	register_topic_figure_callback(app, 'topic-sil-dropdown', 'chart_termsil', 'store_termsil')
 
 # --------------------------------------------------------------
 
@@ -181,9 +176,10 @@ def register_heatmap_callbacks(app):
 		return layout_cache[uid].generate_topiclevel_heatmap()
 
 	@app.callback(Output('heatmap_content_termlevel', 'children'),
-		[Input('url', 'href'), Input('termlevel-dropdown', 'value'), Input('embed-dropdown', 'value')])
-	def heatmap_termlevel_dropdown(href, topic_index, embed_id):
-		""" Callback to handle changes to the topic dropdown """
+		[Input('url', 'href'), Input('embed-dropdown', 'value')], [State('termlevel-dropdown', 'value')])
+	def heatmap_termlevel_dropdown(href, embed_id, topic_index):
+		""" Callback to handle changes to the embedding dropdown, where changes to the topic dropdown
+		are handled on the client """
 		log.debug("Callback: heatmap_termlevel_dropdown: topic_index=%s embed_id=%s" % (topic_index, embed_id))
 		uid, error = extract_uid(href)
 		if error is not None:
@@ -193,6 +189,8 @@ def register_heatmap_callbacks(app):
 		layout_cache[uid].current_embed_id = embed_id
 		return layout_cache[uid].generate_termlevel_heatmap()
 
+	register_topic_figure_callback(app, 'termlevel-dropdown', 'chart_termheatmap', 'store_termheatmap')
+
 # --------------------------------------------------------------
 
 def register_scatter_callbacks(app):
@@ -225,37 +223,70 @@ def register_scatter_callbacks(app):
 def register_comparison_callbacks(app):
 	""" Set up the callbacks for ComparisonLayout """
 
-	@app.callback(Output('content_compare_vtable', 'children'),
-		[Input('url', 'href'), Input('embed-dropdown', 'value')])
-	def update_compare_embed_dropdown(href, embed_id):
-		log.info("Callback: update_embed_dropdown: embed_id=%s" % embed_id)
+	@app.callback([Output('content_compare_vtable', 'children'), Output('content_compare_vchart', 'children'),
+		Output('content_compare_matching', 'children'), Output('compare-vtable-interval', 'disabled')],
+		[Input('url', 'href'), Input('measure-dropdown', 'value'), Input('embed-dropdown', 'value'),
+		Input('compare-model-dropdown1', 'value'), Input('compare-model-dropdown2', 'value'),
+		Input('compare-vtable-interval', 'n_intervals')])
+	def comparison_dropdowns(href, measure_id, embed_id, s_index1, s_index2, n_intervals):
+		model_index1, model_index2 = int(s_index1), int(s_index2)
+		log.info("Callback: comparison_dropdowns: measure_id=%s embed_id=%s model_index1=%d model_index2=%d" % (
+			measure_id, embed_id, model_index1, model_index2) )
 		uid, error = extract_uid(href)
 		if error is not None:
 			log.error("%s: %s" % (error, href))
-			return error
-		layout_cache[uid].current_embed_id = embed_id
-		return layout_cache[uid].generate_vtable()
+			return error, error, error, True
+		# determine which outputs depend on the inputs that changed
+		triggered = get_triggered_ids()
+		if triggered is None or "url" in triggered or "embed-dropdown" in triggered:
+			changed = { "vtable", "vchart", "matching" }
+		else:
+			changed = set()
+			if "measure-dropdown" in triggered:
+				changed.add("vchart")
+			if "compare-model-dropdown1" in triggered or "compare-model-dropdown2" in triggered:
+				changed.add("matching")
+			# refresh the validation scores while they are being computed
+			if "compare-vtable-interval" in triggered:
+				changed.update( { "vtable", "vchart" } )
+		with get_layout_lock(uid):
+			layout = layout_cache[uid]
+			layout.current_measure_id = measure_id
+			layout.current_embed_id = embed_id
+			layout.current_metadata_indices = [model_index1, model_index2]
+			# note: the validation scores are computed once in the background, then cached by the layout
+			vtable = layout.generate_vtable() if "vtable" in changed else dash.no_update
+			vchart = layout.generate_vchart() if "vchart" in changed else dash.no_update
+			matching = layout.generate_matching_table() if "matching" in changed else dash.no_update
+			complete = layout.is_validation_complete()
+		return vtable, vchart, matching, complete
 
-	@app.callback(Output('content_compare_vchart', 'children'),
-		[Input('url', 'href'), Input('measure-dropdown', 'value'), Input('embed-dropdown', 'value')])
-	def update_compare_measure_dropdown(href, measure_id, embed_id):
-		log.info("Callback: update_measure_dropdown: measure_id=%s embed_id=%s" % (measure_id, embed_id))
-		uid, error = extract_uid(href)
-		if error is not None:
-			log.error("%s: %s" % (error, href))
-			return error
-		layout_cache[uid].current_measure_id = measure_id
-		layout_cache[uid].current_embed_id = embed_id
-		return layout_cache[uid].generate_vchart()
+# --------------------------------------------------------------
 
-	@app.callback(Output('content_compare_matching', 'children'),
-		[Input('url', 'href'), Input('compare-model-dropdown1', 'value'), Input('compare-model-dropdown2', 'value')])
-	def update_compare_model_dropdown1(href, s_index1, s_index2):
-		model_index1, model_index2 = int(s_index1), int(s_index2)
-		log.info("Callback: update_compare_model_dropdown: model_index1=%d model_index2=%d" % (model_index1, model_index2) )
+def register_selection_callbacks(app):
+	""" Set up the callbacks for SelectionLayout """
+
+	@app.callback([Output('content_selection_summary', 'children'), Output('content_selection_table', 'children'),
+		Output('content_selection_chart', 'children'), Output('selection-interval', 'disabled')],
+		[Input('url', 'href'), Input('selection-sweep-dropdown', 'value'), Input('embed-dropdown', 'value'),
+		Input('measure-dropdown', 'value'), Input('selection-interval', 'n_intervals')])
+	def selection_dropdowns(href, sweep_id, embed_id, measure_id, n_intervals):
+		log.info("Callback: selection_dropdowns: sweep_id=%s embed_id=%s measure_id=%s" % (sweep_id, embed_id, measure_id))
 		uid, error = extract_uid(href)
 		if error is not None:
 			log.error("%s: %s" % (error, href))
-			return error
-		layout_cache[uid].current_metadata_indices = [model_index1, model_index2]
-		return layout_cache[uid].generate_matching_table()
\ No newline at end of file
+			return error, error, error, True
+		# only the chart depends on the selected measure
+		triggered = get_triggered_ids()
+		measure_only = triggered is not None and triggered.issubset({"measure-dropdown"})
+		with get_layout_lock(uid):
+			layout = layout_cache[uid]
+			layout.current_sweep_id = sweep_id
+			layout.current_embed_id = embed_id
+			layout.current_measure_id = measure_id
+			# note: the selection report is computed once per embedding in the background, then cached by the layout
+			summary = layout.generate_summary() if not measure_only else dash.no_update
+			stable = layout.generate_stable() if not measure_only else dash.no_update
+			schart = layout.generate_schart()
+			complete = layout.is_report_complete()
+		return summary, stable, schart, complete
@@ -8,6 +8,12 @@ config = { "random_seed" : 100,
 	"num_associations" : 10,
 	"file_extension" : ".meta",
 	"default_measure" : "coherence",
-	"query_sample" : "bank, finance, treasury, economy, fiscal, euro"
+	"query_sample" : "bank, finance, treasury, economy, fiscal, euro",
+	"mds_method" : "auto",
+	"mds_landmarks" : 500,
+	"distribution_bins" : 40,
+	"distribution_kde" : False,
+	"validation_workers" : 0,
+	"validation_cache_size" : 10000
 	}
 
@@ -4,7 +4,9 @@ from pathlib import Path
 import logging as log
 import numpy as np
 import pandas as pd
+from scipy import sparse
 from model.util import load_nmf_factors, load_partition, load_term_rankings, truncate_term_rankings
+from model.util import load_top_associations, load_nmf_top_associations, build_top_associations
 from model.embedding import Embedding
 from webconfig import config
 
@@ -71,7 +73,13 @@ class WebCore:
 		in_path = em.dir_base / em["file"]
 		log.info("Loading word embedding from %s" % in_path)
 		try:
-			self.embedding_cache[embed_id] = Embedding(in_path)
+			# use the memory-mapped normalized vectors, if available
+			files = em.get("files", {})
+			if "vectors" in files and "vocab" in files:
+				self.embedding_cache[embed_id] = Embedding(in_path, 
+					vectors_path=em.dir_base / files["vectors"], vocab_path=em.dir_base / files["vocab"])
+			else:
+				self.embedding_cache[embed_id] = Embedding(in_path)
 		except Exception as e:
 			log.warning("Failed to load word embedding: %s" % in_path)
 			log.warning(e)
@@ -176,6 +184,7 @@ class TopicModelMeta(dict):
 		self.partition = None
 		self.term_associations = None
 		self.document_associations = None
+		self.top_associations = None
 		# other settings
 		self.top_terms = config.get("top_terms", 10)
 		self.extended_top_terms = config.get("extended_top_terms", 20)
@@ -184,9 +193,7 @@ class TopicModelMeta(dict):
 		""" Preload all the required files associated with this model """
 		self.get_rankings()
 		self.get_partition()
-		self.__load_factors()
-		self.get_document_associations()
-		self.get_term_associations()	
+		self.get_top_associations()
 
 	def get_rankings(self):
 		if not self.term_rankings is None:
@@ -293,10 +300,56 @@ class TopicModelMeta(dict):
 		in_path = self.dir_base / self["files"]["factors"]
 		log.info("Loading factors from %s" % in_path)
 		(W,H,doc_ids,terms) = load_nmf_factors(in_path)
+		# is the document factor stored in a separate file?
+		if W is None and "document_factor" in self["files"]:
+			W_path = self.dir_base / self["files"]["document_factor"]
+			log.info("Loading document factor from %s" % W_path)
+			W = np.load(W_path, mmap_mode="r")
+		# are the factors stored in the compact sparse format?
+		if sparse.issparse(W):
+			W = W.toarray()
+		if sparse.issparse(H):
+			H = H.toarray()
 		columns = np.arange(1, self["k"]+1, dtype=int)
 		self.document_associations = pd.DataFrame(W, index = doc_ids, columns = columns)
 		self.term_associations = pd.DataFrame(np.transpose(H), index = terms, columns = columns)
 
+	def get_top_associations(self):
+		""" Return the ranked lists of top documents and terms for each topic. These are read from 
+		the precomputed file if available, so that the full factors do not need to be loaded. """
+		if not self.top_associations is None:
+			return self.top_associations
+		if "top" in self["files"]:
+			in_path = self.dir_base / self["files"]["top"]
+			log.info("Loading top associations from %s" % in_path)
+			self.top_associations = load_top_associations(in_path)
+			return self.top_associations
+		# is this a compact factors file?
+		in_path = self.dir_base / self["files"]["factors"]
+		self.top_associations = load_nmf_top_associations(in_path)
+		if self.top_associations is None:
+			# otherwise build the lists from the full factors
+			df_docs, df_terms = self.get_document_associations(), self.get_term_associations()
+			self.top_associations = build_top_associations(df_docs.values, np.transpose(df_terms.values), 
+				list(df_docs.index), list(df_terms.index), config.get("num_associations", 10))
+		return self.top_associations
+
+	def get_top_document_associations(self, topic_index, top):
+		""" Return the top documents and their weights for the specified topic (0-indexed). """
+		top_docs = self.get_top_associations()["documents"]
+		return top_docs["labels"][topic_index][0:top], top_docs["weights"][topic_index][0:top]
+
+	def get_top_term_associations(self, topic_index, top):
+		""" Return the top terms and their weights for the specified topic (0-indexed). """
+		top_terms = self.get_top_associations()["terms"]
+		return top_terms["labels"][topic_index][0:top], top_terms["weights"][topic_index][0:top]
+
+	def get_max_document_association(self):
+		return self.get_top_associations()["documents"]["max"]
+
+	def get_max_term_association(self):
+		return self.get_top_associations()["terms"]["max"]
+
 	def get_document_associations(self):
 		if not self.document_associations is None:
 			return self.document_associations
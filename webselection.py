@@ -0,0 +1,133 @@
+import time, json, zlib
+from pathlib import Path
+import logging as log
+import joblib
+import pandas as pd
+from model.validation import TopicStabilityScore
+from webvalidation import ModelValidator, get_measure, measure_names, model_score_cache
+from webconfig import config
+
+# --------------------------------------------------------------
+
+# algorithm parameters which vary between the topic models in a single parameter sweep
+sweep_varying_params = ["k", "seed", "run"]
+
+def get_sweep_params(meta):
+	""" Return the algorithm parameters which are shared by all topic models in the same parameter sweep. """
+	params = meta["algorithm"].get("params", {})
+	return { name : params[name] for name in params if not name in sweep_varying_params }
+
+def get_sweep_id(meta):
+	""" Return the identifier of the parameter sweep to which a topic model belongs, based on the corpus,
+	the algorithm, and a short hash of the shared algorithm parameters, so that sweeps of the same 
+	algorithm with different settings are kept apart. """
+	sweep_id = "%s/%s" % (meta["corpus"], meta["algorithm"]["id"])
+	params = get_sweep_params(meta)
+	if len(params) == 0:
+		return sweep_id
+	return "%s-%08x" % (sweep_id, zlib.crc32(json.dumps(params, sort_keys=True).encode("utf8")))
+
+def load_score_cache(cache_path):
+	""" Load previously computed model-level validation scores into the memoized scores. Scores are
+	keyed by the path, modification time, and size of each embedding, so they are only reused for 
+	an unchanged embedding. """
+	cache_path = Path(cache_path)
+	if not cache_path.exists():
+		return 0
+	log.info("Loading cached validation scores from %s" % cache_path)
+	# note: scores cached by earlier versions are keyed by the embedding path alone, and are skipped
+	scores = { key : value for key, value in joblib.load(cache_path).items() if isinstance(key[0], tuple) }
+	model_score_cache.update(scores)
+	return len(scores)
+
+def save_score_cache(cache_path):
+	""" Save all memoized model-level validation scores, so that they can be reused later. """
+	log.info("Saving %d cached validation scores to %s" % (len(model_score_cache), cache_path))
+	joblib.dump(model_score_cache.to_dict(), cache_path)
+
+# --------------------------------------------------------------
+
+class KSelector:
+	""" Class for recommending the number of topics k for one or more parameter sweeps of topic models,
+	by aggregating validation scores and topic stability across the runs for each value of k. """
+
+	def __init__(self, measure_ids = None, workers = None):
+		self.measure_ids = list(measure_names.keys()) if measure_ids is None else measure_ids
+		self.validator = ModelValidator(workers)
+		self.stability = TopicStabilityScore(config.get("top_terms", 10))
+		# cache of stability scores, keyed by sweep and k
+		self.stability_cache = {}
+
+	def get_scores_df(self, all_meta, embeds):
+		""" Get a Data Frame containing the unrounded model-level scores for all topic models,
+		using each of the specified word embeddings. Memoized scores are reused. """
+		rows = []
+		for embed_id in embeds:
+			log.info("Evaluating %d topic models using %s ..." % (len(all_meta), embed_id))
+			for index, meta, descriptors, scores in self.validator.iter_model_scores(all_meta, embeds[embed_id]):
+				row = { "Sweep" : get_sweep_id(meta), "Name" : meta["id"], "k" : len(descriptors), "Embedding" : embed_id }
+				for measure_id in self.measure_ids:
+					row[measure_id] = scores[measure_id]
+				rows.append(row)
+		return pd.DataFrame(rows)
+
+	def get_stability(self, sweep_id, k, all_meta):
+		""" Return the stability of the runs for a given sweep and value of k. This is only
+		recomputed when new runs have been added. """
+		model_ids = tuple(sorted(meta["id"] for meta in all_meta))
+		key = (sweep_id, k)
+		if not key in self.stability_cache or self.stability_cache[key][0] != model_ids:
+			stability = self.stability.evaluate_runs([meta.get_descriptors() for meta in all_meta])
+			stability = None if stability is None else float(stability)
+			self.stability_cache[key] = (model_ids, stability)
+		return self.stability_cache[key][1]
+
+	def get_report(self, all_meta, embeds):
+		""" Build a report containing the per-k statistics and the recommended value of k
+		for each parameter sweep. """
+		df = self.get_scores_df(all_meta, embeds)
+		maximize = { measure_id : get_measure(measure_id, None).is_maximize() for measure_id in self.measure_ids }
+		report = { "created" : time.strftime("%Y-%m-%d %H:%M:%S"), "embeddings" : list(embeds.keys()),
+			"measures" : self.measure_ids, "sweeps" : [] }
+		if len(df) == 0:
+			return report
+		meta_by_id = { meta["id"] : meta for meta in all_meta }
+		for sweep_id in sorted(df["Sweep"].unique()):
+			df_sweep = df[df["Sweep"] == sweep_id]
+			sweep = { "id" : sweep_id, "params" : get_sweep_params(meta_by_id[df_sweep["Name"].iloc[0]]),
+				"models" : int(df_sweep["Name"].nunique()), "k" : [] }
+			# criteria used to rank the values of k
+			criteria = {}
+			for k in sorted(df_sweep["k"].unique()):
+				df_k = df_sweep[df_sweep["k"] == k]
+				run_meta = [meta_by_id[model_id] for model_id in sorted(df_k["Name"].unique())]
+				row = { "k" : int(k), "runs" : len(run_meta), "stability" : self.get_stability(sweep_id, int(k), run_meta), "scores" : {} }
+				if row["stability"] is not None:
+					criteria.setdefault("stability", {})[int(k)] = row["stability"]
+				for embed_id in embeds:
+					df_embed = df_k[df_k["Embedding"] == embed_id]
+					row["scores"][embed_id] = {}
+					for measure_id in self.measure_ids:
+						values = df_embed[measure_id].values
+						row["scores"][embed_id][measure_id] = { "mean" : float(values.mean()),
+							"var" : float(values.var(ddof=1)) if len(values) > 1 else 0.0 }
+						# note: scores are negated where lower values are better
+						sign = 1 if maximize[measure_id] else -1
+						criteria.setdefault("%s/%s" % (embed_id, measure_id), {})[int(k)] = sign * values.mean()
+				sweep["k"].append(row)
+			self.__add_recommendation(sweep, criteria)
+			report["sweeps"].append(sweep)
+		return report
+
+	def __add_recommendation(self, sweep, criteria):
+		""" Recommend a value of k for a sweep, as the value with the best average rank across all
+		criteria. Ties are broken in favour of smaller values of k. """
+		sweep["best_k"] = {}
+		ranks = pd.DataFrame(criteria).sort_index().rank(ascending=False)
+		for name in criteria:
+			scores = pd.Series(criteria[name]).sort_index()
+			sweep["best_k"][name] = int(scores.idxmax())
+		mean_ranks = ranks.mean(axis=1)
+		for row in sweep["k"]:
+			row["mean_rank"] = float(mean_ranks[row["k"]])
+		sweep["recommended_k"] = int(mean_ranks.idxmin())
@@ -1,5 +1,11 @@
+import os, threading
+from collections import OrderedDict
+from pathlib import Path
+import logging as log
+from multiprocessing import Pool
 import numpy as np
 import pandas as pd
+from model.embedding import Embedding
 from model.validation import CoherenceScore, TopicDifferenceScore, MinMaxScore, InternalExternalScore, TopicSilhouetteScore
 from webconfig import config
 
@@ -41,6 +47,37 @@ def get_measures(measure_ids, embed):
 		measures[measure_id] = get_measure(measure_id, embed)
 	return measures
 
+def round_score(score):
+	""" Round a validation score to the precision used when displaying or exporting scores. """
+	return round(score, config.get("precision", 3))
+
+def compute_histogram(values, num_bins, value_range = (0.0, 1.0), kde = False, kde_bins = 512):
+	""" Compute a normalized histogram for the specified values, returning the bin centers and
+	the proportion of values in each bin. Optionally, a Gaussian kernel density estimate is also
+	returned, evaluated at the bin centers and scaled to the same units as the histogram. """
+	values = np.asarray(values, dtype=float)
+	counts, edges = np.histogram(values, bins=num_bins, range=value_range)
+	centers = (edges[:-1] + edges[1:]) / 2
+	probs = counts / max(len(values), 1)
+	if not kde:
+		return centers, probs, None
+	if len(values) < 2 or np.std(values) == 0:
+		return centers, probs, np.zeros(len(centers))
+	# binned estimate: smooth a fine-grained histogram with a Gaussian kernel, using the 
+	# bandwidth from Silverman's rule of thumb
+	bandwidth = 1.06 * np.std(values) * len(values) ** (-0.2)
+	fine_counts, fine_edges = np.histogram(values, bins=kde_bins, range=value_range)
+	fine_width = fine_edges[1] - fine_edges[0]
+	sigma = bandwidth / fine_width
+	offsets = np.arange(-int(np.ceil(4 * sigma)), int(np.ceil(4 * sigma)) + 1)
+	kernel = np.exp(-0.5 * (offsets / sigma) ** 2)
+	kernel /= kernel.sum()
+	density = np.convolve(fine_counts, kernel, mode="same") / (len(values) * fine_width)
+	fine_centers = (fine_edges[:-1] + fine_edges[1:]) / 2
+	# convert the density to the probability of each of the histogram bins
+	kde_probs = np.interp(centers, fine_centers, density) * (edges[1] - edges[0])
+	return centers, probs, kde_probs
+
 # --------------------------------------------------------------
 
 class TopicValidator:
@@ -62,8 +99,11 @@ class TopicValidator:
 		for measure_id in measures:
 			scores = measures[measure_id].evaluate_topics(descriptors)
 			for i, score in enumerate(scores):
-				# TODO: move rounding elsewhere?
-				rows[i][measure_id] = round(score, config.get("precision", 3))
+				rows[i][measure_id] = round_score(score)
+		# fraction of the terms in each descriptor which appear in the embedding
+		coverage = embed.get_descriptor_index(descriptors).get_coverage()
+		for i in range(len(rows)):
+			rows[i]["Coverage"] = round_score(coverage[i])
 		return pd.DataFrame(rows)
 
 	def get_topiclevel_silhouette_df(self, meta, embed):
@@ -98,15 +138,8 @@ class TopicValidator:
 		descriptors = meta.get_descriptors()
 		if descriptors is None:
 			return None
-		measure = TopicDifferenceScore(embed)
-		k = len(descriptors)
-		D = np.zeros((k,k))
-		for i in range(k):
-			# note, we populate the diagonal too
-			for j in range(i, k):
-				D[i,j] = measure.evaluate_distance(descriptors[i], descriptors[j])
-				D[j,i] = D[i,j]
-		return D
+		# note, we populate the diagonal too
+		return TopicDifferenceScore(embed).evaluate_distance_matrix(descriptors)
 
 	def get_topic_similarity_matrix(self, meta, embed):
 		""" Return a pairwise similarity matrix for pairs of topics, based on the currently loaded 
@@ -119,22 +152,56 @@ class TopicValidator:
 	def __get_term_similarities(self, meta, embed):
 		""" Return a matrix containing the similarity between all terms appearing in topic descriptors
 		in this model, which also appear in the current embedding vocabulary."""
-		descriptors = meta.get_descriptors()
 		all_terms = meta.get_all_descriptor_terms()
 		# filter based on the embedding
-		filtered_terms = []
+		filtered_terms, rows = [], []
 		for term in all_terms:
-			if term in embed:
+			index = embed.get_index(term)
+			if index >= 0:
 				filtered_terms.append(term)
+				rows.append(index)
 		# build the matrix
-		m = len(filtered_terms)
-		S = np.zeros((m, m))
-		for i in range(0,m):
-			for j in range(i+1,m):
-				S[i, j] = embed.similarity(filtered_terms[i], filtered_terms[j])
-				S[j, i] = S[i, j]
+		S = embed.similarity_matrix(rows, rows)
+		np.fill_diagonal(S, 0)
 		return S, filtered_terms
 
+	def get_term_similarity_matrix(self, meta, embed):
+		""" Return a matrix containing the similarity between all pairs of terms appearing in topic
+		descriptors in this model, along with a dictionary mapping each term to its row index. 
+		Terms which do not appear in the embedding vocabulary are excluded. """
+		if embed is None:
+			return None, None
+		descriptors = meta.get_descriptors()
+		if descriptors is None:
+			return None, None
+		S, filtered_terms = self.__get_term_similarities(meta, embed)
+		# threshold below zero, and include self-similarity
+		S = np.maximum(S, 0)
+		np.fill_diagonal(S, 1.0)
+		term_index = { term : i for i, term in enumerate(filtered_terms) }
+		return S, term_index
+
+	def get_term_pair_similarity_values(self, meta, embed):
+		""" Return arrays of the similarities for all unique pairs of terms appearing in topic descriptors 
+		in this model, separated into intra-topic pairs, where both terms appear in the same descriptor,
+		and inter-topic pairs. """
+		if embed is None:
+			return None, None
+		descriptors = meta.get_descriptors()
+		if descriptors is None:
+			return None, None
+		S, term_index = self.get_term_similarity_matrix(meta, embed)
+		# build a binary term-topic membership matrix
+		M = np.zeros((len(term_index), len(descriptors)))
+		for i, descriptor in enumerate(descriptors):
+			for term in descriptor:
+				if term in term_index:
+					M[term_index[term], i] = 1
+		rows, cols = np.triu_indices(len(term_index), 1)
+		is_intra = (M @ M.T)[rows, cols] > 0
+		sims = S[rows, cols]
+		return sims[is_intra], sims[~is_intra]
+
 	def get_term_distance_df(self, meta, embed):
 		""" Returns a Data Frame of the distance between all terms appearing in topic descriptors
 		in this model."""
@@ -210,22 +277,164 @@ class TopicValidator:
 
 # --------------------------------------------------------------
 
+class ModelScoreCache:
+	""" Memoized model-level validation scores, keyed by embedding and topic descriptors. Once the
+	maximum size is reached, the least recently used scores are discarded. """
+
+	def __init__(self, max_size = None):
+		self.max_size = max_size
+		self.scores = OrderedDict()
+		# note: the cache is shared by layouts which evaluate models in background threads
+		self.lock = threading.Lock()
+
+	def __len__(self):
+		return len(self.scores)
+
+	def get(self, key):
+		""" Return the scores for the specified key, or None if they are not cached. """
+		with self.lock:
+			if not key in self.scores:
+				return None
+			self.scores.move_to_end(key)
+			return self.scores[key]
+
+	def put(self, key, scores):
+		""" Add the scores for the specified key, discarding the oldest scores if necessary. """
+		with self.lock:
+			self.scores[key] = scores
+			self.scores.move_to_end(key)
+			while self.max_size is not None and len(self.scores) > self.max_size:
+				self.scores.popitem(last=False)
+
+	def update(self, all_scores):
+		""" Add all of the scores in the specified dictionary. """
+		for key in all_scores:
+			self.put(key, all_scores[key])
+
+	def clear(self):
+		""" Discard all cached scores. """
+		with self.lock:
+			self.scores.clear()
+
+	def to_dict(self):
+		""" Return a copy of all cached scores as a dictionary. """
+		with self.lock:
+			return dict(self.scores)
+
+model_score_cache = ModelScoreCache(config.get("validation_cache_size", 10000))
+
+def get_embedding_key(embed):
+	""" Return a key which identifies the file containing a word embedding's vectors, based on its 
+	resolved path, modification time, and size, so that memoized scores are not reused if the 
+	embedding is replaced or is referred to by a different path. """
+	in_path = Path(embed.vectors_path if embed.is_memory_mapped() else embed.embedding_path).resolve()
+	stat = in_path.stat()
+	return (str(in_path), stat.st_mtime_ns, stat.st_size)
+
+# word embedding used by each process in the validation worker pool
+worker_embed = None
+
+def init_validation_worker(embedding_path, vectors_path, vocab_path):
+	""" Initialize a validation worker process by memory-mapping the word embedding, so that
+	the vectors are shared between all workers rather than copied. """
+	global worker_embed
+	worker_embed = Embedding(embedding_path, vectors_path=vectors_path, vocab_path=vocab_path)
+
+def evaluate_model_scores(descriptors, embed):
+	""" Evaluate all model-level validation measures for the specified topic descriptors. """
+	measures = get_measures(measure_names.keys(), embed)
+	scores = {}
+	for measure_id in measures:
+		scores[measure_id] = float(measures[measure_id].evaluate_model(descriptors))
+	return scores
+
+def evaluate_all_scores(descriptors, embed):
+	""" Evaluate all validation measures for the specified topic descriptors, returning both the 
+	model-level scores and the scores for the individual topics, along with the fraction of the
+	terms in each topic which appear in the embedding. """
+	measures = get_measures(measure_names.keys(), embed)
+	model_scores, topic_scores = {}, {}
+	for measure_id in measures:
+		model_scores[measure_id] = float(measures[measure_id].evaluate_model(descriptors))
+		topic_scores[measure_id] = [float(score) for score in measures[measure_id].evaluate_topics(descriptors)]
+	topic_scores["coverage"] = [float(value) for value in embed.get_descriptor_index(descriptors).get_coverage()]
+	return model_scores, topic_scores
+
+def evaluate_worker(task):
+	""" Apply an evaluation function to the descriptors for a single model in a worker process. """
+	func, key, descriptors = task
+	return key, func(descriptors, worker_embed)
+
+def evaluate_parallel(func, tasks, embed, workers):
+	""" Apply an evaluation function to each (key, descriptors) task, yielding each key and its result 
+	as they become available. If the embedding is memory-mapped, the tasks are distributed across a 
+	pool of worker processes. Otherwise they are evaluated serially in this process. """
+	num_workers = min(workers, len(tasks))
+	# only use a process pool if the embedding can be shared and it is worth it
+	if num_workers > 1 and embed.is_memory_mapped():
+		log.info("Evaluating %d topic models using %d processes ..." % (len(tasks), num_workers))
+		with Pool(processes=num_workers, initializer=init_validation_worker,
+			initargs=(embed.embedding_path, embed.vectors_path, embed.vocab_path)) as pool:
+			for key, result in pool.imap_unordered(evaluate_worker, [(func, key, descriptors) for key, descriptors in tasks]):
+				yield key, result
+	else:
+		for key, descriptors in tasks:
+			yield key, func(descriptors, embed)
+
 class ModelValidator:
-	""" Class for generating various validation results across multiple topics models. """
+	""" Class for generating various validation results across multiple topics models. Where 
+	the word embedding is memory-mapped, models are evaluated in parallel using a pool of 
+	worker processes. Scores for each model are memoized, so they are only computed once for 
+	a given embedding. """
+
+	def __init__(self, workers = None):
+		if workers is None:
+			workers = config.get("validation_workers", 0)
+		# by default, use all available CPUs
+		self.workers = workers if workers > 0 else max(1, os.cpu_count() or 1)
 
 	def get_validation_df(self, all_meta, embed):
 		if embed is None:
 			return None
-		measures = get_measures(measure_names.keys(), embed)
-		rows = []
-		for meta in all_meta:
+		rows = list(self.iter_validation_rows(all_meta, embed))
+		# restore the original order of the models
+		rows.sort(key=lambda x : x[0])
+		return pd.DataFrame([row for _, row in rows])
+
+	def iter_validation_rows(self, all_meta, embed):
+		""" Generate the validation scores for the specified topic models as they become available,
+		yielding the index of each model and its row of scores. Memoized scores are yielded first. """
+		for index, meta, descriptors, scores in self.iter_model_scores(all_meta, embed):
+			yield index, self.__build_row(meta, descriptors, scores)
+
+	def iter_model_scores(self, all_meta, embed):
+		""" Generate the unrounded model-level scores for the specified topic models as they become 
+		available, yielding the index of each model, its metadata, descriptors, and scores. """
+		embed_key = get_embedding_key(embed)
+		pending = {}
+		for index, meta in enumerate(all_meta):
 			descriptors = meta.get_descriptors()
 			if descriptors is None:
 				continue
-			row = { "Name" : meta["id"], "Corpus" : meta["corpus"], "Topics" : len(descriptors) }
-			for measure_id in measures:
-				score = measures[measure_id].evaluate_model(descriptors)
-				# TODO: move rounding elsewhere?
-				row[measure_id] = round(score, config.get("precision", 3))
-			rows.append(row)
-		return pd.DataFrame(rows)
+			key = (embed_key, tuple(tuple(descriptor) for descriptor in descriptors))
+			scores = model_score_cache.get(key)
+			if scores is not None:
+				yield index, meta, descriptors, scores
+			else:
+				if not key in pending:
+					pending[key] = []
+				pending[key].append((index, meta))
+		if len(pending) == 0:
+			return
+		tasks = [(key, [list(descriptor) for descriptor in key[1]]) for key in pending]
+		for key, scores in evaluate_parallel(evaluate_model_scores, tasks, embed, self.workers):
+			model_score_cache.put(key, scores)
+			for index, meta in pending[key]:
+				yield index, meta, key[1], scores
+
+	def __build_row(self, meta, descriptors, scores):
+		""" Build a row of validation scores for a single topic model. """
+		row = { "Name" : meta["id"], "Corpus" : meta["corpus"], "Topics" : len(descriptors) }
+		for measure_id in measure_names:
+			row[measure_id] = round_score(scores[measure_id])
+		return row